@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session, send_file, make_response, send_from_directory
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session, send_file, make_response, send_from_directory, Response, stream_with_context
 from markupsafe import Markup
 import os
 from werkzeug.utils import secure_filename
@@ -9,8 +9,11 @@ import uuid
 import base64
 import tempfile
 import shutil
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional
 
 # Import models and database
 from models import db, Quote, Job, PdfData
@@ -19,11 +22,21 @@ from sqlalchemy import or_
 # Import utility modules
 from utils.rfms_api import RfmsApi
 from utils.ai_analyzer import DocumentAnalyzer
+from utils.extraction_engine import ExtractionEngine
+from utils.batch_analyzer import collect_batch_files, run_batch, unique_path, DEFAULT_BATCH_WORKERS
 from utils.rfms_client import RFMSClient
 from utils.postcode_lookup import search_suburbs, get_suburb_details
 from utils.email_parser import EmailParser
 from utils.email_scraper import EmailScraper, extract_invoice_charges
 from utils.email_sender import send_no_invoice_notification
+from utils.photo_export import export_order_photos, attachment_key, atomic_write_bytes
+from utils.zip_stream import stream_zip
+from utils.db_engine import engine_options, install_sqlite_pragmas
+from utils.migrations import upgrade_schema
+from utils.session_store import SqlSessionInterface
+from utils.tracing import init_tracing, stats as trace_stats
+from utils.metrics import metrics_response
+from utils.thumbnails import get_thumbnail_service, preview_kind, ThumbnailBusy, ThumbnailUnavailable, IMAGE_EXTENSIONS
 from utils.text_utils import uppercase_rfms_fields
 
 # Load environment variables
@@ -45,6 +58,8 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///instance/rfms_xtracr.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# WAL, busy timeout and pool sizing for the SQLite file (see utils/db_engine.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 app.config['ALLOWED_EXTENSIONS'] = {'pdf', 'jpg', 'jpeg', 'png', 'heic', 'heif', 'msg'}
@@ -66,6 +81,13 @@ os.makedirs('logs', exist_ok=True)
 
 # Initialize database with app
 db.init_app(app)
+install_sqlite_pragmas(app, db)
+
+# Keep session data in the database; the cookie only carries the session id
+app.session_interface = SqlSessionInterface(db)
+
+# Per-request timings: Server-Timing header, JSON line on the 'request_trace' logger, /admin/performance
+init_tracing(app, db)
 
 # Add custom Jinja2 filters
 @app.template_filter('nl2br')
@@ -98,6 +120,9 @@ except Exception as e:
     logger.warning(f"Failed to initialize AI analyzer: {e}")
     document_analyzer = None
 
+# Template fast path for known builder POs, falling back to the AI analyzer
+extraction_engine = ExtractionEngine(document_analyzer)
+
 # RFMS configuration mappings (sourced from updated RFMS CONFIG ID NUMBERS.xlsx)
 CONTRACT_TYPE_DEFAULT = 'DEPOSIT & COD'
 CONTRACT_TYPE_IDS = {
@@ -313,6 +338,196 @@ def allowed_attachment(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_ATTACHMENT_EXTENSIONS']
 
+# Upload form document types -> the document type analyzed and created in RFMS
+UPLOAD_DOCUMENT_TYPES = {
+    'purchase_order': 'purchase_order',
+    'quotation': 'quotation',
+    'customer_enquiry': 'customer_enquiry',
+    'email_quotation': 'quotation',  # Email MSG to Quote -> creates a quote
+    'email_order': 'purchase_order',  # Email MSG to Order -> creates an order
+}
+
+
+def normalize_document_type(value: Optional[str]) -> str:
+    """
+    Map an upload form document type to purchase_order, quotation or customer_enquiry.
+
+    Args:
+        value: Value of the form's document_type field (blank means purchase_order)
+
+    Returns:
+        Normalized document type
+
+    Raises:
+        ValueError: If the value is not a known document type
+    """
+    key = (value or '').strip().lower() or 'purchase_order'
+    if key not in UPLOAD_DOCUMENT_TYPES:
+        raise ValueError(f"Unknown document type: {value}")
+    return UPLOAD_DOCUMENT_TYPES[key]
+
+
+def build_extracted_data(ai_result, document_type: str, settings: Dict, is_email: bool = False) -> Dict:
+    """
+    Convert an AIProcessingResult into the extracted_data dict stored on PdfData.
+
+    Args:
+        ai_result: Result from the extraction engine / DocumentAnalyzer
+        document_type: purchase_order, quotation or customer_enquiry
+        settings: RFMS defaults chosen on the upload form (salesperson, contract_type, ...)
+        is_email: True for .msg uploads, where the caller merges email contact details itself
+    """
+    # Calculate dates (similar to AWS Lambda logic)
+    # Measure date: today + 5 days
+    measure_date = (datetime.now(timezone.utc) + timedelta(days=5)).strftime("%Y-%m-%d")
+
+    # Estimated delivery date: use end_date if present, otherwise today + 21 days
+    if ai_result.end_date:
+        estimated_delivery_date = ai_result.end_date
+    else:
+        estimated_delivery_date = (datetime.now(timezone.utc) + timedelta(days=21)).strftime("%Y-%m-%d")
+
+    # Convert AI result to dictionary format
+    # Handle different document types for number field
+    # Note: AIProcessingResult only has po_number, which is used for all document types
+    number_field = ai_result.po_number or ''
+
+    # Handle dollar amount with special logic for customer enquiry
+    dollar_value = 1.0  # Default for customer enquiry
+    if ai_result.amount:
+        try:
+            amount_str = ai_result.amount.replace('$', '').replace(',', '')
+            dollar_value = float(amount_str)
+        except (ValueError, AttributeError):
+            dollar_value = 1.0
+    elif document_type != "customer_enquiry":
+        dollar_value = 1.0
+
+    # Extract supervisor and customer contact info from main_contacts
+    supervisor_name = ''
+    supervisor_phone = ''
+    supervisor_mobile = ''
+    customer_phone = ''
+    customer_mobile = ''
+    customer_email = ''
+    customer_first_name = ''
+    customer_last_name = ''
+
+    main_contacts = ai_result.main_contacts or []
+    if main_contacts:
+        # Find supervisor contact (look for titles like "Supervisor", "Site Manager", etc.)
+        supervisor_keywords = ['supervisor', 'super', 'site manager', 'site mgr', 'foreman', 'foreperson']
+        supervisor_contact = None
+
+        for contact in main_contacts:
+            title = (contact.get('title') or '').lower()
+            if any(keyword in title for keyword in supervisor_keywords):
+                supervisor_contact = contact
+                break
+
+        # Extract supervisor info if found
+        if supervisor_contact:
+            supervisor_name = f"{supervisor_contact.get('first_name', '')} {supervisor_contact.get('last_name', '')}".strip()
+            supervisor_phone = supervisor_contact.get('phone', '') or ''
+            supervisor_mobile = supervisor_contact.get('mobile', '') or ''
+
+        # Extract customer contact info from first contact (or first non-supervisor contact)
+        customer_contact = None
+        if supervisor_contact and len(main_contacts) > 1:
+            # Use second contact if first is supervisor
+            customer_contact = main_contacts[1] if len(main_contacts) > 1 else main_contacts[0]
+        else:
+            # Use first contact
+            customer_contact = main_contacts[0] if main_contacts else None
+
+        if customer_contact:
+            customer_first_name = customer_contact.get('first_name', '') or ''
+            customer_last_name = customer_contact.get('last_name', '') or ''
+            customer_phone = customer_contact.get('phone', '') or ''
+            customer_mobile = customer_contact.get('mobile', '') or ''
+            customer_email = customer_contact.get('emails', '') or ''
+
+    # Also check email_contact for customer info (prioritize over main_contacts if available)
+    email_contact = ai_result.email_contact or {}
+    if email_contact:
+        if not customer_first_name:
+            customer_first_name = email_contact.get('first_name', '') or ''
+        if not customer_last_name:
+            customer_last_name = email_contact.get('last_name', '') or ''
+        if not customer_phone:
+            customer_phone = email_contact.get('phone', '') or ''
+        if not customer_mobile:
+            customer_mobile = email_contact.get('mobile', '') or ''
+        if not customer_email:
+            customer_email = email_contact.get('emails', '') or ''
+
+    extracted_data = {
+        'po_number': number_field,
+        'customer_name': '',
+        'business_name': '',
+        'scope_of_work': ai_result.job_description or '',
+        'dollar_value': dollar_value,
+        'first_name': customer_first_name,
+        'last_name': customer_last_name,
+        'address1': ai_result.job_address.get('address1', '') if ai_result.job_address else '',
+        'address2': ai_result.job_address.get('address2', '') if ai_result.job_address else '',
+        'city': ai_result.job_address.get('city', '') if ai_result.job_address else '',
+        'state': ai_result.job_address.get('state', '') if ai_result.job_address else '',
+        'postal_code': ai_result.job_address.get('postalCode', '') if ai_result.job_address else '',
+        'phone': customer_phone,
+        'mobile': customer_mobile,
+        'email': customer_email,
+        'measure_date': measure_date,
+        'estimated_delivery_date': estimated_delivery_date,
+        'supervisor_name': supervisor_name,
+        'supervisor_phone': supervisor_phone,
+        'supervisor_mobile': supervisor_mobile,
+        'description_of_works': ai_result.job_description or '',
+        'builder_type': ai_result.model_used[len('template:'):] if ai_result.model_used.startswith('template:') else 'AI Processed',
+        'document_type': document_type,
+        'is_provisional': ai_result.is_provisional or False,
+        'job_summary': ai_result.job_summary or '',
+        'main_contacts': main_contacts,
+        'email_contact': email_contact,
+        'ai_model': ai_result.model_used,
+        'notes': ai_result.notes or '',
+        'salesperson': settings.get('salesperson', ''),
+        'contract_type': settings.get('contract_type', ''),
+        'order_type': settings.get('order_type', ''),
+        'ad_source': settings.get('ad_source', ''),
+        'date_type': settings.get('date_type', ''),
+        'required_date': settings.get('required_date', ''),
+        'labour_service_type': settings.get('labour_service_type', ''),
+        'customer_type': 'BUILDERS'  # PDF uploads default to BUILDERS
+    }
+
+    if not is_email:
+        # Extract main contact info if available (for PDF uploads)
+        if ai_result.main_contacts and len(ai_result.main_contacts) > 0:
+            main_contact = ai_result.main_contacts[0]
+            extracted_data['first_name'] = main_contact.get('first_name', '')
+            extracted_data['last_name'] = main_contact.get('last_name', '')
+            extracted_data['phone'] = main_contact.get('phone', '')
+            extracted_data['mobile'] = main_contact.get('mobile', '')
+            extracted_data['email'] = main_contact.get('emails', '')
+            extracted_data['customer_name'] = f"{main_contact.get('first_name', '')} {main_contact.get('last_name', '')}".strip()
+
+    return extracted_data
+
+
+def read_upload_settings(form) -> Dict:
+    """Read the RFMS defaults from the upload form, uppercased as RFMS expects."""
+    return {
+        'salesperson': form.get('salesperson', 'STEVE WHYTE').upper(),
+        'contract_type': form.get('contractType', 'DEPOSIT & COD').upper(),
+        'order_type': form.get('orderType', 'RESIDENTIAL HOME').upper(),
+        'ad_source': form.get('adSource', 'BUILDER CLIENT').upper(),
+        'date_type': form.get('dateType', 'estimated').lower(),  # Keep lowercase for date type
+        'required_date': form.get('requiredDate', ''),
+        'labour_service_type': form.get('labourServiceType', 'SUPPLY & INSTALL').upper(),
+    }
+
+
 # Routes
 @app.route('/')
 def index():
@@ -338,24 +553,15 @@ def upload_pdf():
         return redirect(url_for('index'))
     
     file = request.files['pdf_file']
-    document_type_raw = request.form.get('document_type', 'purchase_order')  # Get document type from form
-    
-    # Normalize document types: map email types to their base types
-    document_type = document_type_raw.strip().lower() if document_type_raw else 'purchase_order'
-    if document_type == 'email_quotation':
-        document_type = 'quotation'  # Email MSG to Quote -> creates a quote
-    elif document_type == 'email_order':
-        document_type = 'purchase_order'  # Email Msg to Order -> creates an order
-    # Keep other types as-is: purchase_order, quotation, customer_enquiry
+    try:
+        # Email types map to their base types (Email MSG to Quote -> quotation, to Order -> purchase_order)
+        document_type = normalize_document_type(request.form.get('document_type'))
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('index'))
     
     # Get configuration settings from form and convert to uppercase
-    salesperson = request.form.get('salesperson', 'STEVE WHYTE').upper()
-    contract_type = request.form.get('contractType', 'DEPOSIT & COD').upper()
-    order_type = request.form.get('orderType', 'RESIDENTIAL HOME').upper()
-    ad_source = request.form.get('adSource', 'BUILDER CLIENT').upper()
-    date_type = request.form.get('dateType', 'estimated').lower()  # Keep lowercase for date type
-    required_date = request.form.get('requiredDate', '')
-    labour_service_type = request.form.get('labourServiceType', 'SUPPLY & INSTALL').upper()
+    settings = read_upload_settings(request.form)
     
     if file.filename == '':
         flash('No selected file')
@@ -425,8 +631,9 @@ def upload_pdf():
                 # Use reply-to email or sender email for customer lookup
                 reply_email = email_data.get('reply_to_email') or email_data.get('sender_email', '')
                 
-            # Use AI to extract data from PDF or email if available
-            if document_analyzer is None:
+            # Use AI to extract data from email if available (documents may still
+            # be handled by the template fast path without the AI analyzer)
+            if document_analyzer is None and is_email:
                 return jsonify({"error": "AI analyzer not available. Please check GEMINI_API_KEY configuration."}), 500
                 
             logger.info(f"Processing {filename} as {document_type} (is_email={is_email})")
@@ -460,7 +667,7 @@ def upload_pdf():
                                 break
                         
                         logger.info(f"Attempting to analyze PDF attachment: {pdf_attachment_path}")
-                        pdf_result = document_analyzer.analyze_document(
+                        pdf_result = extraction_engine.analyze_document(
                             pdf_path=pdf_attachment_path,
                             email_body=None,  # Don't use email body when we have PDF
                             document_type=document_type
@@ -507,135 +714,13 @@ def upload_pdf():
                 # Validate it's not accidentally an email file
                 if file_ext == 'msg':
                     raise ValueError("Email files must be processed through email parsing logic")
-                ai_result = document_analyzer.analyze_document(
+                ai_result = extraction_engine.analyze_document(
                     pdf_path=file_path,
                     email_body="",  # No email body for direct uploads
                     document_type=document_type
                 )
             
-            # Calculate dates (similar to AWS Lambda logic)
-            # Measure date: today + 5 days
-            measure_date = (datetime.now(timezone.utc) + timedelta(days=5)).strftime("%Y-%m-%d")
-            
-            # Estimated delivery date: use end_date if present, otherwise today + 21 days
-            if ai_result.end_date:
-                estimated_delivery_date = ai_result.end_date
-            else:
-                estimated_delivery_date = (datetime.now(timezone.utc) + timedelta(days=21)).strftime("%Y-%m-%d")
-            
-            # Convert AI result to dictionary format
-            # Handle different document types for number field
-            # Note: AIProcessingResult only has po_number, which is used for all document types
-            number_field = ai_result.po_number or ''
-            
-            # Handle dollar amount with special logic for customer enquiry
-            dollar_value = 1.0  # Default for customer enquiry
-            if ai_result.amount:
-                try:
-                    amount_str = ai_result.amount.replace('$', '').replace(',', '')
-                    dollar_value = float(amount_str)
-                except (ValueError, AttributeError):
-                    dollar_value = 1.0
-            elif document_type != "customer_enquiry":
-                dollar_value = 1.0
-            
-            # Extract supervisor and customer contact info from main_contacts
-            supervisor_name = ''
-            supervisor_phone = ''
-            supervisor_mobile = ''
-            customer_phone = ''
-            customer_mobile = ''
-            customer_email = ''
-            customer_first_name = ''
-            customer_last_name = ''
-            
-            main_contacts = ai_result.main_contacts or []
-            if main_contacts:
-                # Find supervisor contact (look for titles like "Supervisor", "Site Manager", etc.)
-                supervisor_keywords = ['supervisor', 'super', 'site manager', 'site mgr', 'foreman', 'foreperson']
-                supervisor_contact = None
-                
-                for contact in main_contacts:
-                    title = (contact.get('title') or '').lower()
-                    if any(keyword in title for keyword in supervisor_keywords):
-                        supervisor_contact = contact
-                        break
-                
-                # Extract supervisor info if found
-                if supervisor_contact:
-                    supervisor_name = f"{supervisor_contact.get('first_name', '')} {supervisor_contact.get('last_name', '')}".strip()
-                    supervisor_phone = supervisor_contact.get('phone', '') or ''
-                    supervisor_mobile = supervisor_contact.get('mobile', '') or ''
-                
-                # Extract customer contact info from first contact (or first non-supervisor contact)
-                customer_contact = None
-                if supervisor_contact and len(main_contacts) > 1:
-                    # Use second contact if first is supervisor
-                    customer_contact = main_contacts[1] if len(main_contacts) > 1 else main_contacts[0]
-                else:
-                    # Use first contact
-                    customer_contact = main_contacts[0] if main_contacts else None
-                
-                if customer_contact:
-                    customer_first_name = customer_contact.get('first_name', '') or ''
-                    customer_last_name = customer_contact.get('last_name', '') or ''
-                    customer_phone = customer_contact.get('phone', '') or ''
-                    customer_mobile = customer_contact.get('mobile', '') or ''
-                    customer_email = customer_contact.get('emails', '') or ''
-            
-            # Also check email_contact for customer info (prioritize over main_contacts if available)
-            email_contact = ai_result.email_contact or {}
-            if email_contact:
-                if not customer_first_name:
-                    customer_first_name = email_contact.get('first_name', '') or ''
-                if not customer_last_name:
-                    customer_last_name = email_contact.get('last_name', '') or ''
-                if not customer_phone:
-                    customer_phone = email_contact.get('phone', '') or ''
-                if not customer_mobile:
-                    customer_mobile = email_contact.get('mobile', '') or ''
-                if not customer_email:
-                    customer_email = email_contact.get('emails', '') or ''
-            
-            extracted_data = {
-                'po_number': number_field,
-                'customer_name': '',
-                'business_name': '',
-                'scope_of_work': ai_result.job_description or '',
-                'dollar_value': dollar_value,
-                'first_name': customer_first_name,
-                'last_name': customer_last_name,
-                'address1': ai_result.job_address.get('address1', '') if ai_result.job_address else '',
-                'address2': ai_result.job_address.get('address2', '') if ai_result.job_address else '',
-                'city': ai_result.job_address.get('city', '') if ai_result.job_address else '',
-                'state': ai_result.job_address.get('state', '') if ai_result.job_address else '',
-                'postal_code': ai_result.job_address.get('postalCode', '') if ai_result.job_address else '',
-                'phone': customer_phone,
-                'mobile': customer_mobile,
-                'email': customer_email,
-                'measure_date': measure_date,
-                'estimated_delivery_date': estimated_delivery_date,
-                'supervisor_name': supervisor_name,
-                'supervisor_phone': supervisor_phone,
-                'supervisor_mobile': supervisor_mobile,
-                'description_of_works': ai_result.job_description or '',
-                'builder_type': 'AI Processed',
-                'document_type': document_type,
-                'is_provisional': ai_result.is_provisional or False,
-                'job_summary': ai_result.job_summary or '',
-                'main_contacts': main_contacts,
-                'email_contact': email_contact,
-                'ai_model': ai_result.model_used,
-                'notes': ai_result.notes or '',
-                'salesperson': salesperson,
-                'contract_type': contract_type,
-                'order_type': order_type,
-                'ad_source': ad_source,
-                'date_type': date_type,
-                'required_date': required_date,
-                'labour_service_type': labour_service_type,
-                'customer_type': 'BUILDERS'  # PDF uploads default to BUILDERS
-            }
+            extracted_data = build_extracted_data(ai_result, document_type, settings, is_email=is_email)
             
             # For email files, prioritize email sender/reply-to information
             if is_email:
@@ -717,16 +802,6 @@ def upload_pdf():
                 
                 # For emails, default customer type to RESIDENTIAL (email requests from clients)
                 extracted_data['customer_type'] = 'RESIDENTIAL'
-            else:
-                # Extract main contact info if available (for PDF uploads)
-                if ai_result.main_contacts and len(ai_result.main_contacts) > 0:
-                    main_contact = ai_result.main_contacts[0]
-                    extracted_data['first_name'] = main_contact.get('first_name', '')
-                    extracted_data['last_name'] = main_contact.get('last_name', '')
-                    extracted_data['phone'] = main_contact.get('phone', '')
-                    extracted_data['mobile'] = main_contact.get('mobile', '')
-                    extracted_data['email'] = main_contact.get('emails', '')
-                    extracted_data['customer_name'] = f"{main_contact.get('first_name', '')} {main_contact.get('last_name', '')}".strip()
             
             # Save extracted data to session for preview
             session['extracted_data'] = extracted_data
@@ -782,6 +857,198 @@ def upload_pdf():
     flash('Invalid file type. Please upload a PDF or JPEG image.')
     return redirect(url_for('index'))
 
+BATCH_ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}
+
+# Batch uploads are analyzed off the request thread (Gemini is rate limited, so a large
+# ZIP takes minutes); job status is kept in memory and polled by the review page
+BATCH_JOB_TTL = timedelta(hours=6)
+_batch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='batch-ingest')
+_batch_jobs: Dict[str, Dict[str, Any]] = {}
+_batch_jobs_lock = threading.Lock()
+
+
+def ingest_batch(paths: List[str], document_type: str, settings: Dict, max_workers: int = DEFAULT_BATCH_WORKERS,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+    """
+    Analyze many purchase orders concurrently, committing each result as a PdfData row as it finishes.
+
+    Args:
+        paths: Saved files, ZIP archives or directories to ingest
+        document_type: purchase_order, quotation or customer_enquiry
+        settings: RFMS defaults applied to every document (see read_upload_settings)
+        max_workers: Maximum number of documents analyzed at the same time
+        on_progress: Optional callback receiving (documents done, total)
+
+    Returns:
+        Tuple of (BatchReport, list of created PdfData rows)
+    """
+    extract_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'batch', str(uuid.uuid4()))
+    file_paths = collect_batch_files(paths, extract_dir, BATCH_ALLOWED_EXTENSIONS)
+    logger.info(f"Starting batch analysis of {len(file_paths)} documents as {document_type} ({max_workers} workers)")
+    if on_progress is not None:
+        on_progress(0, len(file_paths))
+
+    # Each row is committed as soon as its document is analyzed (run_batch calls back on this
+    # thread, which has the app context), so finished documents show up in History while the
+    # batch runs and a crash part way through keeps the results already paid for
+    rows_by_path = {}
+
+    def save_item(item):
+        extracted_data = build_extracted_data(item.result, document_type, settings)
+        # There is no per-document session in a batch, so attach the source file the
+        # same way manual enquiry uploads are attached on export
+        extracted_data['attachments'] = [{
+            'path': os.path.abspath(item.path),
+            'original_filename': item.filename,
+        }]
+        pdf_data = PdfData(
+            filename=os.path.relpath(item.path, app.config['UPLOAD_FOLDER']),
+            customer_name=extracted_data.get('customer_name', ''),
+            business_name=extracted_data.get('business_name', ''),
+            po_number=extracted_data.get('po_number', ''),
+            scope_of_work=extracted_data.get('scope_of_work', ''),
+            dollar_value=extracted_data.get('dollar_value', 0),
+            extracted_data=extracted_data,
+            notes=extracted_data.get('notes', ''),
+            created_at=datetime.now()
+        )
+        try:
+            db.session.add(pdf_data)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to save batch result for {item.filename}: {e}")
+            item.error = f"Analyzed but not saved: {e}"
+            return
+        rows_by_path[item.path] = pdf_data
+
+    report = run_batch(
+        file_paths,
+        lambda path: extraction_engine.analyze_document(pdf_path=path, email_body="", document_type=document_type),
+        max_workers=max_workers,
+        on_progress=on_progress,
+        on_item=save_item
+    )
+
+    pdf_rows = [rows_by_path[item.path] for item in report.succeeded if item.path in rows_by_path]
+    return report, pdf_rows
+
+
+@app.route('/upload-batch', methods=['POST'])
+def upload_batch():
+    """Analyze a batch of PO files (or ZIP archives) and show them as a review queue."""
+    files = [f for f in request.files.getlist('pdf_files') if f and f.filename]
+    if not files:
+        flash('No files selected for batch upload')
+        return redirect(url_for('index'))
+
+    try:
+        document_type = normalize_document_type(request.form.get('document_type'))
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('index'))
+    settings = read_upload_settings(request.form)
+
+    batch_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'batch', str(uuid.uuid4()))
+    os.makedirs(batch_dir, exist_ok=True)
+    saved_paths = []
+    for file in files:
+        filename = secure_filename(file.filename)
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if ext != 'zip' and ext not in BATCH_ALLOWED_EXTENSIONS:
+            logger.warning(f"Skipping unsupported batch file: {file.filename}")
+            continue
+        # Two uploads with the same name (e.g. PO.pdf from different folders) must not overwrite each other
+        file_path = unique_path(batch_dir, filename)
+        file.save(file_path)
+        saved_paths.append(file_path)
+
+    if not saved_paths:
+        flash('No supported files in batch upload (PDF, JPEG, PNG or ZIP)')
+        return redirect(url_for('index'))
+
+    _prune_batch_jobs()
+    job_id = uuid.uuid4().hex
+    with _batch_jobs_lock:
+        _batch_jobs[job_id] = {
+            'state': 'queued',
+            'done': 0,
+            'total': None,
+            'report': None,
+            'pdf_ids': [],
+            'error': None,
+            'created': time.time(),
+            'updated': time.time(),
+        }
+    _batch_executor.submit(_run_batch_job, job_id, saved_paths, document_type, settings)
+    return redirect(url_for('batch_review', job_id=job_id))
+
+
+def _prune_batch_jobs() -> None:
+    """Forget finished batch jobs older than BATCH_JOB_TTL."""
+    cutoff = time.time() - BATCH_JOB_TTL.total_seconds()
+    with _batch_jobs_lock:
+        for job_id in [jid for jid, job in _batch_jobs.items()
+                       if job['state'] in ('done', 'failed') and job['updated'] < cutoff]:
+            del _batch_jobs[job_id]
+
+
+def _update_batch_job(job_id: str, **fields) -> None:
+    with _batch_jobs_lock:
+        _batch_jobs[job_id].update(fields, updated=time.time())
+
+
+def _run_batch_job(job_id: str, paths: List[str], document_type: str, settings: Dict) -> None:
+    """Analyze an uploaded batch and record the outcome (runs on the batch executor)."""
+    with app.app_context():
+        try:
+            _update_batch_job(job_id, state='analyzing')
+            report, pdf_rows = ingest_batch(
+                paths, document_type, settings,
+                on_progress=lambda done, total: _update_batch_job(job_id, done=done, total=total)
+            )
+            _update_batch_job(job_id, state='done', report=report, pdf_ids=[row.id for row in pdf_rows])
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Batch upload {job_id} failed: {e}", exc_info=True)
+            _update_batch_job(job_id, state='failed', error=str(e))
+
+
+def _batch_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _batch_jobs_lock:
+        job = _batch_jobs.get(job_id)
+        return dict(job) if job else None
+
+
+@app.route('/batch/<job_id>')
+def batch_review(job_id):
+    """Batch progress while it is analyzed, then the review queue."""
+    job = _batch_job(job_id)
+    if job is None:
+        flash('Batch not found (finished batches are kept for a few hours; see History)', 'warning')
+        return redirect(url_for('index'))
+    pdf_rows = []
+    if job['state'] == 'done':
+        rows = {row.id: row for row in PdfData.query.filter(PdfData.id.in_(job['pdf_ids'])).all()}
+        pdf_rows = [rows[pdf_id] for pdf_id in job['pdf_ids'] if pdf_id in rows]
+    return render_template('batch_review.html', job_id=job_id, job=job, report=job['report'], pdf_rows=pdf_rows)
+
+
+@app.route('/api/batch/<job_id>')
+def batch_status(job_id):
+    """Progress of a batch upload (JSON), polled by the review page."""
+    job = _batch_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify({
+        'job_id': job_id,
+        'state': job['state'],
+        'done': job['done'],
+        'total': job['total'],
+        'error': job['error'],
+    })
+
+
 @app.route('/preview/<int:pdf_id>')
 def preview_data(pdf_id):
     """Preview extracted data before creating quote/job."""
@@ -793,6 +1060,20 @@ def history():
     """Display all processed jobs with filtering and search capabilities."""
     return render_template('history.html')
 
+@app.route('/admin/performance')
+def performance():
+    """p50/p95 per route and per external call (RFMS, Gemini, Graph) since the app started."""
+    data = trace_stats()
+    if request.args.get('format') == 'json':
+        return jsonify(data)
+    return render_template('performance.html', routes=data['routes'], calls=data['calls'])
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (aggregated across worker processes when PROMETHEUS_MULTIPROC_DIR is set)."""
+    body, content_type = metrics_response()
+    return Response(body, content_type=content_type)
+
 @app.route('/api/history/search')
 def history_search():
     """API endpoint for searching/filtering history."""
@@ -1122,6 +1403,12 @@ def delete_upload(pdf_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/extraction-stats', methods=['GET'])
+def extraction_stats():
+    """Report how many uploads were served by the template fast path vs the AI analyzer."""
+    return jsonify(extraction_engine.get_stats())
+
+
 # Cache RFMS status check results to reduce API calls
 _rfms_status_cache = {
     'result': None,
@@ -2258,7 +2545,7 @@ def receive_inventory():
                             order_date=order_date
                         )
                         if no_invoice_notification_sent:
-                            logger.info(f"Sent notification email to accounts about missing invoice for order {order_number}")
+                            logger.info(f"Queued notification email to accounts about missing invoice for order {order_number}")
                     except Exception as e:
                         logger.error(f"Failed to send no-invoice notification: {e}", exc_info=True)
                 
@@ -3349,176 +3636,6 @@ def download_rfms_attachment(rfms_client: RFMSClient, attachment: Dict, output_d
     return file_path
 
 
-def compress_image(image_path: Path, max_size: tuple = (1920, 1920), quality: int = 75) -> Path:
-    """Compress an image file."""
-    try:
-        from PIL import Image
-    except ImportError:
-        logger.warning("Pillow not available, skipping compression")
-        return image_path
-    
-    try:
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize if necessary
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Save compressed version
-            compressed_path = image_path.parent / f"compressed_{image_path.name}"
-            img.save(compressed_path, 'JPEG', quality=quality, optimize=True)
-            
-            original_size = image_path.stat().st_size
-            compressed_size = compressed_path.stat().st_size
-            logger.info(f"Compressed {image_path.name}: {original_size:,} bytes -> {compressed_size:,} bytes")
-            
-            return compressed_path
-    except Exception as e:
-        logger.error(f"Failed to compress {image_path}: {e}")
-        return image_path
-
-
-def create_pdf_from_images(image_paths: List[Path], output_pdf_path: Path, order_details: Dict = None) -> Path:
-    """Create a PDF file from a list of image paths with optional order details header."""
-    try:
-        import fitz  # PyMuPDF
-        doc = fitz.open()
-        
-        # Calculate header height if order details provided
-        header_height = 0
-        if order_details:
-            header_height = 80  # Height for header with order details
-        
-        for img_path in image_paths:
-            try:
-                from PIL import Image
-                img = Image.open(img_path)
-                img_width, img_height = img.size
-                
-                # Create page with space for header
-                page_height = img_height + header_height
-                page = doc.new_page(width=img_width, height=page_height)
-                
-                # Add header if order details provided
-                if order_details and header_height > 0:
-                    add_pdf_header(page, order_details, img_width, header_height)
-                
-                # Insert image below header
-                image_rect = fitz.Rect(0, header_height, img_width, page_height)
-                page.insert_image(image_rect, filename=str(img_path))
-            except Exception as e:
-                logger.error(f"Failed to add image {img_path} to PDF: {e}")
-                continue
-        
-        doc.save(str(output_pdf_path))
-        doc.close()
-        logger.info(f"Created PDF with {len(image_paths)} images: {output_pdf_path}")
-        return output_pdf_path
-    except ImportError:
-        raise ImportError("PyMuPDF (pymupdf) is required for PDF creation")
-
-
-def add_pdf_header(page, order_details: Dict, page_width: float, header_height: float):
-    """Add order details header to a PDF page."""
-    try:
-        margin = 10
-        y_pos = 8
-        
-        # Draw header background
-        header_rect = fitz.Rect(0, 0, page_width, header_height)
-        page.draw_rect(header_rect, color=(0.94, 0.94, 0.94), fill=(0.94, 0.94, 0.94))
-        
-        # Get order information
-        order_number = order_details.get('order_number', 'N/A')
-        po_number = order_details.get('po_number', '')
-        sold_to_name = order_details.get('sold_to_name', '')
-        ship_to_name = order_details.get('ship_to_name', '')
-        address = order_details.get('address', '')
-        city = order_details.get('city', '')
-        
-        # Order Number (left side, bold)
-        page.insert_text(
-            (margin, y_pos),
-            f"Order: {order_number}",
-            fontsize=10,
-            color=(0, 0, 0),
-            fontname="helv",
-            render_mode=3  # Bold
-        )
-        
-        # PO Number (right side, if available)
-        if po_number:
-            po_text = f"PO: {po_number}"
-            text_width = page.get_text_length(po_text, fontsize=10, fontname="helv")
-            page.insert_text(
-                (page_width - margin - text_width, y_pos),
-                po_text,
-                fontsize=10,
-                color=(0, 0, 0)
-            )
-        
-        y_pos += 15
-        
-        # Builder/Customer Name (left side, bold)
-        if sold_to_name:
-            page.insert_text(
-                (margin, y_pos),
-                f"Builder/Customer: {sold_to_name}",
-                fontsize=10,
-                color=(0, 0, 0),
-                fontname="helv",
-                render_mode=3  # Bold
-            )
-        
-        y_pos += 15
-        
-        # Ship To Customer (if different from sold to)
-        if ship_to_name and ship_to_name != sold_to_name:
-            page.insert_text(
-                (margin, y_pos),
-                f"Ship To: {ship_to_name}",
-                fontsize=10,
-                color=(0, 0, 0)
-            )
-            y_pos += 15
-        
-        # Address (if available)
-        if address or city:
-            address_text = f"{address}, {city}".strip(', ')
-            if address_text:
-                # Truncate if too long
-                max_width = page_width - (2 * margin)
-                if page.get_text_length(address_text, fontsize=10) > max_width:
-                    while page.get_text_length(address_text + '...', fontsize=10) > max_width and len(address_text) > 0:
-                        address_text = address_text[:-1]
-                    address_text += '...'
-                page.insert_text(
-                    (margin, y_pos),
-                    f"Address: {address_text}",
-                    fontsize=10,
-                    color=(0, 0, 0)
-                )
-        
-        # Draw line under header
-        line_y = header_height - 5
-        page.draw_line(
-            (margin, line_y),
-            (page_width - margin, line_y),
-            color=(0.78, 0.78, 0.78),
-            width=1
-        )
-    except Exception as e:
-        logger.error(f"Failed to add PDF header: {e}")
-
-
 # Installer Photos Routes
 @app.route('/installer-photos')
 def installer_photos():
@@ -3692,9 +3809,11 @@ def fetch_order_attachments():
 
 @app.route('/api/attachment-thumbnail/<int:attachment_id>')
 def get_attachment_thumbnail(attachment_id):
-    """API endpoint to get a thumbnail preview of an attachment."""
-    try:
-        # Get attachment data
+    """API endpoint to get a thumbnail preview of an attachment (images and PDF first pages)."""
+    loaded = {}
+    
+    def load():
+        # Only runs for the first of any concurrent requests for this attachment
         attachment_data = rfms_client.get_attachment(attachment_id)
         
         # Handle different response structures to get file data
@@ -3713,16 +3832,16 @@ def get_attachment_thumbnail(attachment_id):
                                 attachment_data.get('file'))
         
         if not file_data_b64:
-            return jsonify({'success': False, 'error': 'No file data found'}), 404
+            raise ThumbnailUnavailable('No file data found')
         
         # Decode base64 data
         try:
             file_bytes = base64.b64decode(file_data_b64)
         except Exception as e:
             logger.error(f"Failed to decode attachment {attachment_id}: {e}")
-            return jsonify({'success': False, 'error': 'Failed to decode attachment'}), 500
+            raise ThumbnailUnavailable('Failed to decode attachment')
         
-        # Determine if it's an image - try multiple sources
+        # Determine the file type - try multiple sources
         file_extension = None
         if isinstance(attachment_data, dict):
             file_extension = (attachment_data.get('fileExtension') or 
@@ -3732,7 +3851,7 @@ def get_attachment_thumbnail(attachment_id):
             # If not found, try content type
             if not file_extension:
                 content_type = attachment_data.get('contentType') or attachment_data.get('mimeType') or attachment_data.get('content_type') or ''
-                if 'image' in content_type.lower() and '/' in content_type:
+                if ('image' in content_type.lower() or 'pdf' in content_type.lower()) and '/' in content_type:
                     file_extension = content_type.split('/')[-1].split(';')[0].strip()
         
         # Default to jpg if still not found (common for installer photos)
@@ -3741,48 +3860,30 @@ def get_attachment_thumbnail(attachment_id):
         
         # Clean up extension (remove leading dot if present)
         file_extension = file_extension.lstrip('.').lower()
-        
-        is_image = file_extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif']
-        
-        # For images, create a thumbnail
-        if is_image:
-            try:
-                from PIL import Image as PILImage
-                import io
-                
-                # Open image
-                img = PILImage.open(io.BytesIO(file_bytes))
-                
-                # Create thumbnail (max 200x200)
-                img.thumbnail((200, 200), PILImage.Resampling.LANCZOS)
-                
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = PILImage.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Save to bytes
-                output = io.BytesIO()
-                img.save(output, format='JPEG', quality=85)
-                thumbnail_bytes = output.getvalue()
-                
-                # Return as image response
-                from flask import Response
-                return Response(thumbnail_bytes, mimetype='image/jpeg')
-                
-            except Exception as e:
-                logger.error(f"Failed to create thumbnail for attachment {attachment_id}: {e}")
-                # Return original image if thumbnail fails
-                return Response(file_bytes, mimetype=f'image/{file_extension.replace(".", "")}')
-        else:
-            # For non-images, return a generic file icon or 404
-            # Could create a PDF thumbnail here in the future
-            return jsonify({'success': False, 'error': 'Preview not available for this file type'}), 404
+        loaded.update(file_bytes=file_bytes, file_extension=file_extension)
+        return file_bytes, file_extension
+    
+    try:
+        # Rendered in the thumbnail worker processes, as AVIF/WebP when the browser accepts it
+        thumbnail = get_thumbnail_service().get(attachment_id, load, accept=request.headers.get('Accept'))
+        response = Response(thumbnail.data, mimetype=thumbnail.mimetype)
+        response.headers['Vary'] = 'Accept'
+        response.headers['Cache-Control'] = 'private, max-age=86400'
+        return response
+    
+    except ThumbnailBusy as e:
+        logger.warning(f"Thumbnail for attachment {attachment_id} not rendered: {e}")
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+    
+    except ThumbnailUnavailable as e:
+        file_extension = loaded.get('file_extension')
+        if loaded.get('file_bytes') and file_extension in IMAGE_EXTENSIONS:
+            logger.error(f"Failed to create thumbnail for attachment {attachment_id}: {e}")
+            # Return original image if thumbnail fails
+            return Response(loaded['file_bytes'], mimetype=f'image/{file_extension}')
+        return jsonify({'success': False, 'error': str(e)}), 404
     
     except Exception as e:
         logger.error(f"Error getting attachment thumbnail {attachment_id}: {str(e)}")
@@ -3855,31 +3956,16 @@ def get_attachment_file(attachment_id):
         }
         content_type = mime_types.get(file_extension, 'application/octet-stream')
         
-        # If thumbnail requested and it's an image, create thumbnail
-        if thumbnail and file_extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
+        # If thumbnail requested and it's an image or PDF, render one in the thumbnail workers
+        if thumbnail and preview_kind(file_bytes, file_extension):
             try:
-                from PIL import Image as PILImage
-                import io
-                
-                img = PILImage.open(io.BytesIO(file_bytes))
-                img.thumbnail((200, 200), PILImage.Resampling.LANCZOS)
-                
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = PILImage.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                output = io.BytesIO()
-                img.save(output, format='JPEG', quality=85)
-                file_bytes = output.getvalue()
-                content_type = 'image/jpeg'
+                rendered = get_thumbnail_service().get(attachment_id, lambda: (file_bytes, file_extension),
+                                                       accept=request.headers.get('Accept'))
+                file_bytes = rendered.data
+                content_type = rendered.mimetype
             except Exception as e:
                 logger.warning(f"Failed to create thumbnail for attachment {attachment_id}: {e}")
-                # Return original image if thumbnail fails
+                # Return original file if thumbnail fails
         
         # Return as file response
         from flask import Response
@@ -3944,50 +4030,6 @@ def create_installer_pdf():
         logger.info(f"Working directory: {temp_dir}")
         
         try:
-            # Download attachments and keep track of which are installer photos
-            downloaded_files = []
-            attachment_file_map = []  # List of tuples: (attachment, file_path, is_installer_photo)
-            
-            for attachment in selected_attachments:
-                try:
-                    file_path = download_rfms_attachment(rfms_client, attachment, temp_dir)
-                    is_installer = is_installer_photo(attachment)
-                    downloaded_files.append(file_path)
-                    attachment_file_map.append((attachment, file_path, is_installer))
-                except Exception as e:
-                    logger.error(f"Failed to download attachment {attachment.get('id')}: {e}")
-                    continue
-            
-            if not downloaded_files:
-                return jsonify({'success': False, 'error': 'No attachments were successfully downloaded'}), 500
-            
-            # Compress images
-            compressed_files = []
-            compressed_attachment_map = []  # Updated map with compressed paths
-            for attachment, file_path, is_installer in attachment_file_map:
-                try:
-                    if not file_path.exists():
-                        logger.error(f"Downloaded file does not exist: {file_path}")
-                        continue
-                    
-                    compressed_path = compress_image(file_path)
-                    if compressed_path.exists():
-                        compressed_files.append(compressed_path)
-                        compressed_attachment_map.append((attachment, compressed_path, is_installer))
-                    else:
-                        logger.warning(f"Compressed file was not created, using original: {file_path}")
-                        compressed_files.append(file_path)
-                        compressed_attachment_map.append((attachment, file_path, is_installer))
-                except Exception as e:
-                    logger.warning(f"Failed to compress {file_path}: {e}, using original")
-                    if file_path.exists():
-                        compressed_files.append(file_path)
-                        compressed_attachment_map.append((attachment, file_path, is_installer))
-            
-            if not compressed_files:
-                logger.error("No files available for PDF creation after compression step")
-                return jsonify({'success': False, 'error': 'No valid image files available for PDF creation'}), 500
-            
             # Set network folder to shared server location
             network_folder = r'\\AtozServer\AtoZ ShareDrive\BUILDERS INVOICE PICTURES'
             try:
@@ -4000,32 +4042,6 @@ def create_installer_pdf():
                 os.makedirs(network_folder, exist_ok=True)
                 logger.warning(f"Using fallback folder: {network_folder}")
             
-            # Save individual installer photos to network folder
-            installer_photo_count = 0
-            for attachment, file_path, is_installer in compressed_attachment_map:
-                if is_installer:
-                    installer_photo_count += 1
-                    # Get file extension from original attachment or file
-                    file_extension = attachment.get('fileExtension', '')
-                    if not file_extension:
-                        # Try to get from file path
-                        file_extension = Path(file_path).suffix
-                    if not file_extension or file_extension == '':
-                        file_extension = '.jpg'  # Default to jpg
-                    if not file_extension.startswith('.'):
-                        file_extension = '.' + file_extension
-                    
-                    # Create filename: {ORDER_NUMBER}_install_Photo_{NUMBER}
-                    individual_filename = f"{order_number}_install_Photo_{installer_photo_count}{file_extension}"
-                    individual_path = Path(network_folder) / individual_filename
-                    
-                    try:
-                        # Copy the file to network location
-                        shutil.copy2(file_path, individual_path)
-                        logger.info(f"Saved installer photo to network folder: {individual_path}")
-                    except Exception as e:
-                        logger.error(f"Failed to save installer photo {individual_filename} to network folder: {e}")
-            
             # Create PDF
             pdf_filename = f"{order_number}_installer_photos.pdf"
             
@@ -4063,17 +4079,52 @@ def create_installer_pdf():
                     }
                     logger.info(f"PDF header details: {pdf_order_details}")
             
-            # Save PDF to network folder
-            network_pdf_path = Path(network_folder) / pdf_filename
+            # Number installer photos in selection order: {ORDER_NUMBER}_install_Photo_{NUMBER}
+            installer_photo_numbers = {}
+            for attachment in selected_attachments:
+                if is_installer_photo(attachment):
+                    installer_photo_numbers[attachment_key(attachment)] = len(installer_photo_numbers) + 1
             
+            # Build or update the PDF on the network folder; only photos not already in it are downloaded
             try:
-                create_pdf_from_images(compressed_files, network_pdf_path, pdf_order_details)
-                logger.info(f"Saved PDF to network folder: {network_pdf_path}")
-                if installer_photo_count > 0:
-                    logger.info(f"Saved {installer_photo_count} individual installer photos to network folder")
+                export = export_order_photos(
+                    selected_attachments,
+                    lambda attachment: download_rfms_attachment(rfms_client, attachment, temp_dir),
+                    Path(network_folder),
+                    pdf_filename,
+                    manifest_name=f"{order_number}_installer_photos",
+                    order_details=pdf_order_details,
+                )
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 500
             except Exception as pdf_error:
                 logger.error(f"Error creating PDF: {pdf_error}", exc_info=True)
                 return jsonify({'success': False, 'error': f'Failed to create PDF: {str(pdf_error)}'}), 500
+            network_pdf_path = export['path']
+            logger.info(f"PDF {export['status']} in network folder: {network_pdf_path} ({export['added']} new of {export['pages']} pages)")
+            
+            # Save individual installer photos added this time to network folder
+            installer_photo_count = 0
+            for attachment, prepared in export['new_images']:
+                photo_number = installer_photo_numbers.get(attachment_key(attachment))
+                if not photo_number:
+                    continue
+                # Get file extension from original attachment or file
+                file_extension = attachment.get('fileExtension', '') or prepared.source.suffix or '.jpg'
+                if not file_extension.startswith('.'):
+                    file_extension = '.' + file_extension
+                
+                individual_filename = f"{order_number}_install_Photo_{photo_number}{file_extension}"
+                individual_path = Path(network_folder) / individual_filename
+                try:
+                    # Write the compressed photo to network location
+                    atomic_write_bytes(individual_path, prepared.data)
+                    installer_photo_count += 1
+                    logger.info(f"Saved installer photo to network folder: {individual_path}")
+                except Exception as e:
+                    logger.error(f"Failed to save installer photo {individual_filename} to network folder: {e}")
+            if installer_photo_count > 0:
+                logger.info(f"Saved {installer_photo_count} individual installer photos to network folder")
             
             # Verify PDF file exists before sending
             if not network_pdf_path.exists():
@@ -4405,9 +4456,151 @@ def fetch_scheduled_jobs():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _build_order_photos_pdf(order_number, temp_dir):
+    """
+    Build or update one order's installer photos PDF in the network folder.
+
+    Args:
+        order_number: RFMS order number (upper case)
+        temp_dir: Working directory for downloaded attachments
+
+    Returns:
+        Result dict: order_number, success and either filename/path/size/status or error
+    """
+    import time
+    order_start_time = time.time()
+    
+    try:
+        # Get order attachments
+        logger.debug(f"Fetching order data for {order_number}...")
+        order_data = rfms_client.get_order(order_number, locked=False, include_attachments=True)
+        
+        # Extract attachments
+        attachments = []
+        if isinstance(order_data, dict):
+            detail = order_data.get('detail')
+            result = order_data.get('result')
+            data_obj = order_data.get('data')
+            
+            attachments = (order_data.get('attachments') or 
+                          (result.get('attachments') if isinstance(result, dict) else None) or
+                          (detail.get('attachments') if isinstance(detail, dict) else None) or
+                          (data_obj.get('attachments') if isinstance(data_obj, dict) else None) or
+                          [])
+        
+        # Filter for installer photos only
+        installer_photos = [att for att in attachments if is_installer_photo(att)]
+        
+        if not installer_photos:
+            return {
+                'order_number': order_number,
+                'success': False,
+                'error': 'No installer photos found'
+            }
+        
+        # Create PDF with proper naming: AZ######_Pics_DDMMYY
+        today = datetime.now()
+        date_str = today.strftime('%d%m%y')  # DDMMYY format (Australian short date)
+        pdf_filename = f"{order_number}_Pics_{date_str}.pdf"
+        
+        # Save to network folder
+        network_folder = os.getenv('INSTALLER_PHOTOS_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'installer_photos'))
+        os.makedirs(network_folder, exist_ok=True)
+        
+        # Extract order details for PDF header
+        pdf_order_details = {}
+        if isinstance(order_data, dict):
+            result = order_data.get('result')
+            if isinstance(result, dict):
+                sold_to = result.get('soldTo', {})
+                ship_to = result.get('shipTo', {})
+                
+                # Format sold to name
+                sold_to_name = ''
+                if sold_to:
+                    if sold_to.get('businessName'):
+                        sold_to_name = sold_to.get('businessName')
+                    elif sold_to.get('firstName') or sold_to.get('lastName'):
+                        sold_to_name = f"{sold_to.get('firstName', '')} {sold_to.get('lastName', '')}".strip()
+                
+                # Format ship to name
+                ship_to_name = ''
+                if ship_to:
+                    if ship_to.get('businessName'):
+                        ship_to_name = ship_to.get('businessName')
+                    elif ship_to.get('firstName') or ship_to.get('lastName'):
+                        ship_to_name = f"{ship_to.get('firstName', '')} {ship_to.get('lastName', '')}".strip()
+                
+                pdf_order_details = {
+                    'order_number': result.get('number') or order_number,
+                    'po_number': result.get('poNumber') or result.get('po_number') or '',
+                    'sold_to_name': sold_to_name,
+                    'ship_to_name': ship_to_name,
+                    'address': ship_to.get('address1') or '',
+                    'city': ship_to.get('city') or '',
+                }
+        
+        # Build or update the PDF; orders whose photos are already exported are skipped,
+        # and only photos added since the last export are downloaded and appended
+        pdf_timings = {}
+        try:
+            export = export_order_photos(
+                installer_photos,
+                lambda attachment: download_rfms_attachment(rfms_client, attachment, temp_dir),
+                Path(network_folder),
+                pdf_filename,
+                manifest_name=f"{order_number}_Pics",
+                order_details=pdf_order_details,
+                timings=pdf_timings,
+            )
+        except ValueError as e:
+            return {
+                'order_number': order_number,
+                'success': False,
+                'error': str(e)
+            }
+        network_pdf_path = export['path']
+        pdf_filename = network_pdf_path.name
+        
+        # Get PDF size for response
+        pdf_size = network_pdf_path.stat().st_size if network_pdf_path.exists() else 0
+        
+        order_duration = time.time() - order_start_time
+        logger.info(f"PDF for {order_number} {export['status']}: {network_pdf_path} ({pdf_size} bytes, "
+                    f"{export['added']} new of {export['pages']} pages) in {order_duration:.2f}s "
+                    f"(images {pdf_timings.get('images', 0):.2f}s, header {pdf_timings.get('header', 0):.3f}s, "
+                    f"save {pdf_timings.get('save', 0):.2f}s)")
+        
+        return {
+            'order_number': order_number,
+            'success': True,
+            'filename': pdf_filename,
+            'path': str(network_pdf_path),
+            'size': pdf_size,
+            'status': export['status']
+        }
+    
+    except Exception as e:
+        order_duration = time.time() - order_start_time
+        logger.error(f"Error creating PDF for {order_number} after {order_duration:.2f}s: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return {
+            'order_number': order_number,
+            'success': False,
+            'error': str(e)
+        }
+
+
 @app.route('/api/create-multiple-installer-pdfs', methods=['POST'])
 def create_multiple_installer_pdfs():
-    """API endpoint to create multiple PDFs from selected orders."""
+    """
+    API endpoint to create PDFs for selected orders, streamed back as one ZIP.
+
+    Orders are built until the first PDF succeeds; the response then starts and each
+    further PDF is written into the ZIP (STORED - the PDFs are already compressed) as
+    soon as it is built. No archive is written to disk.
+    """
     import time
     start_time = time.time()
     
@@ -4428,222 +4621,61 @@ def create_multiple_installer_pdfs():
                 'error': f'Too many orders selected ({len(order_numbers)}). Maximum is {max_orders}. Please select fewer orders.'
             }), 400
         
-        # Generate PDFs for each order
+        # Generate PDFs for each order, lazily
         pdf_results = []
         temp_dir = Path(tempfile.mkdtemp(prefix="multiple_installer_photos_"))
         
-        try:
+        def build_results():
             for idx, order_number in enumerate(order_numbers, 1):
-                order_start_time = time.time()
                 order_number = str(order_number).strip().upper()
                 logger.info(f"Processing order {idx}/{len(order_numbers)}: {order_number}")
-                
-                try:
-                    # Get order attachments
-                    logger.debug(f"Fetching order data for {order_number}...")
-                    order_data = rfms_client.get_order(order_number, locked=False, include_attachments=True)
-                    
-                    # Extract attachments
-                    attachments = []
-                    if isinstance(order_data, dict):
-                        detail = order_data.get('detail')
-                        result = order_data.get('result')
-                        data_obj = order_data.get('data')
-                        
-                        attachments = (order_data.get('attachments') or 
-                                      (result.get('attachments') if isinstance(result, dict) else None) or
-                                      (detail.get('attachments') if isinstance(detail, dict) else None) or
-                                      (data_obj.get('attachments') if isinstance(data_obj, dict) else None) or
-                                      [])
-                    
-                    # Filter for installer photos only
-                    installer_photos = [att for att in attachments if is_installer_photo(att)]
-                    
-                    if not installer_photos:
-                        pdf_results.append({
-                            'order_number': order_number,
-                            'success': False,
-                            'error': 'No installer photos found'
-                        })
-                        continue
-                    
-                    # Download attachments
-                    downloaded_files = []
-                    for attachment in installer_photos:
-                        try:
-                            file_path = download_rfms_attachment(rfms_client, attachment, temp_dir)
-                            downloaded_files.append(file_path)
-                        except Exception as e:
-                            logger.error(f"Failed to download attachment for {order_number}: {e}")
-                            continue
-                    
-                    if not downloaded_files:
-                        pdf_results.append({
-                            'order_number': order_number,
-                            'success': False,
-                            'error': 'No attachments were successfully downloaded'
-                        })
-                        continue
-                    
-                    # Compress images
-                    compressed_files = []
-                    for file_path in downloaded_files:
-                        try:
-                            compressed_path = compress_image(file_path)
-                            compressed_files.append(compressed_path)
-                        except Exception as e:
-                            logger.warning(f"Failed to compress {file_path}: {e}, using original")
-                            compressed_files.append(file_path)
-                    
-                    # Create PDF with proper naming: AZ######_Pics_DDMMYY
-                    today = datetime.now()
-                    date_str = today.strftime('%d%m%y')  # DDMMYY format (Australian short date)
-                    pdf_filename = f"{order_number}_Pics_{date_str}.pdf"
-                    
-                    # Save to network folder
-                    network_folder = os.getenv('INSTALLER_PHOTOS_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'installer_photos'))
-                    os.makedirs(network_folder, exist_ok=True)
-                    network_pdf_path = Path(network_folder) / pdf_filename
-                    
-                    # Extract order details for PDF header
-                    pdf_order_details = {}
-                    if isinstance(order_data, dict):
-                        result = order_data.get('result')
-                        if isinstance(result, dict):
-                            sold_to = result.get('soldTo', {})
-                            ship_to = result.get('shipTo', {})
-                            
-                            # Format sold to name
-                            sold_to_name = ''
-                            if sold_to:
-                                if sold_to.get('businessName'):
-                                    sold_to_name = sold_to.get('businessName')
-                                elif sold_to.get('firstName') or sold_to.get('lastName'):
-                                    sold_to_name = f"{sold_to.get('firstName', '')} {sold_to.get('lastName', '')}".strip()
-                            
-                            # Format ship to name
-                            ship_to_name = ''
-                            if ship_to:
-                                if ship_to.get('businessName'):
-                                    ship_to_name = ship_to.get('businessName')
-                                elif ship_to.get('firstName') or ship_to.get('lastName'):
-                                    ship_to_name = f"{ship_to.get('firstName', '')} {ship_to.get('lastName', '')}".strip()
-                            
-                            pdf_order_details = {
-                                'order_number': result.get('number') or order_number,
-                                'po_number': result.get('poNumber') or result.get('po_number') or '',
-                                'sold_to_name': sold_to_name,
-                                'ship_to_name': ship_to_name,
-                                'address': ship_to.get('address1') or '',
-                                'city': ship_to.get('city') or '',
-                            }
-                    
-                    # Create PDF - function saves to output_pdf_path and returns the path
-                    pdf_path = create_pdf_from_images(compressed_files, network_pdf_path, pdf_order_details)
-                    
-                    # Get PDF size for response
-                    pdf_size = pdf_path.stat().st_size if pdf_path.exists() else 0
-                    
-                    order_duration = time.time() - order_start_time
-                    logger.info(f"Created PDF for {order_number}: {network_pdf_path} ({pdf_size} bytes) in {order_duration:.2f}s")
-                    
-                    pdf_results.append({
-                        'order_number': order_number,
-                        'success': True,
-                        'filename': pdf_filename,
-                        'path': str(network_pdf_path),
-                        'size': pdf_size
-                    })
-                
-                except Exception as e:
-                    order_duration = time.time() - order_start_time
-                    logger.error(f"Error creating PDF for {order_number} after {order_duration:.2f}s: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    pdf_results.append({
-                        'order_number': order_number,
-                        'success': False,
-                        'error': str(e)
-                    })
-            
-            total_duration = time.time() - start_time
-            logger.info(f"Completed processing {len(order_numbers)} orders in {total_duration:.2f}s. Success: {sum(1 for r in pdf_results if r.get('success'))}, Failed: {sum(1 for r in pdf_results if not r.get('success'))}")
-            
-            # Return ZIP file with all PDFs, or individual results
-            successful_pdfs = [r for r in pdf_results if r.get('success')]
-            
-            if successful_pdfs:
-                # Create ZIP file with all PDFs
-                import zipfile
-                zip_filename = f"installer_photos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-                # Create ZIP in a separate location so it doesn't get deleted with temp_dir
-                # Save ZIP to network folder or temp location that won't be immediately cleaned
-                zip_temp_dir = Path(tempfile.mkdtemp(prefix="zip_installer_photos_"))
-                zip_path = zip_temp_dir / zip_filename
-                
-                try:
-                    logger.info(f"Creating ZIP file at {zip_path} with {len(successful_pdfs)} PDFs")
-                    
-                    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                        zip_count = 0
-                        for pdf_result in successful_pdfs:
-                            if pdf_result.get('success'):
-                                pdf_path = Path(pdf_result['path'])
-                                if pdf_path.exists():
-                                    try:
-                                        zipf.write(pdf_path, pdf_result['filename'])
-                                        zip_count += 1
-                                        logger.debug(f"Added {pdf_result['filename']} to ZIP")
-                                    except Exception as e:
-                                        logger.error(f"Failed to add {pdf_result['filename']} to ZIP: {e}")
-                                else:
-                                    logger.warning(f"PDF file does not exist: {pdf_path}")
-                    
-                    if zip_count == 0:
-                        logger.warning("ZIP file created but no PDFs were added to it")
-                        raise Exception("No PDFs were successfully added to ZIP file")
-                    
-                    zip_size = zip_path.stat().st_size if zip_path.exists() else 0
-                    logger.info(f"Created ZIP file with {zip_count} PDFs: {zip_path} ({zip_size} bytes)")
-                    
-                    # Return ZIP file - Flask's send_file will read the file before returning
-                    # Note: We don't clean up zip_temp_dir here as Flask needs it during send
-                    # The OS temp cleaner will eventually remove it, or we could add delayed cleanup
-                    return send_file(
-                        str(zip_path),
-                        mimetype='application/zip',
-                        as_attachment=True,
-                        download_name=zip_filename
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating ZIP file: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    # Clean up zip temp dir on error
-                    try:
-                        if zip_path and zip_path.exists():
-                            zip_path.unlink()
-                        if zip_temp_dir and zip_temp_dir.exists():
-                            shutil.rmtree(zip_temp_dir, ignore_errors=True)
-                    except Exception as cleanup_error:
-                        logger.warning(f"Failed to clean up ZIP temp directory: {cleanup_error}")
-                    raise
-            else:
-                # No successful PDFs - return error with results
-                return jsonify({
-                    'success': False,
-                    'error': 'No PDFs were successfully created',
-                    'results': pdf_results
-                }), 500
+                result = _build_order_photos_pdf(order_number, temp_dir)
+                pdf_results.append(result)
+                yield result
         
-        finally:
-            # Clean up temporary directory (this only contains downloaded images, not the ZIP)
-            # ZIP is in a separate directory that Flask will handle
+        def finish():
+            # Clean up temporary directory (downloaded images only)
             try:
                 shutil.rmtree(temp_dir, ignore_errors=True)
                 logger.debug(f"Cleaned up temporary directory: {temp_dir}")
             except Exception as e:
                 logger.warning(f"Failed to clean up temporary directory {temp_dir}: {e}")
+            total_duration = time.time() - start_time
+            logger.info(f"Completed processing {len(pdf_results)}/{len(order_numbers)} orders in {total_duration:.2f}s. Success: {sum(1 for r in pdf_results if r.get('success'))}, Failed: {sum(1 for r in pdf_results if not r.get('success'))}")
+        
+        results = build_results()
+        try:
+            # Build until the first PDF succeeds, so a request where every order fails still gets a JSON error
+            first_pdf = next((r for r in results if r.get('success')), None)
+        except Exception:
+            finish()
+            raise
+        
+        if first_pdf is None:
+            finish()
+            # No successful PDFs - return error with results
+            return jsonify({
+                'success': False,
+                'error': 'No PDFs were successfully created',
+                'results': pdf_results
+            }), 500
+        
+        def zip_entries():
+            # Each remaining order is built when the ZIP writer asks for its next file
+            try:
+                yield first_pdf['filename'], first_pdf['path']
+                for result in results:
+                    if result.get('success'):
+                        yield result['filename'], result['path']
+            finally:
+                results.close()
+                finish()
+        
+        zip_filename = f"installer_photos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        logger.info(f"Streaming ZIP {zip_filename}; remaining orders are added as they are built")
+        response = Response(stream_with_context(stream_zip(zip_entries())), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename={zip_filename}'
+        return response
     
     except Exception as e:
         logger.error(f"Error creating multiple PDFs: {str(e)}")
@@ -4658,9 +4690,10 @@ if __name__ == '__main__':
     print("=" * 60)
     
     with app.app_context():
-        # Create database tables
+        # Create missing tables, then bring existing ones up to the current schema
         db.create_all()
-        print("[OK] Database initialized")
+        schema_version = upgrade_schema(db.engine)
+        print(f"[OK] Database initialized (schema version {schema_version})")
     
     # Start daily stock report scheduler
     try:
@@ -4671,6 +4704,25 @@ if __name__ == '__main__':
         logger.error(f"Failed to start daily stock report scheduler: {e}", exc_info=True)
         print(f"[WARNING] Failed to start daily stock report scheduler: {e}")
     
+    # Start the installer portal scheduler sync (first run immediately, then every interval)
+    try:
+        from installer_portal import schedule_portal_sync
+        if schedule_portal_sync(app):
+            print("[OK] Installer portal sync scheduled")
+    except Exception as e:
+        logger.error(f"Failed to start installer portal sync: {e}", exc_info=True)
+        print(f"[WARNING] Failed to start installer portal sync: {e}")
+    
+    # Start the outbound email worker (queued portal notifications). Only the server starts it;
+    # other entrypoints that queue emails must call start_outbox_worker themselves
+    try:
+        from utils.email_outbox import start_outbox_worker
+        start_outbox_worker(app)
+        print("[OK] Email outbox worker started")
+    except Exception as e:
+        logger.error(f"Failed to start email outbox worker: {e}", exc_info=True)
+        print(f"[WARNING] Failed to start email outbox worker: {e}")
+    
     # Get configuration
     debug_mode = os.getenv('DEBUG', 'True').lower() in ('true', '1', 't')
     port = int(os.getenv('PORT', 5003))  # Default to port 5003 for local testing
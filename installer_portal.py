@@ -1,12 +1,19 @@
 import os
 import io
+import csv
 import base64
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
+from threading import Lock
 from typing import List, Dict, Any
 
 from flask import (
     Blueprint,
+    abort,
     current_app,
     flash,
     redirect,
@@ -16,7 +23,10 @@ from flask import (
     url_for,
     send_file,
     jsonify,
+    Response,
+    stream_with_context,
 )
+from markupsafe import Markup, escape
 from werkzeug.utils import secure_filename
 
 # Product codes for installer invoicing: 38-49 and 51
@@ -30,14 +40,40 @@ from models import (
     InstallerInvoice,
     InvoiceLine,
     InvoiceAttachment,
+    PendingOrder,
+    CrewSyncState,
+    OutboundEmail,
 )
-from sqlalchemy import func
+from sqlalchemy import func, select, insert, update, delete, case
+from sqlalchemy.orm import joinedload, selectinload
 from utils.rfms_client import RFMSClient
-from utils.email_sender import EmailSender
+from utils.order_payload import compact_order_payload, archive_order_payload
+from utils.invoice_pdf import invoice_to_dict, render_invoices_pdf
+from utils.email_outbox import enqueue_email, outbox_metrics
+from utils.session_store import regenerate_session
+from utils.thumbnails import get_thumbnail_service, ThumbnailBusy, ThumbnailUnavailable
+from utils.tracing import traced_submit
 
 portal_bp = Blueprint('portal', __name__, url_prefix='/portal')
 rfms_client = RFMSClient()
-email_sender = EmailSender()
+
+# Background scheduler sync: interval in minutes (0 disables) and lookback window in days
+PORTAL_SYNC_INTERVAL_MINUTES = int(os.getenv('PORTAL_SYNC_INTERVAL_MINUTES', '10'))
+PORTAL_SYNC_WINDOW_DAYS = 90
+PORTAL_FULL_SYNC_HOURS = int(os.getenv('PORTAL_FULL_SYNC_HOURS', '24'))
+PENDING_JOB_STATUSES = ['DELIVERED', 'JOB-COSTED', 'FINISH']
+
+# Bulk PDF exports render and email off the request thread; job status is kept in memory
+PDF_EXPORT_JOB_TTL = timedelta(hours=1)
+_pdf_export_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pdf-export')
+_pdf_export_jobs: Dict[str, Dict[str, Any]] = {}
+_pdf_export_jobs_lock = Lock()
+
+# Invoices per page on the accounts dashboard
+ACCOUNTS_PAGE_SIZE = 50
+
+# WorkOrderLine columns compared when re-syncing lines from RFMS
+WORK_ORDER_LINE_SYNC_FIELDS = ('product_code', 'description', 'quantity', 'unit_price', 'extended_price', 'tax_rate')
 
 
 def ensure_default_installer_account(app):
@@ -500,18 +536,24 @@ def _parse_order_lines(order_details: Dict[str, Any], install_date: str = None)
     return lines
 
 
-def _sync_work_order_lines(work_order: WorkOrder, order_details: Dict[str, Any] = None, job_details: Dict[str, Any] = None, install_date: str = None):
+def _sync_work_order_lines(work_order: WorkOrder, order_details: Dict[str, Any] = None, job_details: Dict[str, Any] = None, install_date: str = None) -> List[WorkOrderLine]:
     """
     Sync work order lines from either job payload (preferred) or order payload (fallback).
     
     IMPORTANT: If job_details exists and has lines, ONLY use job lines (don't fall back to order lines).
     This ensures we only show lines that are actually in the scheduled booking, not all order lines.
     
+    Lines are added to the session but not flushed, so they are written together
+    with the rest of the caller's transaction.
+    
     Args:
         work_order: WorkOrder object to sync lines for
         order_details: Order details from get_order() endpoint
         job_details: Job details from get_order_jobs() endpoint (primary_job object)
         install_date: Optional install date for filtering
+        
+    Returns:
+        The work order's lines after the sync
     """
     lines = []
     
@@ -540,83 +582,132 @@ def _sync_work_order_lines(work_order: WorkOrder, order_details: Dict[str, Any]
     
     if not lines:
         current_app.logger.warning("_sync_work_order_lines: No lines found in job or order payload")
-        # Delete all existing lines if we have no new lines
-        for existing_line in list(work_order.lines):
-            db.session.delete(existing_line)
-        return
-
-    # Delete all existing work order lines first to ensure we only have lines from the current sync
-    # This is important because if we previously synced with order lines (that included lines not in the job),
-    # those old lines would remain if we didn't delete them
-    for existing_line in list(work_order.lines):
-        db.session.delete(existing_line)
-    db.session.flush()  # Flush deletions before creating new lines
 
-    existing_by_source = {}  # Start fresh since we deleted all existing lines
+    # Make sure the work order has an id to key the bulk statements on
+    if work_order.id is None:
+        db.session.add(work_order)
+        db.session.flush()
 
+    # Diff against the stored lines keyed by (source_line_number, occurrence), so repeated
+    # line numbers still pair up one to one. Only changed columns are written, and lines
+    # that are no longer in the payload (e.g. order lines not in the job) are deleted.
+    existing = {}
+    occurrences = Counter()
+    for row in db.session.execute(
+        select(*[getattr(WorkOrderLine, column) for column in ('id', 'source_line_number') + WORK_ORDER_LINE_SYNC_FIELDS])
+        .where(WorkOrderLine.work_order_id == work_order.id)
+        .order_by(WorkOrderLine.id)
+    ):
+        row = row._asdict()
+        existing[(row['source_line_number'], occurrences[row['source_line_number']])] = row
+        occurrences[row['source_line_number']] += 1
+
+    inserts = []
+    updates = []
+    seen = Counter()
     for line_data in lines:
         source_num = line_data.get('source_line_number')
-        line = existing_by_source.get(source_num)
-        if not line:
-            line = WorkOrderLine(work_order_id=work_order.id)
-
-        line.source_line_number = source_num
-        line.product_code = line_data.get('product_code')
-        line.description = line_data.get('description')
-        line.quantity = line_data.get('quantity') or 0
-        line.unit_price = line_data.get('unit_price') or 0
-        # Always calculate extended_price as quantity * unit_price (ignore RFMS retail totals)
-        line.extended_price = line.quantity * line.unit_price
-        line.tax_rate = line_data.get('tax_rate') if line_data.get('tax_rate') is not None else 0.1
-        db.session.add(line)
-
-
-def _hydrate_invoice_from_work_order(invoice: InstallerInvoice, work_order: WorkOrder):
+        quantity = line_data.get('quantity') or 0
+        unit_price = line_data.get('unit_price') or 0
+        values = {
+            'product_code': line_data.get('product_code'),
+            'description': line_data.get('description'),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            # Always calculate extended_price as quantity * unit_price (ignore RFMS retail totals)
+            'extended_price': quantity * unit_price,
+            'tax_rate': line_data.get('tax_rate') if line_data.get('tax_rate') is not None else 0.1,
+        }
+        key = (source_num, seen[source_num])
+        seen[source_num] += 1
+        current = existing.pop(key, None)
+        if current is None:
+            inserts.append(dict(values, work_order_id=work_order.id, source_line_number=source_num))
+        else:
+            changed = {field: value for field, value in values.items() if current[field] != value}
+            if changed:
+                updates.append(dict(changed, id=current['id']))
+
+    stale_ids = [row['id'] for row in existing.values()]
+    if stale_ids:
+        # Invoice lines keep their text/amounts but no longer point at a removed line
+        db.session.execute(
+            update(InvoiceLine).where(InvoiceLine.work_order_line_id.in_(stale_ids)).values(work_order_line_id=None),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.execute(
+            delete(WorkOrderLine).where(WorkOrderLine.id.in_(stale_ids)),
+            execution_options={'synchronize_session': False},
+        )
+    if inserts:
+        db.session.execute(insert(WorkOrderLine), inserts)
+    if updates:
+        db.session.execute(update(WorkOrderLine), updates)
+
+    current_app.logger.info(f"_sync_work_order_lines: Work order {work_order.id}: {len(inserts)} inserted, "
+                            f"{len(updates)} updated, {len(stale_ids)} deleted, "
+                            f"{len(lines) - len(inserts) - len(updates)} unchanged")
+
+    # The bulk statements bypass the relationship, so reload it
+    db.session.expire(work_order, ['lines'])
+    if not lines:
+        return []
+    return WorkOrderLine.query.filter_by(work_order_id=work_order.id).order_by(WorkOrderLine.id).populate_existing().all()
+
+
+def _hydrate_invoice_from_work_order(invoice: InstallerInvoice, work_order: WorkOrder, work_order_lines: List[WorkOrderLine] = None):
+    """
+    Create invoice lines from work order lines and compute the invoice totals.
+    
+    Args:
+        invoice: Invoice to hydrate (skipped if it already has lines)
+        work_order: Source work order
+        work_order_lines: Lines already in hand (e.g. from _sync_work_order_lines); queried when omitted
+    """
+    if invoice.id is None:
+        db.session.add(invoice)
+        db.session.flush()
+
     # Check if invoice already has lines - query directly to avoid relationship caching issues
-    from models import InvoiceLine, WorkOrderLine
-    existing_lines = InvoiceLine.query.filter_by(invoice_id=invoice.id).all()
-    existing_count = len(existing_lines)
+    existing_count = InvoiceLine.query.filter_by(invoice_id=invoice.id).count()
     
     if existing_count > 0:
         current_app.logger.info(f"_hydrate_invoice_from_work_order: Invoice {invoice.id} already has {existing_count} lines, skipping")
         return
 
-    # Query work order lines directly to ensure we get them
-    work_order_lines = WorkOrderLine.query.filter_by(work_order_id=work_order.id).all()
-    
-    current_app.logger.info(f"_hydrate_invoice_from_work_order: Creating invoice lines from {len(work_order_lines)} work order lines for invoice {invoice.id}")
+    if work_order_lines is None:
+        # Query work order lines directly to ensure we get them
+        work_order_lines = WorkOrderLine.query.filter_by(work_order_id=work_order.id).all()
     
     if not work_order_lines:
         current_app.logger.warning(f"_hydrate_invoice_from_work_order: No work order lines found for work_order {work_order.id}")
         return
     
-    created_count = 0
+    rows = []
     subtotal = 0.0
     for wo_line in work_order_lines:
         # Line total is quantity * unit_price (non-tax, non-GST)
         line_total = (wo_line.quantity or 0) * (wo_line.unit_price or 0)
         subtotal += line_total
-        
-        new_line = InvoiceLine(
-            invoice_id=invoice.id,
-            work_order_line_id=wo_line.id,
-            description=wo_line.description or 'Work order line',
-            quantity=wo_line.quantity or 0,
-            unit_price=wo_line.unit_price or 0,
-            tax_rate=0.0,  # Lines are non-tax, non-GST
-            total=line_total,  # Just quantity * unit_price
-        )
-        db.session.add(new_line)
-        created_count += 1
-        current_app.logger.info(f"_hydrate_invoice_from_work_order: Created invoice line {created_count}: '{wo_line.description[:40]}' (qty: {wo_line.quantity}, price: {wo_line.unit_price}, total: {line_total})")
+        rows.append({
+            'invoice_id': invoice.id,
+            'work_order_line_id': wo_line.id,
+            'description': wo_line.description or 'Work order line',
+            'quantity': wo_line.quantity or 0,
+            'unit_price': wo_line.unit_price or 0,
+            'tax_rate': 0.0,  # Lines are non-tax, non-GST
+            'total': line_total,  # Just quantity * unit_price
+        })
+    db.session.execute(insert(InvoiceLine), rows)
+    db.session.expire(invoice, ['lines'])
     
     # Calculate invoice totals: GST is 10% of subtotal
     invoice.subtotal = round(subtotal, 2)
     invoice.tax_amount = round(subtotal * 0.10, 2)  # 10% GST
     invoice.total = round(subtotal + invoice.tax_amount, 2)
     
-    current_app.logger.info(f"_hydrate_invoice_from_work_order: Successfully created {created_count} invoice lines from {len(work_order_lines)} work order lines")
-    current_app.logger.info(f"_hydrate_invoice_from_work_order: Invoice totals - Subtotal: ${invoice.subtotal}, GST: ${invoice.tax_amount}, Total: ${invoice.total}")
+    current_app.logger.info(f"_hydrate_invoice_from_work_order: Created {len(rows)} invoice lines for invoice {invoice.invoice_number} - "
+                            f"Subtotal: ${invoice.subtotal}, GST: ${invoice.tax_amount}, Total: ${invoice.total}")
 
 
 def _parse_date(value):
@@ -648,8 +739,8 @@ def _parse_date(value):
     return None
 
 
-def _send_invoice_submission_email(invoice: InstallerInvoice, installer: Installer, work_order: WorkOrder):
-    """Send email notification when installer submits an invoice."""
+def _queue_invoice_submission_email(invoice: InstallerInvoice, installer: Installer, work_order: WorkOrder):
+    """Queue the accounts notification for a submitted invoice (sent once the submission commits)."""
     from_address = os.getenv('REPORTS_EMAIL_ADDRESS', 'reports@atozflooringsolutions.com.au')
     to_address = os.getenv('ACCOUNTS_EMAIL_ADDRESS', 'accounts@atozflooringsolutions.com.au')
     
@@ -754,8 +845,10 @@ def _send_invoice_submission_email(invoice: InstallerInvoice, installer: Install
     
     subject = f"New Installer Invoice: {invoice.invoice_number} - {installer.name} - ${invoice.total:.2f}"
     
-    email_sender.send_email(from_address, to_address, subject, body, body_type='HTML')
-    current_app.logger.info(f"Sent invoice submission email for {invoice.invoice_number} to {to_address}")
+    submitted_key = invoice.submitted_at.isoformat() if invoice.submitted_at else 'draft'
+    enqueue_email(from_address, to_address, subject, body, body_type='HTML',
+                  dedupe_key=f"invoice-submitted:{invoice.id}:{submitted_key}")
+    current_app.logger.info(f"Queued invoice submission email for {invoice.invoice_number} to {to_address}")
 
 
 def _is_installer_photo(attachment: Dict[str, Any]) -> bool:
@@ -830,6 +923,282 @@ def _get_installer_photos_from_order(order_details: Dict[str, Any]) -> List[Dict
     return installer_photos
 
 
+def _job_order_number(job: Dict[str, Any]):
+    return job.get('orderNumber') or job.get('orderNum') or job.get('order') or job.get('documentNumber')
+
+
+def _apply_primary_job(work_order: WorkOrder, primary_job: Dict[str, Any]) -> None:
+    """Copy job id, status and scheduled start from an /order/jobs entry onto a work order."""
+    job_id = primary_job.get('jobId') or primary_job.get('id')
+    if job_id:
+        work_order.job_number = str(job_id)
+
+    job_status = primary_job.get('jobStatus') or primary_job.get('status')
+    if job_status:
+        work_order.status = job_status
+
+    scheduled_date_str = primary_job.get('scheduledStart') or primary_job.get('scheduledEnd')
+    if scheduled_date_str:
+        try:
+            # Handle YYYYMMDD format
+            if len(scheduled_date_str) == 8 and scheduled_date_str.isdigit():
+                work_order.scheduled_start = datetime.strptime(scheduled_date_str, '%Y%m%d')
+            # Handle YYYY-MM-DD format
+            elif '-' in scheduled_date_str:
+                work_order.scheduled_start = datetime.strptime(scheduled_date_str.split()[0], '%Y-%m-%d')
+        except (ValueError, TypeError):
+            pass
+
+
+def sync_work_order_statuses() -> int:
+    """
+    Refresh status, job number and scheduled start of open work orders from RFMS.
+
+    Only work orders created within the sync window that have no submitted invoice
+    are checked, one /order/jobs call each. Must run inside an app context.
+
+    Returns:
+        Number of work orders checked
+    """
+    cutoff = datetime.utcnow() - timedelta(days=PORTAL_SYNC_WINDOW_DAYS)
+    work_orders = WorkOrder.query.outerjoin(
+        InstallerInvoice, InstallerInvoice.work_order_id == WorkOrder.id
+    ).filter(
+        WorkOrder.created_at >= cutoff,
+        WorkOrder.order_number.isnot(None),
+        (InstallerInvoice.id.is_(None)) | (InstallerInvoice.status != 'submitted'),
+    ).all()
+
+    for wo in work_orders:
+        try:
+            jobs_response = rfms_client.get_order_jobs(wo.order_number)
+            scheduled_jobs = jobs_response.get('detail', [])
+            if scheduled_jobs and isinstance(scheduled_jobs, list):
+                _apply_primary_job(wo, scheduled_jobs[0])
+        except Exception as e:
+            current_app.logger.warning(f"Failed to get job details for order {wo.order_number}: {e}")
+
+    db.session.commit()
+    return len(work_orders)
+
+
+def _pending_jobs_by_order(crew_code: str, start_date, end_date) -> Dict[str, Dict[str, Any]]:
+    """A crew's jobs currently in a pending status within the sync window, keyed by order number."""
+    jobs = _normalize_jobs_response(rfms_client.find_jobs_by_date_range(
+        start_date.strftime('%m-%d-%Y'),
+        end_date.strftime('%m-%d-%Y'),
+        crews=[crew_code],
+        job_status=PENDING_JOB_STATUSES
+    ))
+    pending = {}
+    for job in jobs:
+        order_number = _job_order_number(job)
+        if order_number:
+            pending.setdefault(order_number, job)
+    return pending
+
+
+def refresh_pending_orders(crew_code: str, full: bool = False) -> int:
+    """
+    Bring a crew's cached pending orders up to date with RFMS Schedule Pro.
+
+    The first sync of a crew, and one every PORTAL_FULL_SYNC_HOURS, replaces the cache
+    with a full PORTAL_SYNC_WINDOW_DAYS search for delivered/job-costed/finished jobs.
+    In between, only jobs whose record changed since the last sync are requested
+    (RFMS record status date range) and upserted; an order is dropped only when
+    none of its jobs is pending any more. Must run inside an app context.
+
+    Args:
+        crew_code: Crew to refresh
+        full: Force a full-window refresh
+
+    Returns:
+        Number of jobs received from RFMS
+    """
+    state = CrewSyncState.query.filter_by(crew_code=crew_code).first()
+    if state is None:
+        state = CrewSyncState(crew_code=crew_code)
+        db.session.add(state)
+
+    now = datetime.utcnow()
+    full = full or not state.last_synced_at or not state.last_full_sync_at or (
+        now - state.last_full_sync_at > timedelta(hours=PORTAL_FULL_SYNC_HOURS)
+    )
+    end_date = now.date()
+    start_date = end_date - timedelta(days=PORTAL_SYNC_WINDOW_DAYS)
+
+    try:
+        if full:
+            jobs_result = rfms_client.find_jobs_by_date_range(
+                start_date.strftime('%m-%d-%Y'),
+                end_date.strftime('%m-%d-%Y'),
+                crews=[crew_code],
+                job_status=PENDING_JOB_STATUSES
+            )
+        else:
+            # Record dates are day-granular, so re-read the whole day of the last sync;
+            # upserting makes the overlap harmless. No status filter: a job leaving a
+            # pending status has to be seen to be dropped.
+            jobs_result = rfms_client.find_jobs_by_date_range(
+                start_date.strftime('%m-%d-%Y'),
+                end_date.strftime('%m-%d-%Y'),
+                crews=[crew_code],
+                record_start_date=state.last_synced_at.strftime('%m-%d-%Y'),
+                record_end_date=end_date.strftime('%m-%d-%Y')
+            )
+        jobs = _normalize_jobs_response(jobs_result)
+    except Exception as exc:
+        state.last_error = str(exc)[:500]
+        db.session.commit()
+        raise
+
+    # Latest job per order; an order is pending if any of its changed jobs is
+    jobs_by_order = {}
+    for job in jobs:
+        order_number = _job_order_number(job)
+        if not order_number:
+            continue
+        status = job.get('jobStatus') or job.get('status')
+        is_pending = str(status or '').upper() in PENDING_JOB_STATUSES
+        if order_number not in jobs_by_order or is_pending:
+            jobs_by_order[order_number] = (job, is_pending or full)
+
+    if full:
+        PendingOrder.query.filter_by(crew_code=crew_code).delete()
+        existing = {}
+    else:
+        existing = {
+            pending.order_number: pending
+            for pending in PendingOrder.query.filter(
+                PendingOrder.crew_code == crew_code,
+                PendingOrder.order_number.in_(list(jobs_by_order))
+            ).all()
+        } if jobs_by_order else {}
+
+    # A changed job leaving a pending status does not mean the order is done: another,
+    # unchanged job on it may still be pending. Check the crew's currently pending jobs
+    # before dropping any cached order (one extra RFMS call, only when something would drop).
+    drop_candidates = [order_number for order_number, (_, is_pending) in jobs_by_order.items()
+                       if not is_pending and order_number in existing]
+    if drop_candidates:
+        try:
+            still_pending = _pending_jobs_by_order(crew_code, start_date, end_date)
+        except Exception as exc:
+            state.last_error = str(exc)[:500]
+            db.session.commit()
+            raise
+        for order_number in drop_candidates:
+            if order_number in still_pending:
+                jobs_by_order[order_number] = (still_pending[order_number], True)
+
+    for order_number, (job, is_pending) in jobs_by_order.items():
+        pending = existing.get(order_number)
+        if not is_pending:
+            if pending:
+                db.session.delete(pending)
+            continue
+        if pending is None:
+            pending = PendingOrder(crew_code=crew_code, order_number=order_number)
+            db.session.add(pending)
+        pending.job_number = job.get('jobNumber') or job.get('jobNum') or job.get('jobId')
+        pending.job_name = job.get('jobName') or job.get('customerName')
+        pending.status = job.get('jobStatus') or job.get('status')
+        pending.scheduled_start = job.get('scheduledStartDate') or job.get('scheduledStart')
+        pending.synced_at = now
+
+    state.last_synced_at = now
+    if full:
+        state.last_full_sync_at = now
+    state.last_error = None
+    db.session.commit()
+    current_app.logger.info(f"Pending orders for crew {crew_code}: {'full' if full else 'incremental'} sync, "
+                            f"{len(jobs)} job(s) received")
+    return len(jobs)
+
+
+def pending_orders_for_crew(crew_code: str) -> List[PendingOrder]:
+    """
+    Cached pending orders of a crew that have no submitted invoice yet.
+
+    One SELECT on the (crew_code, order_number) index with a NOT EXISTS probe on
+    work_order.order_number / installer_invoice.work_order_id.
+    """
+    submitted = db.session.query(WorkOrder.id).join(
+        InstallerInvoice, InstallerInvoice.work_order_id == WorkOrder.id
+    ).filter(
+        WorkOrder.order_number == PendingOrder.order_number,
+        InstallerInvoice.status == 'submitted',
+    )
+    return PendingOrder.query.filter(
+        PendingOrder.crew_code == crew_code,
+        ~submitted.exists(),
+    ).order_by(PendingOrder.order_number).all()
+
+
+def run_portal_sync(app) -> None:
+    """Background job: sync work order statuses and every active crew's pending orders."""
+    with app.app_context():
+        start = datetime.utcnow()
+        try:
+            checked = sync_work_order_statuses()
+        except Exception as exc:
+            db.session.rollback()
+            current_app.logger.warning(f"Failed to update work orders with scheduler info: {exc}")
+            checked = 0
+
+        crew_codes = [
+            row[0] for row in db.session.query(Installer.crew_code).filter(
+                Installer.active.is_(True), Installer.crew_code.isnot(None), Installer.crew_code != ''
+            ).distinct()
+        ]
+        for crew_code in crew_codes:
+            try:
+                refresh_pending_orders(crew_code)
+            except Exception as exc:
+                db.session.rollback()
+                current_app.logger.warning(f"Failed to refresh pending orders for crew {crew_code}: {exc}")
+
+        elapsed = (datetime.utcnow() - start).total_seconds()
+        current_app.logger.info(f"Portal sync: {checked} work order(s), {len(crew_codes)} crew(s) in {elapsed:.1f}s")
+
+
+def schedule_portal_sync(app, scheduler=None):
+    """
+    Add the periodic portal sync to the app's background scheduler.
+
+    Called explicitly by the server entrypoint (not on blueprint registration),
+    so scripts and other processes that import the portal never start a sync.
+
+    Args:
+        app: Flask app the sync runs against
+        scheduler: APScheduler instance (defaults to the shared daily report scheduler)
+
+    Returns:
+        The scheduler, or None when PORTAL_SYNC_INTERVAL_MINUTES is 0
+    """
+    if PORTAL_SYNC_INTERVAL_MINUTES <= 0:
+        return None
+
+    from apscheduler.triggers.interval import IntervalTrigger
+    if scheduler is None:
+        from utils.daily_stock_report import get_scheduler
+        scheduler = get_scheduler()
+
+    scheduler.add_job(
+        func=run_portal_sync,
+        args=[app],
+        trigger=IntervalTrigger(minutes=PORTAL_SYNC_INTERVAL_MINUTES),
+        id='installer_portal_sync',
+        name='Installer Portal Scheduler Sync',
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    app.logger.info(f"Installer portal sync scheduled every {PORTAL_SYNC_INTERVAL_MINUTES} minute(s)")
+    return scheduler
+
+
 @portal_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -849,6 +1218,7 @@ def login():
                 return render_template('portal_login.html')
             
             if installer.check_password(password):
+                regenerate_session()
                 session['installer_id'] = installer.id
                 installer.updated_at = datetime.utcnow()
                 db.session.commit()
@@ -1039,99 +1409,13 @@ def dashboard():
         InstallerInvoice.updated_at.desc()
     ).limit(5).all()
     
-    # Get all submitted invoices for pending orders check (not limited to 5)
-    all_submitted_invoices = InstallerInvoice.query.filter_by(
-        installer_id=installer.id, 
-        status='submitted'
-    ).all()
-
-    # Update work orders with job status from scheduler using /order/jobs endpoint (definitive method)
-    # This is more reliable than searching by date range
-    if installer.crew_code:
-        try:
-            # Update work orders with job info using /order/jobs endpoint
-            # This is more reliable than searching by date range
-            for wo in work_orders:
-                if wo.order_number:
-                    try:
-                        jobs_response = rfms_client.get_order_jobs(wo.order_number)
-                        scheduled_jobs = jobs_response.get('detail', [])
-                        
-                        if scheduled_jobs and isinstance(scheduled_jobs, list) and len(scheduled_jobs) > 0:
-                            primary_job = scheduled_jobs[0]
-                            
-                            # Update job_number (job ID)
-                            job_id = primary_job.get('jobId') or primary_job.get('id')
-                            if job_id:
-                                wo.job_number = str(job_id)
-                            
-                            # Update status
-                            job_status = primary_job.get('jobStatus') or primary_job.get('status')
-                            if job_status:
-                                wo.status = job_status
-                            
-                            # Update scheduled_start date
-                            scheduled_date_str = primary_job.get('scheduledStart') or primary_job.get('scheduledEnd')
-                            if scheduled_date_str:
-                                try:
-                                    # Handle YYYYMMDD format
-                                    if len(scheduled_date_str) == 8 and scheduled_date_str.isdigit():
-                                        wo.scheduled_start = datetime.strptime(scheduled_date_str, '%Y%m%d')
-                                    # Handle YYYY-MM-DD format
-                                    elif '-' in scheduled_date_str:
-                                        wo.scheduled_start = datetime.strptime(scheduled_date_str.split()[0], '%Y-%m-%d')
-                                except (ValueError, TypeError):
-                                    pass
-                    except Exception as e:
-                        current_app.logger.warning(f"Failed to get job details for order {wo.order_number}: {e}")
-            
-            db.session.commit()
-        except Exception as exc:
-            current_app.logger.warning(f"Failed to update work orders with scheduler info: {exc}")
-
-    # Find pending orders (delivered/job-costed status) that need invoicing
+    # Statuses and pending orders are kept current by the background portal sync
+    # (run_portal_sync), so the dashboard renders from the local database only.
     pending_orders = []
+    sync_state = None
     if installer.crew_code:
-        try:
-            # Search for jobs in the last 90 days with delivered/job-costed status
-            end_date = datetime.utcnow().date()
-            start_date = end_date - timedelta(days=90)
-            start_str = start_date.strftime('%m-%d-%Y')
-            end_str = end_date.strftime('%m-%d-%Y')
-            
-            # Search for jobs with delivered or job-costed status
-            jobs_result = rfms_client.find_jobs_by_date_range(
-                start_str, 
-                end_str, 
-                crews=[installer.crew_code],
-                job_status=['DELIVERED', 'JOB-COSTED', 'FINISH']
-            )
-            jobs = _normalize_jobs_response(jobs_result)
-            
-            # Filter to orders that don't have submitted invoices
-            submitted_order_numbers = {
-                inv.work_order.order_number 
-                for inv in all_submitted_invoices 
-                if inv.work_order and inv.work_order.order_number
-            }
-            
-            for job in jobs:
-                order_number = job.get('orderNumber') or job.get('orderNum') or job.get('order') or job.get('documentNumber')
-                if order_number and order_number not in submitted_order_numbers:
-                    # Check if we already have a draft invoice for this order
-                    existing_wo = WorkOrder.query.filter_by(order_number=order_number).first()
-                    if existing_wo and existing_wo.invoice and existing_wo.invoice.status == 'submitted':
-                        continue
-                    
-                    pending_orders.append({
-                        'order_number': order_number,
-                        'job_number': job.get('jobNumber') or job.get('jobNum') or job.get('jobId'),
-                        'job_name': job.get('jobName') or job.get('customerName'),
-                        'status': job.get('jobStatus') or job.get('status'),
-                        'scheduled_start': job.get('scheduledStartDate') or job.get('scheduledStart'),
-                    })
-        except Exception as exc:
-            current_app.logger.warning(f"Failed to find pending orders: {exc}")
+        sync_state = CrewSyncState.query.filter_by(crew_code=installer.crew_code).first()
+        pending_orders = pending_orders_for_crew(installer.crew_code)
 
     return render_template(
         'portal_dashboard.html',
@@ -1139,9 +1423,31 @@ def dashboard():
         work_orders=work_orders,
         invoices=invoices,
         pending_orders=pending_orders,
+        last_synced_at=sync_state.last_synced_at if sync_state else None,
     )
 
 
+def _fetch_order_and_jobs(order_number: str):
+    """
+    Fetch an order (with attachments) and its scheduled jobs from RFMS concurrently.
+    
+    Returns:
+        Tuple of (order_details, jobs_response, jobs_error). A failed order fetch raises;
+        a failed jobs fetch is returned as jobs_error since the order can be invoiced without it.
+    """
+    # Begin (or reuse) the RFMS session once so both requests share it
+    rfms_client.start_session()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        order_future = traced_submit(executor, rfms_client.get_order, order_number,
+                                     locked=False, include_attachments=True)
+        jobs_future = traced_submit(executor, rfms_client.get_order_jobs, order_number)
+        order_details = order_future.result()
+        try:
+            return order_details, jobs_future.result(), None
+        except Exception as exc:
+            return order_details, None, exc
+
+
 @portal_bp.route('/create-invoice', methods=['POST'])
 @login_required
 def create_invoice_from_order():
@@ -1187,9 +1493,11 @@ def create_invoice_from_order():
         return redirect(url_for('portal.dashboard'))
     
     try:
-        # Fetch order from RFMS with attachments
+        # Fetch stage: order (with attachments) and scheduled jobs, concurrently and once each
         current_app.logger.info(f"Fetching order {order_number} from RFMS for installer {installer.id}")
-        order_details = rfms_client.get_order(order_number, locked=False, include_attachments=True)
+        fetch_start = time.perf_counter()
+        order_details, jobs_response, jobs_error = _fetch_order_and_jobs(order_number)
+        fetch_seconds = time.perf_counter() - fetch_start
         
         # Log the full response structure for debugging
         current_app.logger.debug(f"Order {order_number} response keys: {list(order_details.keys()) if isinstance(order_details, dict) else 'Not a dict'}")
@@ -1210,106 +1518,49 @@ def create_invoice_from_order():
             flash(f'Error retrieving order {order_number}: {error_msg}', 'danger')
             return redirect(url_for('portal.dashboard'))
         
-        # Get order data - check result first (where RFMS typically stores order details)
-        order_result = order_details.get('result', {})
-        if not isinstance(order_result, dict):
-            order_result = {}
-        
-        order_data = order_details.get('detail') or order_details.get('data') or order_details
-        if isinstance(order_data, dict):
-            order_data = order_data.get('order') or order_data
+        # Primary scheduled job from /order/jobs/{order_number} (definitive job id, date and status)
+        primary_job = None
+        if jobs_error:
+            current_app.logger.warning(f"Failed to get job details for order {order_number}: {jobs_error}")
+        else:
+            scheduled_jobs = (jobs_response or {}).get('detail', [])
+            if scheduled_jobs and isinstance(scheduled_jobs, list):
+                primary_job = scheduled_jobs[0]
+            else:
+                current_app.logger.info(f"No scheduled jobs found for order {order_number}")
         
-        # Check if work order already exists
+        # Write stage: work order, lines, invoice and invoice lines in one transaction
+        write_start = time.perf_counter()
         work_order = WorkOrder.query.filter_by(order_number=order_number).first()
         if not work_order:
             work_order = WorkOrder(
                 order_number=order_number,
-                installer_id=installer.id,
-                crew_code=installer.crew_code,
                 status='pending_invoice',
             )
             db.session.add(work_order)
-            db.session.flush()
         
         # Update work order with order details
-        work_order.order_payload = order_details
+        # Only the compact projection is kept on the row; the full response optionally goes to the side store
+        work_order.order_payload = compact_order_payload(order_details)
+        archive_order_payload(order_number, order_details)
         work_order.installer_id = installer.id
         work_order.crew_code = installer.crew_code
         
-        # Extract job ID, scheduled date, and job status using /order/jobs/{order_number} endpoint
-        # This is the definitive way to get job information (as per RFMS-BUILDERS implementation)
-        job_id = None
-        scheduled_start = None
-        job_status = None
-        
-        try:
-            jobs_response = rfms_client.get_order_jobs(order_number)
-            scheduled_jobs = jobs_response.get('detail', [])
-            
-            if scheduled_jobs and isinstance(scheduled_jobs, list) and len(scheduled_jobs) > 0:
-                primary_job = scheduled_jobs[0]
-                
-                # Extract job ID
-                job_id = primary_job.get('jobId') or primary_job.get('id')
-                
-                # Extract scheduled date (format: YYYYMMDD, convert to datetime)
-                scheduled_date_str = primary_job.get('scheduledStart') or primary_job.get('scheduledEnd')
-                if scheduled_date_str:
-                    try:
-                        # Handle YYYYMMDD format
-                        if len(scheduled_date_str) == 8 and scheduled_date_str.isdigit():
-                            scheduled_start = datetime.strptime(scheduled_date_str, '%Y%m%d')
-                        # Handle YYYY-MM-DD format
-                        elif '-' in scheduled_date_str:
-                            scheduled_start = datetime.strptime(scheduled_date_str.split()[0], '%Y-%m-%d')
-                        else:
-                            scheduled_start = datetime.strptime(scheduled_date_str.split()[0], '%Y-%m-%d')
-                    except (ValueError, TypeError) as e:
-                        current_app.logger.warning(f"Could not parse scheduled date '{scheduled_date_str}': {e}")
-                
-                # Extract job status
-                job_status = primary_job.get('jobStatus') or primary_job.get('status')
-                
-                current_app.logger.info(f"Found job ID {job_id}, scheduled date {scheduled_start}, status {job_status} for order {order_number}")
-            else:
-                current_app.logger.info(f"No scheduled jobs found for order {order_number}")
-        except Exception as e:
-            current_app.logger.warning(f"Failed to get job details for order {order_number}: {e}")
-        
-        # Store job ID, scheduled date, and status
-        if job_id:
-            work_order.job_number = str(job_id)
-        if scheduled_start:
-            work_order.scheduled_start = scheduled_start
-        if job_status:
-            work_order.status = job_status
-        
-        # Ensure job_number is saved to database
-        db.session.flush()
-        
-        # Get job details for line extraction (if job exists)
+        # Job lines are only used when the job has an id (a real booking)
         job_details_for_lines = None
-        if job_id:
-            try:
-                jobs_response = rfms_client.get_order_jobs(order_number)
-                scheduled_jobs = jobs_response.get('detail', [])
-                if scheduled_jobs and isinstance(scheduled_jobs, list) and len(scheduled_jobs) > 0:
-                    job_details_for_lines = scheduled_jobs[0]
-                    current_app.logger.info(f"Retrieved job details with {len(job_details_for_lines.get('lines', []))} lines for line extraction")
-            except Exception as e:
-                current_app.logger.warning(f"Could not get job details for line extraction: {e}")
+        if primary_job:
+            _apply_primary_job(work_order, primary_job)
+            current_app.logger.info(f"Found job ID {work_order.job_number}, scheduled date {work_order.scheduled_start}, status {work_order.status} for order {order_number}")
+            if primary_job.get('jobId') or primary_job.get('id'):
+                job_details_for_lines = primary_job
         
         # Sync work order lines (with optional install date filtering)
         # Prefer job lines over order lines (job lines are more specific to the booking)
         current_app.logger.info(f"Syncing work order lines for order {order_number}" + (f" with install date {install_date}" if install_date else ""))
-        _sync_work_order_lines(work_order, order_details=order_details, job_details=job_details_for_lines, install_date=install_date)
-        db.session.flush()
-        
-        # Refresh work_order to ensure lines are loaded
-        db.session.refresh(work_order)
+        work_order_lines = _sync_work_order_lines(work_order, order_details=order_details, job_details=job_details_for_lines, install_date=install_date)
         
         # Check if any lines were created
-        if not work_order.lines:
+        if not work_order_lines:
             current_app.logger.error(f"No lines found for order {order_number} after parsing.")
             current_app.logger.error(f"Order details structure: status={order_details.get('status')}, has_result={bool(order_details.get('result'))}, has_detail={bool(order_details.get('detail'))}")
             if order_details.get('result'):
@@ -1317,54 +1568,31 @@ def create_invoice_from_order():
                 current_app.logger.error(f"Result has {len(result_lines) if isinstance(result_lines, list) else 0} lines")
             flash(f'Order {order_number} was found but contains no invoiceable line items (product codes 38-49 and 51). Please check the order in RFMS.', 'warning')
         else:
-            current_app.logger.info(f"Successfully created {len(work_order.lines)} work order lines for order {order_number}")
+            current_app.logger.info(f"Successfully created {len(work_order_lines)} work order lines for order {order_number}")
         
         # Create invoice if it doesn't exist, or hydrate if it exists but has no lines
         invoice = work_order.invoice
         if not invoice:
-            current_app.logger.info(f"Creating new invoice for work order {work_order.id}")
             invoice = InstallerInvoice(
-                installer_id=installer.id,
-                work_order_id=work_order.id,
+                installer=installer,
                 invoice_number=installer.generate_invoice_number(),
                 status='draft',
             )
-            db.session.add(invoice)
-            db.session.flush()
-            current_app.logger.info(f"Invoice {invoice.id} created, now hydrating from work order lines")
-        else:
-            current_app.logger.info(f"Invoice {invoice.id} already exists for work order {work_order.id}")
-            # Check if it has lines
-            from models import InvoiceLine
-            existing_lines = InvoiceLine.query.filter_by(invoice_id=invoice.id).all()
-            if existing_lines:
-                current_app.logger.info(f"Invoice {invoice.id} already has {len(existing_lines)} lines, skipping hydration")
-            else:
-                current_app.logger.info(f"Invoice {invoice.id} exists but has no lines, will hydrate now")
+            work_order.invoice = invoice
+            current_app.logger.info(f"Creating new invoice {invoice.invoice_number} for order {order_number}")
         
-        # Refresh work_order to ensure lines are available
-        db.session.refresh(work_order)
-        # Also query directly to ensure we get the lines
-        from models import WorkOrderLine
-        wo_lines = WorkOrderLine.query.filter_by(work_order_id=work_order.id).all()
-        current_app.logger.info(f"Work order has {len(work_order.lines)} lines (relationship), {len(wo_lines)} lines (direct query) before hydrating invoice")
-        
-        # Always try to hydrate (function will skip if lines already exist)
-        _hydrate_invoice_from_work_order(invoice, work_order)
-        db.session.flush()
-        
-        # Refresh invoice to ensure lines are loaded
-        db.session.refresh(invoice)
-        # Also query directly
-        from models import InvoiceLine
-        inv_lines = InvoiceLine.query.filter_by(invoice_id=invoice.id).all()
-        current_app.logger.info(f"Invoice has {len(invoice.lines)} lines (relationship), {len(inv_lines)} lines (direct query) after hydration")
+        # Skips invoices that already have lines
+        _hydrate_invoice_from_work_order(invoice, work_order, work_order_lines)
         
         db.session.commit()
+        write_seconds = time.perf_counter() - write_start
+        current_app.logger.info(f"create_invoice_from_order {order_number}: fetch {fetch_seconds * 1000:.0f}ms, "
+                                f"write {write_seconds * 1000:.0f}ms ({len(work_order_lines)} lines)")
         
         return redirect(url_for('portal.edit_invoice', work_order_id=work_order.id))
         
     except Exception as exc:
+        db.session.rollback()
         current_app.logger.error(f"Failed to create invoice from order {order_number}: {exc}", exc_info=True)
         flash(f'Failed to create invoice: {str(exc)}', 'danger')
         return redirect(url_for('portal.dashboard'))
@@ -1381,38 +1609,10 @@ def search_orders():
         return redirect(url_for('portal.dashboard'))
     
     try:
-        # Search for jobs in the last 90 days
-        end_date = datetime.utcnow().date()
-        start_date = end_date - timedelta(days=90)
-        start_str = start_date.strftime('%m-%d-%Y')
-        end_str = end_date.strftime('%m-%d-%Y')
-        
-        # Search for jobs with delivered or job-costed status
-        jobs_result = rfms_client.find_jobs_by_date_range(
-            start_str, 
-            end_str, 
-            crews=[installer.crew_code],
-            job_status=['DELIVERED', 'JOB-COSTED', 'FINISH']
-        )
-        jobs = _normalize_jobs_response(jobs_result)
-        
-        # Get submitted order numbers
-        submitted_order_numbers = {
-            inv.work_order.order_number 
-            for inv in InstallerInvoice.query.filter_by(installer_id=installer.id, status='submitted').all()
-            if inv.work_order and inv.work_order.order_number
-        }
+        # Refresh this crew's cached pending orders now instead of waiting for the background sync
+        refresh_pending_orders(installer.crew_code)
         
-        found_orders = []
-        for job in jobs:
-            order_number = job.get('orderNumber') or job.get('orderNum') or job.get('order') or job.get('documentNumber')
-            if order_number and order_number not in submitted_order_numbers:
-                found_orders.append({
-                    'order_number': order_number,
-                    'job_number': job.get('jobNumber') or job.get('jobNum') or job.get('jobId'),
-                    'job_name': job.get('jobName') or job.get('customerName'),
-                    'status': job.get('jobStatus') or job.get('status'),
-                })
+        found_orders = pending_orders_for_crew(installer.crew_code)
         
         flash(f'Found {len(found_orders)} order(s) ready for invoicing.', 'info')
         return redirect(url_for('portal.dashboard'))
@@ -1574,11 +1774,11 @@ def edit_invoice(work_order_id: int):
                     current_app.logger.error(f"Failed to upload photos to RFMS: {exc}", exc_info=True)
                     flash('Invoice submitted, but failed to upload some photos to RFMS. Please contact support.', 'warning')
             
-            # Send email notification to accounts
+            # Queue email notification to accounts
             try:
-                _send_invoice_submission_email(invoice, installer, work_order)
+                _queue_invoice_submission_email(invoice, installer, work_order)
             except Exception as exc:
-                current_app.logger.error(f"Failed to send invoice submission email: {exc}", exc_info=True)
+                current_app.logger.error(f"Failed to queue invoice submission email: {exc}", exc_info=True)
                 # Don't fail the submission if email fails
             
             flash('Invoice submitted successfully. Accounts team has been notified.', 'success')
@@ -1695,9 +1895,9 @@ def edit_invoice(work_order_id: int):
 @portal_bp.route('/attachment-thumbnail/<int:attachment_id>')
 @login_required
 def get_attachment_thumbnail(attachment_id: int):
-    """Get a thumbnail preview of an attachment."""
-    try:
-        # Get attachment data from RFMS
+    """Get a thumbnail preview of an attachment (rendered in the thumbnail worker processes)."""
+    def load():
+        # Get attachment data from RFMS (only the first of any concurrent requests fetches it)
         attachment_data = rfms_client.get_attachment(attachment_id)
         
         # Handle different response structures to get file data
@@ -1716,50 +1916,38 @@ def get_attachment_thumbnail(attachment_id: int):
                                 attachment_data.get('file'))
         
         if not file_data_b64:
-            from flask import abort
-            abort(404, 'No file data found')
+            raise ThumbnailUnavailable('No file data found')
         
         # Decode base64 data
         try:
             file_bytes = base64.b64decode(file_data_b64)
         except Exception as e:
             current_app.logger.error(f"Failed to decode attachment {attachment_id}: {e}")
-            from flask import abort
-            abort(500, 'Failed to decode attachment')
+            raise ThumbnailUnavailable('Failed to decode attachment')
         
-        # Determine content type
         file_extension = None
         if isinstance(attachment_data, dict):
             file_extension = (attachment_data.get('fileExtension') or 
                             attachment_data.get('extension') or 
                             attachment_data.get('file_extension') or '')
-        
-        # Determine MIME type
-        if file_extension:
-            file_extension = file_extension.lstrip('.').lower()
-            mime_types = {
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'png': 'image/png',
-                'gif': 'image/gif',
-                'webp': 'image/webp',
-                'bmp': 'image/bmp',
-                'pdf': 'application/pdf',
-            }
-            content_type = mime_types.get(file_extension, 'application/octet-stream')
-        else:
-            content_type = 'image/jpeg'  # Default
-        
-        return send_file(
-            io.BytesIO(file_bytes),
-            mimetype=content_type,
-            as_attachment=False
-        )
-        
+        # Installer photos without an extension are JPEGs
+        return file_bytes, (file_extension or 'jpg')
+    
+    try:
+        thumbnail = get_thumbnail_service().get(attachment_id, load, accept=request.headers.get('Accept'))
+    except ThumbnailBusy as exc:
+        current_app.logger.warning(f"Thumbnail for attachment {attachment_id} not rendered: {exc}")
+        abort(503, str(exc))
+    except ThumbnailUnavailable as exc:
+        abort(404, str(exc))
     except Exception as exc:
         current_app.logger.error(f"Failed to get attachment thumbnail {attachment_id}: {exc}", exc_info=True)
-        from flask import abort
         abort(500, f'Error retrieving attachment: {str(exc)}')
+    
+    response = send_file(io.BytesIO(thumbnail.data), mimetype=thumbnail.mimetype, as_attachment=False)
+    response.headers['Vary'] = 'Accept'
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
 
 
 @portal_bp.route('/attachment-file/<int:attachment_id>')
@@ -1889,74 +2077,9 @@ def export_invoice_xero(invoice_id: int):
         flash('You do not have permission to export this invoice.', 'danger')
         return redirect(url_for('portal.dashboard'))
 
-    import csv
-    import io
-    from datetime import datetime
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Xero CSV header
-    writer.writerow([
-        '*ContactName',
-        '*InvoiceNumber',
-        '*InvoiceDate',
-        '*DueDate',
-        'InventoryItemCode',
-        '*Description',
-        '*Quantity',
-        '*UnitAmount',
-        'AccountCode',
-        '*TaxType',
-        'TaxAmount',
-        'LineAmount',
-    ])
-
-    invoice_date = invoice.submitted_at.date() if invoice.submitted_at else datetime.utcnow().date()
-    due_date = invoice_date + timedelta(days=30)  # 30 day payment terms
-
-    # Write invoice header line
-    writer.writerow([
-        installer.name,  # ContactName
-        invoice.invoice_number,  # InvoiceNumber
-        invoice_date.strftime('%d/%m/%Y'),  # InvoiceDate
-        due_date.strftime('%d/%m/%Y'),  # DueDate
-        '',  # InventoryItemCode
-        f"Invoice {invoice.invoice_number} - {invoice.work_order.order_number if invoice.work_order else 'N/A'}",  # Description
-        '',  # Quantity
-        '',  # UnitAmount
-        '200',  # AccountCode (Sales account - adjust as needed)
-        'GST on Income',  # TaxType
-        '',  # TaxAmount
-        '',  # LineAmount
-    ])
-
-    # Write line items
-    for line in invoice.lines:
-        writer.writerow([
-            '',  # ContactName
-            '',  # InvoiceNumber
-            '',  # InvoiceDate
-            '',  # DueDate
-            line.product_code or '',  # InventoryItemCode
-            line.description,  # Description
-            str(line.quantity),  # Quantity
-            f"{line.unit_price:.2f}",  # UnitAmount
-            '200',  # AccountCode
-            'GST on Income' if line.tax_rate > 0 else 'Exempt',  # TaxType
-            f"{(line.quantity * line.unit_price * line.tax_rate):.2f}",  # TaxAmount
-            f"{(line.quantity * line.unit_price):.2f}",  # LineAmount
-        ])
-
-    output.seek(0)
+    invoice_query = _xero_invoice_query().filter(InstallerInvoice.id == invoice.id)
     filename = f"{invoice.invoice_number}_xero_export_{datetime.utcnow().strftime('%Y%m%d')}.csv"
-
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    return _stream_csv(_xero_csv_rows(invoice_query, contact_name=installer.name), filename)
 
 
 @portal_bp.route('/invoices/<int:invoice_id>/export/pdf', methods=['GET'])
@@ -2121,19 +2244,20 @@ def export_invoices():
             return redirect(url_for('portal.export_invoices'))
         
         # Get selected invoices
-        invoices = InstallerInvoice.query.filter(
+        invoice_query = _xero_invoice_query().filter(
             InstallerInvoice.id.in_(selected_invoice_ids),
             InstallerInvoice.installer_id == installer.id
-        ).all()
+        ).order_by(InstallerInvoice.id)
         
-        if not invoices:
+        if invoice_query.first() is None:
             flash('No valid invoices selected.', 'danger')
             return redirect(url_for('portal.export_invoices'))
         
         if action == 'export_xero':
             # Export to Xero CSV
-            return _export_invoices_xero(invoices, installer)
+            return _export_invoices_xero(invoice_query, installer)
         elif action == 'export_pdf_email':
+            invoices = invoice_query.all()
             # Export to PDF and email
             email_address = request.form.get('email_address', '').strip()
             if not email_address:
@@ -2157,38 +2281,75 @@ def export_invoices():
     )
 
 
-def _export_invoices_xero(invoices: List[InstallerInvoice], installer: Installer):
-    """Export multiple invoices to Xero CSV format."""
-    import csv
-    import io
-    from datetime import datetime
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Xero CSV header
-    writer.writerow([
-        '*ContactName',
-        '*InvoiceNumber',
-        '*InvoiceDate',
-        '*DueDate',
-        'InventoryItemCode',
-        '*Description',
-        '*Quantity',
-        '*UnitAmount',
-        'AccountCode',
-        '*TaxType',
-        'TaxAmount',
-        'LineAmount',
-    ])
-    
-    for invoice in invoices:
+XERO_CSV_HEADER = [
+    '*ContactName',
+    '*InvoiceNumber',
+    '*InvoiceDate',
+    '*DueDate',
+    'InventoryItemCode',
+    '*Description',
+    '*Quantity',
+    '*UnitAmount',
+    'AccountCode',
+    '*TaxType',
+    'TaxAmount',
+    'LineAmount',
+]
+
+# Invoices fetched per round trip while streaming exports
+EXPORT_CHUNK_SIZE = 200
+
+
+def _stream_csv(rows, filename: str) -> Response:
+    """
+    Stream CSV rows to the client as they are produced.
+    
+    Args:
+        rows: Iterable of row lists (may be a generator running queries)
+        filename: Download file name
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+def _xero_invoice_query():
+    """Invoice query with everything the Xero export touches loaded up front."""
+    return InstallerInvoice.query.options(
+        joinedload(InstallerInvoice.installer),
+        joinedload(InstallerInvoice.work_order),
+        selectinload(InstallerInvoice.lines).joinedload(InvoiceLine.work_order_line),
+    )
+
+
+def _xero_csv_rows(invoice_query, contact_name: str = None):
+    """
+    Yield Xero CSV rows for the invoices of a query, fetched in chunks.
+    
+    Args:
+        invoice_query: Query from _xero_invoice_query() with any filters/ordering applied
+        contact_name: ContactName for every invoice (defaults to each invoice's installer)
+    """
+    yield XERO_CSV_HEADER
+    
+    for invoice in invoice_query.yield_per(EXPORT_CHUNK_SIZE):
         invoice_date = invoice.submitted_at.date() if invoice.submitted_at else datetime.utcnow().date()
         due_date = invoice_date + timedelta(days=30)  # 30 day payment terms
         
-        # Write invoice header line
-        writer.writerow([
-            installer.name,  # ContactName
+        # Invoice header line
+        yield [
+            contact_name or (invoice.installer.name if invoice.installer else ''),  # ContactName
             invoice.invoice_number,  # InvoiceNumber
             invoice_date.strftime('%d/%m/%Y'),  # InvoiceDate
             due_date.strftime('%d/%m/%Y'),  # DueDate
@@ -2200,16 +2361,16 @@ def _export_invoices_xero(invoices: List[InstallerInvoice], installer: Installer
             'GST on Income',  # TaxType
             '',  # TaxAmount
             '',  # LineAmount
-        ])
+        ]
         
-        # Write line items
+        # Line items
         for line in invoice.lines:
-            writer.writerow([
+            yield [
                 '',  # ContactName
                 '',  # InvoiceNumber
                 '',  # InvoiceDate
                 '',  # DueDate
-                line.product_code or '',  # InventoryItemCode
+                (line.work_order_line.product_code if line.work_order_line else '') or '',  # InventoryItemCode
                 line.description,  # Description
                 str(line.quantity),  # Quantity
                 f"{line.unit_price:.2f}",  # UnitAmount
@@ -2217,192 +2378,141 @@ def _export_invoices_xero(invoices: List[InstallerInvoice], installer: Installer
                 'GST on Income' if line.tax_rate > 0 else 'Exempt',  # TaxType
                 f"{(line.quantity * line.unit_price * line.tax_rate):.2f}",  # TaxAmount
                 f"{(line.quantity * line.unit_price):.2f}",  # LineAmount
-            ])
-    
-    output.seek(0)
+            ]
+
+
+def _export_invoices_xero(invoice_query, installer: Installer):
+    """Stream multiple invoices as a Xero CSV."""
     filename = f"invoices_xero_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-    
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    return _stream_csv(_xero_csv_rows(invoice_query, contact_name=installer.name), filename)
+
+
+def _prune_pdf_export_jobs() -> None:
+    """Forget rendered or failed export jobs older than PDF_EXPORT_JOB_TTL."""
+    cutoff = time.time() - PDF_EXPORT_JOB_TTL.total_seconds()
+    with _pdf_export_jobs_lock:
+        for job_id in [jid for jid, job in _pdf_export_jobs.items()
+                       if job['state'] in ('sending', 'failed') and job['updated'] < cutoff]:
+            del _pdf_export_jobs[job_id]
+
+
+def _update_pdf_export_job(job_id: str, **fields) -> None:
+    with _pdf_export_jobs_lock:
+        _pdf_export_jobs[job_id].update(fields, updated=time.time())
+
+
+def _run_pdf_export_job(app, job_id: str, snapshots: List[Dict[str, Any]], installer_name: str,
+                        from_address: str, email_address: str) -> None:
+    """Render the invoice snapshots into one PDF and queue it for email (runs on the export executor)."""
+    with app.app_context():
+        try:
+            _update_pdf_export_job(job_id, state='rendering')
+            pdf_bytes, pages, seconds = render_invoices_pdf(snapshots)
+
+            invoice_list = '\n'.join(f"<li>{data['invoice_number']} - {data['order_number']}</li>" for data in snapshots)
+            body = f"""
+            <html>
+            <body>
+                <p>Dear {installer_name},</p>
+                <p>Please find attached {len(snapshots)} invoice(s) in PDF format:</p>
+                <ul>
+                    {invoice_list}
+                </ul>
+                <p>Best regards,<br>A to Z Flooring Solutions</p>
+            </body>
+            </html>
+            """
+            email = enqueue_email(
+                from_address=from_address,
+                to_address=email_address,
+                subject=f"Invoice Export - {len(snapshots)} Invoice(s)",
+                body=body,
+                body_type='HTML',
+                attachment_bytes=pdf_bytes,
+                attachment_name=f"invoices_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf",
+                dedupe_key=f"pdf-export:{job_id}",
+                commit=True,
+            )
+            _update_pdf_export_job(job_id, state='sending', pages=pages, render_seconds=round(seconds, 3),
+                                   email_id=email.id)
+            current_app.logger.info(f"PDF export {job_id}: {len(snapshots)} invoice(s), {pages} page(s) "
+                                    f"rendered in {seconds:.2f}s, queued email #{email.id} to {email_address}")
+        except Exception as exc:
+            db.session.rollback()
+            current_app.logger.error(f"PDF export {job_id} failed: {exc}", exc_info=True)
+            _update_pdf_export_job(job_id, state='failed', error=str(exc))
 
 
 def _export_invoices_pdf_email(invoices: List[InstallerInvoice], installer: Installer, email_address: str):
-    """Export multiple invoices to PDF and email them."""
+    """Queue a bulk PDF export; the PDF is rendered in the background and emailed through the outbox."""
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.pdfgen import canvas
-        import tempfile
-        import os
-        
-        # Create temporary PDF file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.close()
-        
-        doc = SimpleDocTemplate(temp_file.name, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title style
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#01998e'),
-            spaceAfter=30,
-        )
-        
-        # Generate PDF for each invoice
-        for idx, invoice in enumerate(invoices):
-            if idx > 0:
-                elements.append(PageBreak())
-            
-            # Title
-            elements.append(Paragraph(f"TAX INVOICE - {invoice.invoice_number}", title_style))
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Installer details
-            installer_info = [
-                ['From:', installer.name],
-                ['Email:', installer.email or ''],
-                ['Phone:', installer.phone or ''],
-            ]
-            if installer.crew_code:
-                installer_info.append(['Crew:', installer.crew_code])
-            
-            installer_table = Table(installer_info, colWidths=[1.5*inch, 4*inch])
-            installer_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            elements.append(installer_table)
-            elements.append(Spacer(1, 0.3*inch))
-            
-            # Invoice details
-            invoice_date = invoice.submitted_at.strftime('%d %B %Y') if invoice.submitted_at else 'Draft'
-            invoice_info = [
-                ['Invoice Number:', invoice.invoice_number],
-                ['Invoice Date:', invoice_date],
-                ['Order Number:', invoice.work_order.order_number if invoice.work_order else 'N/A'],
-            ]
-            if invoice.work_order and invoice.work_order.job_number:
-                invoice_info.append(['Job Number:', invoice.work_order.job_number])
-            
-            invoice_table = Table(invoice_info, colWidths=[1.5*inch, 4*inch])
-            invoice_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ]))
-            elements.append(invoice_table)
-            elements.append(Spacer(1, 0.3*inch))
-            
-            # Line items table
-            line_data = [['Description', 'Quantity', 'Unit Price', 'Line Total']]
-            for line in invoice.lines:
-                line_data.append([
-                    line.description,
-                    f"{line.quantity:.2f}",
-                    f"${line.unit_price:.2f}",
-                    f"${(line.quantity * line.unit_price):.2f}",
-                ])
-            
-            line_table = Table(line_data, colWidths=[3.5*inch, 0.8*inch, 1*inch, 1*inch])
-            line_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#01998e')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ]))
-            elements.append(line_table)
-            elements.append(Spacer(1, 0.3*inch))
-            
-            # Totals
-            totals_data = [
-                ['Subtotal:', f"${invoice.subtotal:.2f}"],
-                ['GST (10%):', f"${invoice.tax_amount:.2f}"],
-                ['Total:', f"${invoice.total:.2f}"],
-            ]
-            totals_table = Table(totals_data, colWidths=[1.5*inch, 1*inch])
-            totals_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('TEXTCOLOR', (-1, -1), (-1, -1), colors.HexColor('#01998e')),
-            ]))
-            elements.append(totals_table)
-            
-            # Notes
-            if invoice.notes:
-                elements.append(Spacer(1, 0.3*inch))
-                elements.append(Paragraph('<b>Notes:</b>', styles['Heading3']))
-                elements.append(Paragraph(invoice.notes, styles['Normal']))
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Send email with PDF attachment
-        from_address = os.getenv('REPORTS_EMAIL_ADDRESS', installer.email or 'reports@atozflooringsolutions.com.au')
-        subject = f"Invoice Export - {len(invoices)} Invoice(s)"
-        
-        # Create invoice list for email body
-        invoice_list = '\n'.join([f"<li>{inv.invoice_number} - {inv.work_order.order_number if inv.work_order else 'N/A'}</li>" for inv in invoices])
-        body = f"""
-        <html>
-        <body>
-            <p>Dear {installer.name},</p>
-            <p>Please find attached {len(invoices)} invoice(s) in PDF format:</p>
-            <ul>
-                {invoice_list}
-            </ul>
-            <p>Best regards,<br>A to Z Flooring Solutions</p>
-        </body>
-        </html>
-        """
-        
-        # Send email with attachment
-        email_sender.send_email_with_attachment(
-            from_address=from_address,
-            to_address=email_address,
-            subject=subject,
-            body=body,
-            body_type='HTML',
-            attachment_path=temp_file.name,
-            attachment_name=f"invoices_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-        )
-        
-        # Clean up temp file
-        os.unlink(temp_file.name)
-        
-        flash(f'Successfully exported {len(invoices)} invoice(s) to PDF and sent to {email_address}.', 'success')
-        return redirect(url_for('portal.export_invoices'))
-        
+        import reportlab  # noqa: F401
     except ImportError:
         flash('PDF generation requires reportlab. Install with: pip install reportlab', 'danger')
         return redirect(url_for('portal.export_invoices'))
-    except Exception as exc:
-        current_app.logger.error(f"Failed to export invoices to PDF and email: {exc}", exc_info=True)
-        flash(f'Failed to export invoices. Error: {str(exc)}', 'danger')
-        return redirect(url_for('portal.export_invoices'))
+
+    # Snapshot everything the renderer needs while the session is still open
+    snapshots = [invoice_to_dict(invoice, installer) for invoice in invoices]
+    from_address = os.getenv('REPORTS_EMAIL_ADDRESS', installer.email or 'reports@atozflooringsolutions.com.au')
+
+    _prune_pdf_export_jobs()
+    job_id = uuid.uuid4().hex
+    with _pdf_export_jobs_lock:
+        _pdf_export_jobs[job_id] = {
+            'installer_id': installer.id,
+            'state': 'queued',
+            'invoices': len(snapshots),
+            'email_address': email_address,
+            'pages': None,
+            'render_seconds': None,
+            'error': None,
+            'email_id': None,
+            'created': time.time(),
+            'updated': time.time(),
+        }
+
+    _pdf_export_executor.submit(
+        _run_pdf_export_job, current_app._get_current_object(), job_id, snapshots,
+        installer.name, from_address, email_address,
+    )
+
+    status_url = url_for('portal.export_job_status', job_id=job_id)
+    flash(Markup(f'Exporting {len(snapshots)} invoice(s) to PDF for {escape(email_address)}. '
+                 f'<a href="{status_url}">Check status</a>'), 'info')
+    return redirect(url_for('portal.export_invoices'))
+
+
+@portal_bp.route('/export-jobs/<job_id>', methods=['GET'])
+@login_required
+def export_job_status(job_id: str):
+    """Status of a queued bulk PDF export (JSON)."""
+    installer = current_installer()
+    with _pdf_export_jobs_lock:
+        job = dict(_pdf_export_jobs.get(job_id) or {})
+
+    if not job or job['installer_id'] != installer.id:
+        return jsonify({'error': 'Export job not found'}), 404
+
+    # Once rendered, the job is as far along as its outbox email
+    state, error = job['state'], job['error']
+    if job['email_id']:
+        email = db.session.get(OutboundEmail, job['email_id'])
+        if email is not None:
+            state = {'sent': 'done', 'failed': 'failed'}.get(email.status, 'sending')
+            error = email.last_error if email.status == 'failed' else None
+
+    pages, seconds = job['pages'], job['render_seconds']
+    return jsonify({
+        'job_id': job_id,
+        'state': state,
+        'invoices': job['invoices'],
+        'email_address': job['email_address'],
+        'pages': pages,
+        'render_seconds': seconds,
+        'pages_per_second': round(pages / seconds, 1) if pages and seconds else None,
+        'error': error,
+        'created_at': datetime.utcfromtimestamp(job['created']).isoformat() + 'Z',
+    })
 
 
 # ==================== ADMIN ROUTES ====================
@@ -2431,6 +2541,14 @@ def admin_dashboard():
     )
 
 
+@portal_bp.route('/admin/email-outbox')
+@login_required
+@admin_required
+def email_outbox_status():
+    """Outbox queue depth and send latency (JSON)."""
+    return jsonify(outbox_metrics())
+
+
 @portal_bp.route('/admin/installers/<int:installer_id>/approve', methods=['POST'])
 @login_required
 @admin_required
@@ -2525,65 +2643,52 @@ def edit_installer(installer_id: int):
 @admin_required
 def export_installers():
     """Export installer data to CSV for Xero/RFMS."""
-    import csv
-    
-    installers = Installer.query.filter_by(approved=True, active=True).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # CSV header
-    writer.writerow([
-        'ID',
-        'Name',
-        'Email',
-        'Phone',
-        'Business Name',
-        'Address Line 1',
-        'Address Line 2',
-        'City',
-        'State',
-        'Postal Code',
-        'ABN',
-        'GST Registered',
-        'RFMS Installer ID',
-        'Crew Code',
-        'Invoice Prefix',
-        'Created At',
-        'Status'
-    ])
-    
-    # Write installer data
-    for installer in installers:
-        writer.writerow([
-            installer.id,
-            installer.name,
-            installer.email,
-            installer.phone or '',
-            installer.business_name or '',
-            installer.address_line1 or '',
-            installer.address_line2 or '',
-            installer.city or '',
-            installer.state or '',
-            installer.postal_code or '',
-            installer.abn or '',
-            'Yes' if installer.gst_registered else 'No',
-            installer.rfms_installer_id or '',
-            installer.crew_code or '',
-            installer.invoice_prefix or 'INV',
-            installer.created_at.strftime('%Y-%m-%d %H:%M:%S') if installer.created_at else '',
-            'Active' if installer.active and installer.approved else 'Pending',
-        ])
-    
-    output.seek(0)
-    filename = f"installers_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    def rows():
+        # CSV header
+        yield [
+            'ID',
+            'Name',
+            'Email',
+            'Phone',
+            'Business Name',
+            'Address Line 1',
+            'Address Line 2',
+            'City',
+            'State',
+            'Postal Code',
+            'ABN',
+            'GST Registered',
+            'RFMS Installer ID',
+            'Crew Code',
+            'Invoice Prefix',
+            'Created At',
+            'Status'
+        ]
+        
+        installers = Installer.query.filter_by(approved=True, active=True).order_by(Installer.id)
+        for installer in installers.yield_per(EXPORT_CHUNK_SIZE):
+            yield [
+                installer.id,
+                installer.name,
+                installer.email,
+                installer.phone or '',
+                installer.business_name or '',
+                installer.address_line1 or '',
+                installer.address_line2 or '',
+                installer.city or '',
+                installer.state or '',
+                installer.postal_code or '',
+                installer.abn or '',
+                'Yes' if installer.gst_registered else 'No',
+                installer.rfms_installer_id or '',
+                installer.crew_code or '',
+                installer.invoice_prefix or 'INV',
+                installer.created_at.strftime('%Y-%m-%d %H:%M:%S') if installer.created_at else '',
+                'Active' if installer.active and installer.approved else 'Pending',
+            ]
     
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    filename = f"installers_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    return _stream_csv(rows(), filename)
 
 
 # ==================== ACCOUNTS DASHBOARD ROUTES ====================
@@ -2593,49 +2698,110 @@ def export_installers():
 @admin_required
 def accounts_dashboard():
     """Accounts dashboard to view and manage submitted installer invoices."""
-    # Get all submitted invoices
-    submitted_invoices = InstallerInvoice.query.filter_by(status='submitted').order_by(
-        InstallerInvoice.submitted_at.desc()
-    ).all()
-    
-    # Get draft invoices for reference
-    draft_invoices = InstallerInvoice.query.filter_by(status='draft').order_by(
-        InstallerInvoice.updated_at.desc()
-    ).limit(10).all()
-    
-    # Statistics
-    total_submitted = InstallerInvoice.query.filter_by(status='submitted').count()
-    total_draft = InstallerInvoice.query.filter_by(status='draft').count()
-    total_amount = db.session.query(func.sum(InstallerInvoice.total)).filter_by(status='submitted').scalar() or 0
+    # Statistics in one aggregate query
+    total_submitted, total_draft, total_amount = db.session.query(
+        func.coalesce(func.sum(case((InstallerInvoice.status == 'submitted', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((InstallerInvoice.status == 'draft', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((InstallerInvoice.status == 'submitted', InstallerInvoice.total), else_=0)), 0),
+    ).one()
     
     # Filter options
     filter_status = request.args.get('status', 'submitted')
     filter_installer = request.args.get('installer_id', type=int)
+    per_page = min(max(request.args.get('per_page', ACCOUNTS_PAGE_SIZE, type=int), 1), 200)
+    after = request.args.get('after')
     
-    if filter_status == 'all':
-        invoices = InstallerInvoice.query.order_by(InstallerInvoice.submitted_at.desc().nulls_last()).all()
-    elif filter_status == 'draft':
-        invoices = InstallerInvoice.query.filter_by(status='draft').order_by(InstallerInvoice.updated_at.desc()).all()
+    query = InstallerInvoice.query.options(
+        joinedload(InstallerInvoice.installer),
+        joinedload(InstallerInvoice.work_order),
+    )
+    if filter_status == 'draft':
+        query = query.filter(InstallerInvoice.status == 'draft')
+        sort_column = InstallerInvoice.updated_at
+    elif filter_status == 'all':
+        sort_column = InstallerInvoice.submitted_at
     else:
-        invoices = submitted_invoices
-    
+        filter_status = 'submitted'
+        query = query.filter(InstallerInvoice.status == 'submitted')
+        sort_column = InstallerInvoice.submitted_at
     if filter_installer:
-        invoices = [inv for inv in invoices if inv.installer_id == filter_installer]
+        query = query.filter(InstallerInvoice.installer_id == filter_installer)
+    
+    invoices, next_cursor = _keyset_page(query, sort_column, after, per_page)
     
     return render_template(
         'accounts_dashboard.html',
         invoices=invoices,
-        submitted_invoices=submitted_invoices,
-        draft_invoices=draft_invoices,
         total_submitted=total_submitted,
         total_draft=total_draft,
         total_amount=total_amount,
         filter_status=filter_status,
         filter_installer=filter_installer,
-        all_installers=Installer.query.filter_by(approved=True, active=True).all(),
+        per_page=per_page,
+        after=after,
+        next_cursor=next_cursor,
+        all_installers=Installer.query.filter_by(approved=True, active=True).order_by(Installer.name).all(),
     )
 
 
+def _keyset_page(query, sort_column, after: str, per_page: int):
+    """
+    Fetch one page ordered by (sort_column DESC NULLS LAST, id DESC) using a keyset cursor.
+    
+    The cursor is "<iso timestamp>~<id>" (or "~<id>" for rows without a timestamp) of the
+    last row on the previous page, so every page is an index range scan regardless of
+    how deep the listing goes.
+    
+    Returns:
+        Tuple of (rows, cursor for the next page or None)
+    """
+    if after:
+        try:
+            cursor_value, cursor_id = after.rsplit('~', 1)
+            cursor_id = int(cursor_id)
+            cursor_value = datetime.fromisoformat(cursor_value) if cursor_value else None
+        except ValueError:
+            cursor_value, cursor_id = None, None
+        if cursor_id is not None:
+            if cursor_value is None:
+                query = query.filter(sort_column.is_(None), InstallerInvoice.id < cursor_id)
+            else:
+                query = query.filter(
+                    (sort_column < cursor_value)
+                    | ((sort_column == cursor_value) & (InstallerInvoice.id < cursor_id))
+                    | sort_column.is_(None)
+                )
+    
+    rows = query.order_by(sort_column.desc().nulls_last(), InstallerInvoice.id.desc()).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last_value = getattr(rows[-1], sort_column.key)
+    return rows, f"{last_value.isoformat() if last_value else ''}~{rows[-1].id}"
+
+
+@portal_bp.route('/accounts/export/xero', methods=['GET'])
+@login_required
+@admin_required
+def export_accounts_xero():
+    """Stream submitted invoices of all (or one) installers as a Xero CSV, optionally for a date range."""
+    filter_installer = request.args.get('installer_id', type=int)
+    start_date = _parse_date(request.args.get('start_date'))
+    end_date = _parse_date(request.args.get('end_date'))
+    
+    invoice_query = _xero_invoice_query().filter(InstallerInvoice.status == 'submitted')
+    if filter_installer:
+        invoice_query = invoice_query.filter(InstallerInvoice.installer_id == filter_installer)
+    if start_date:
+        invoice_query = invoice_query.filter(InstallerInvoice.submitted_at >= start_date)
+    if end_date:
+        invoice_query = invoice_query.filter(InstallerInvoice.submitted_at < end_date + timedelta(days=1))
+    invoice_query = invoice_query.order_by(InstallerInvoice.submitted_at, InstallerInvoice.id)
+    
+    filename = f"accounts_xero_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    return _stream_csv(_xero_csv_rows(invoice_query), filename)
+
+
 @portal_bp.route('/accounts/invoices/<int:invoice_id>')
 @login_required
 @admin_required
@@ -48,6 +48,11 @@ class PdfData(db.Model):
     notes = db.Column(db.Text)  # Notes from customer enquiry forms
     created_at = db.Column(db.DateTime, default=datetime.now)
 
+    __table_args__ = (
+        # History and dashboard: processed uploads, newest first
+        db.Index('ix_pdf_data_processed_created_at', 'processed', 'created_at'),
+    )
+
 class Installer(db.Model):
     """Portal installer account used for login and authorization."""
 
@@ -133,11 +138,38 @@ class WorkOrder(db.Model):
     installer = db.relationship('Installer', backref=db.backref('work_orders', lazy=True))
 
 
+class PendingOrder(db.Model):
+    """Crew job awaiting an installer invoice, cached from the RFMS Schedule Pro jobs search."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    crew_code = db.Column(db.String(100), nullable=False, index=True)
+    order_number = db.Column(db.String(100), nullable=False, index=True)
+    job_number = db.Column(db.String(100))
+    job_name = db.Column(db.String(200))
+    status = db.Column(db.String(50))
+    scheduled_start = db.Column(db.String(50))  # As returned by RFMS (display only)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('crew_code', 'order_number', name='uq_pending_order_crew_order'),
+    )
+
+
+class CrewSyncState(db.Model):
+    """Last background sync of RFMS scheduler data for a crew."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    crew_code = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    last_synced_at = db.Column(db.DateTime)
+    last_full_sync_at = db.Column(db.DateTime)  # Last full-window refresh (incremental syncs in between)
+    last_error = db.Column(db.Text)
+
+
 class WorkOrderLine(db.Model):
     """Individual costing lines extracted from RFMS orders."""
 
     id = db.Column(db.Integer, primary_key=True)
-    work_order_id = db.Column(db.Integer, db.ForeignKey('work_order.id'), nullable=False)
+    work_order_id = db.Column(db.Integer, db.ForeignKey('work_order.id'), nullable=False, index=True)
     source_line_number = db.Column(db.Integer)
     product_code = db.Column(db.String(100))
     description = db.Column(db.String(255))
@@ -157,7 +189,7 @@ class InstallerInvoice(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     installer_id = db.Column(db.Integer, db.ForeignKey('installer.id'), nullable=False)
-    work_order_id = db.Column(db.Integer, db.ForeignKey('work_order.id'))
+    work_order_id = db.Column(db.Integer, db.ForeignKey('work_order.id'), index=True)
     invoice_number = db.Column(db.String(100), unique=True, index=True)
     status = db.Column(db.String(50), default='draft')
     subtotal = db.Column(db.Float, default=0)
@@ -172,12 +204,19 @@ class InstallerInvoice(db.Model):
     installer = db.relationship('Installer', backref=db.backref('invoices', lazy=True))
     work_order = db.relationship('WorkOrder', backref=db.backref('invoice', uselist=False))
 
+    __table_args__ = (
+        # Accounts dashboard listings (status filter + keyset order) and per-installer filters
+        db.Index('ix_installer_invoice_status_submitted_at', 'status', 'submitted_at', 'id'),
+        db.Index('ix_installer_invoice_status_updated_at', 'status', 'updated_at', 'id'),
+        db.Index('ix_installer_invoice_installer_status', 'installer_id', 'status'),
+    )
+
 
 class InvoiceLine(db.Model):
     """Line items that compose an installer invoice."""
 
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('installer_invoice.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('installer_invoice.id'), nullable=False, index=True)
     work_order_line_id = db.Column(db.Integer, db.ForeignKey('work_order_line.id'))
     description = db.Column(db.String(255), nullable=False)
     quantity = db.Column(db.Float, default=0)
@@ -195,7 +234,7 @@ class InvoiceAttachment(db.Model):
     """Attachments such as photos uploaded with an invoice."""
 
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('installer_invoice.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('installer_invoice.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     stored_path = db.Column(db.String(500), nullable=False)
     mime_type = db.Column(db.String(100))
@@ -204,6 +243,41 @@ class InvoiceAttachment(db.Model):
     invoice = db.relationship('InstallerInvoice', backref=db.backref('attachments', lazy=True, cascade="all, delete-orphan"))
 
 
+class OutboundEmail(db.Model):
+    """Queued Graph email, sent by the outbox worker (utils.email_outbox)."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    dedupe_key = db.Column(db.String(200), unique=True)  # Same key is only ever queued once
+    from_address = db.Column(db.String(200), nullable=False)
+    to_address = db.Column(db.String(200), nullable=False)
+    subject = db.Column(db.String(500), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    body_type = db.Column(db.String(20), default='HTML')
+    attachment_path = db.Column(db.String(500))  # File in the outbox directory, removed once settled
+    attachment_name = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    claimed_at = db.Column(db.DateTime)  # When a worker took the row for sending (its lease)
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    send_ms = db.Column(db.Float)  # Graph sendMail latency of the successful attempt
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+
+class ServerSession(db.Model):
+    """Flask session data kept server-side; the cookie only carries the id (utils.session_store)."""
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)  # Flask's tagged JSON
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class StockReceiving(db.Model):
     """Track stock receiving events for daily reporting"""
     id = db.Column(db.Integer, primary_key=True)
@@ -220,6 +294,11 @@ class StockReceiving(db.Model):
     line_number = db.Column(db.Integer)  # Line number from order
     product_code = db.Column(db.String(20))
     
+    __table_args__ = (
+        # Daily report (one day) and per-order lookups within a date range
+        db.Index('ix_stock_receiving_received_date_order_number', 'received_date', 'order_number'),
+    )
+    
     def to_dict(self):
         """Convert to dictionary for reporting"""
         return {
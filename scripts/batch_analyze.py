@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Batch-analyze a folder (or ZIP) of builder purchase orders.
+
+Each document is analyzed through the template fast path / DocumentAnalyzer
+with bounded concurrency and saved as a PdfData row, ready for review in the
+uploader (History page or /preview/<id>).
+
+Usage:
+    python scripts/batch_analyze.py <FILE_OR_FOLDER_OR_ZIP> [...] [--workers N] [--document-type TYPE]
+
+Example:
+    python scripts/batch_analyze.py ~/Downloads/builder_pos.zip --workers 4
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path to import the app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app_origin import app, db, ingest_batch, normalize_document_type, read_upload_settings, UPLOAD_DOCUMENT_TYPES
+from utils.batch_analyzer import DEFAULT_BATCH_WORKERS
+from utils.migrations import upgrade_schema
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-analyze purchase orders into the review queue")
+    parser.add_argument('paths', nargs='+', help="PDF/image files, folders or ZIP archives")
+    parser.add_argument('--workers', type=int, default=DEFAULT_BATCH_WORKERS,
+                        help=f"Documents analyzed concurrently (default {DEFAULT_BATCH_WORKERS})")
+    parser.add_argument('--document-type', default='purchase_order', choices=sorted(UPLOAD_DOCUMENT_TYPES),
+                        help="Same choices as the upload form (email_order / email_quotation map to their base types)")
+    parser.add_argument('--salesperson', default='STEVE WHYTE')
+    args = parser.parse_args()
+
+    missing = [p for p in args.paths if not Path(p).exists()]
+    if missing:
+        logger.error(f"Path(s) not found: {', '.join(missing)}")
+        return 1
+
+    settings = read_upload_settings({'salesperson': args.salesperson})
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db.engine)
+        report, pdf_rows = ingest_batch(args.paths, normalize_document_type(args.document_type), settings,
+                                        max_workers=args.workers)
+
+        print("\n" + "=" * 80)
+        print(f"Analyzed {len(report.items)} document(s) in {report.elapsed_seconds:.1f}s "
+              f"({report.documents_per_minute:.1f} documents/minute)")
+        print("=" * 80)
+        for pdf_data in pdf_rows:
+            print(f"[OK]   #{pdf_data.id:<6} {pdf_data.po_number or '-':<20} {pdf_data.filename}")
+        for item in report.failed:
+            print(f"[FAIL]         {item.filename}: {item.error[:120]}")
+
+    return 0 if not report.failed else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
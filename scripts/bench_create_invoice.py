@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark for the installer portal's create-invoice flow.
+
+Starts a stub RFMS server on localhost (session/begin, order/{n} and
+order/jobs/{n}, each with a configurable delay), points the portal's RFMS
+client at it and posts /portal/create-invoice for a series of orders against
+an in-memory SQLite database. Reports request latency and the number of RFMS
+calls per invoice; exits non-zero when --max-p95-ms or the expected call
+count (one order fetch and one jobs fetch per invoice) is exceeded.
+
+Usage:
+    python scripts/bench_create_invoice.py [--orders N] [--lines N] [--latency-ms MS] [--max-p95-ms MS]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add parent directory to path to import the portal
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+STUB_CALLS = Counter()
+
+
+def build_order(order_number: str, line_count: int) -> dict:
+    lines = []
+    for i in range(1, line_count + 1):
+        lines.append({
+            'lineNumber': i,
+            'productCode': str(38 + i % 12),
+            'styleName': f'INSTALL LABOUR {i}',
+            'colorName': 'M2',
+            'quantity': 10 + i,
+            'unitCost': 12.5,
+        })
+    return {'status': 'success', 'result': {'documentNumber': order_number, 'lines': lines}}
+
+
+def build_jobs(order_number: str, line_count: int) -> dict:
+    return {'status': 'success', 'result': 'OK', 'detail': [{
+        'jobId': int(order_number[-4:]),
+        'jobStatus': 'DELIVERED',
+        'scheduledStart': '20250101',
+        'lines': [{'lineNumber': i, 'styleName': f'INSTALL LABOUR {i}', 'colorName': 'M2', 'quantity': 10 + i}
+                  for i in range(1, line_count + 1)],
+    }]}
+
+
+def make_handler(latency: float, line_count: int):
+    class StubRFMSHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, payload: dict):
+            time.sleep(latency)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            STUB_CALLS['session'] += 1
+            self._reply({'sessionToken': 'stub-session-token'})
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            order_number = path.rsplit('/', 1)[-1]
+            if path.startswith('/v2/order/jobs/'):
+                STUB_CALLS['order_jobs'] += 1
+                self._reply(build_jobs(order_number, line_count))
+            else:
+                STUB_CALLS['order'] += 1
+                self._reply(build_order(order_number, line_count))
+
+    return StubRFMSHandler
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /portal/create-invoice against a stub RFMS server")
+    parser.add_argument('--orders', type=int, default=20, help="Invoices to create")
+    parser.add_argument('--lines', type=int, default=12, help="Invoice lines per order")
+    parser.add_argument('--latency-ms', type=float, default=150, help="Stub RFMS delay per request")
+    parser.add_argument('--max-p95-ms', type=float, default=None, help="Fail if p95 latency exceeds this")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency_ms / 1000.0, args.lines))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ['RFMS_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault('RFMS_STORE_CODE', 'BENCH')
+    os.environ.setdefault('RFMS_API_KEY', 'bench')
+    logging.basicConfig(level=logging.WARNING)
+
+    from flask import Flask
+    from models import db, Installer
+    import installer_portal
+
+    app = Flask('bench_create_invoice', template_folder=str(Path(__file__).parent.parent / 'templates'))
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SECRET_KEY='bench', TESTING=True)
+    db.init_app(app)
+    app.register_blueprint(installer_portal.portal_bp)
+
+    with app.app_context():
+        db.create_all()
+        installer = Installer(name='Bench', email='bench@example.com', crew_code='BENCH',
+                              approved=True, active=True)
+        installer.set_password('bench')
+        db.session.add(installer)
+        db.session.commit()
+        installer_id = installer.id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['installer_id'] = installer_id
+
+    latencies = []
+    for i in range(args.orders):
+        order_number = f"AZ00{1000 + i:04d}"
+        start = time.perf_counter()
+        response = client.post('/portal/create-invoice', data={'order_number': order_number, 'install_date': '2025-01-01'})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 302 or '/invoice' not in response.headers.get('Location', ''):
+            print(f"[FAIL] {order_number}: HTTP {response.status_code} -> {response.headers.get('Location')}")
+            return 1
+
+    server.shutdown()
+
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+    print("=" * 70)
+    print(f"create-invoice: {args.orders} orders x {args.lines} lines, stub RFMS latency {args.latency_ms:.0f}ms")
+    print("=" * 70)
+    print(f"p50 {p50:8.1f} ms   p95 {p95:8.1f} ms   max {max(latencies):8.1f} ms")
+    print(f"RFMS calls: {dict(STUB_CALLS)}")
+
+    failed = False
+    if STUB_CALLS['order'] > args.orders or STUB_CALLS['order_jobs'] > args.orders:
+        print("[FAIL] More than one order / jobs fetch per invoice")
+        failed = True
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        print(f"[FAIL] p95 {p95:.1f}ms exceeds {args.max_p95_ms:.1f}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
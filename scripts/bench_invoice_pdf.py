@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk installer invoice PDF rendering.
+
+Renders a batch of synthetic invoices with utils.invoice_pdf, once inline
+(one process) and once across the worker pool, and reports pages per second
+for each. The pool is warmed up first so process start-up is not counted.
+
+Usage:
+    python scripts/bench_invoice_pdf.py [--invoices N] [--lines N] [--workers N] [--min-pages-per-sec X]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import invoice_pdf
+from utils.invoice_pdf import render_invoices_pdf
+
+
+def build_invoice(index: int, line_count: int) -> dict:
+    lines = [{'description': f'Carpet install - room {i}', 'quantity': 10.0 + i, 'unit_price': 12.5}
+             for i in range(1, line_count + 1)]
+    subtotal = sum(line['quantity'] * line['unit_price'] for line in lines)
+    return {
+        'invoice_number': f'INV-BENCH-{index:05d}',
+        'invoice_date': '01 January 2025',
+        'order_number': f'AZ00{1000 + index:04d}',
+        'job_number': f'J{index}',
+        'installer_name': 'Bench Installer',
+        'installer_email': 'bench@example.com',
+        'installer_phone': '0400 000 000',
+        'crew_code': 'BENCH',
+        'lines': lines,
+        'subtotal': subtotal,
+        'tax_amount': subtotal * 0.1,
+        'total': subtotal * 1.1,
+        'notes': 'Benchmark invoice',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk invoice PDF rendering")
+    parser.add_argument('--invoices', type=int, default=200, help="Invoices per batch")
+    parser.add_argument('--lines', type=int, default=15, help="Lines per invoice")
+    parser.add_argument('--workers', type=int, default=invoice_pdf.PDF_RENDER_WORKERS, help="Worker processes")
+    parser.add_argument('--min-pages-per-sec', type=float, default=None,
+                        help="Fail if parallel throughput is below this")
+    args = parser.parse_args()
+
+    invoice_pdf.PDF_RENDER_WORKERS = args.workers
+    invoices = [build_invoice(i, args.lines) for i in range(args.invoices)]
+
+    # Warm up styles and the worker pool
+    render_invoices_pdf(invoices[:1], max_workers=1)
+    if args.workers > 1:
+        render_invoices_pdf(invoices[:args.workers * invoice_pdf.PDF_PARALLEL_MIN], max_workers=args.workers)
+
+    print("=" * 70)
+    print(f"Invoice PDF rendering: {args.invoices} invoices x {args.lines} lines")
+    print("=" * 70)
+
+    results = {}
+    for label, workers in (('serial', 1), (f'parallel ({args.workers} workers)', args.workers)):
+        pdf_bytes, pages, seconds = render_invoices_pdf(invoices, max_workers=workers)
+        results[label] = pages / seconds
+        print(f"{label:<28} {pages:5d} pages  {seconds:7.2f} s  {pages / seconds:8.1f} pages/s  "
+              f"{len(pdf_bytes) / 1024:8.0f} KB")
+
+    parallel = results[f'parallel ({args.workers} workers)']
+    print(f"\nSpeed-up: {parallel / results['serial']:.2f}x")
+
+    if args.min_pages_per_sec is not None and parallel < args.min_pages_per_sec:
+        print(f"[FAIL] {parallel:.1f} pages/s is below {args.min_pages_per_sec:.1f}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for utils.order_utils.
+
+Covers the order number formats documented in the module (base, hyphenated,
+joined suffix, reference prefix, #ST orders, numeric-only) for cold (cache
+cleared) and warm (memoized) recognition, plus text scanning of a long email
+body with extract_order_number_from_text and extract_all.
+
+Usage:
+    python scripts/bench_order_utils.py [--number N]
+"""
+
+import sys
+import argparse
+import timeit
+from pathlib import Path
+
+# Add parent directory to path to import utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import order_utils
+from utils.order_utils import (
+    normalize_order_number,
+    get_order_number_variations,
+    recognize_order_number,
+    extract_order_number_from_text,
+    extract_all,
+)
+
+FORMATS = {
+    'base': 'AZ003463',
+    'hyphenated': 'AZ003463-0001',
+    'joined': 'AZ0034630001',
+    'ref_prefix': 'Ref: AZ0034630001',
+    'other_suffix': 'AZ0034630004',
+    'st_order': 'ST00536',
+    'numeric': '6396458',
+}
+
+EMAIL_BODY = (
+    "Hi team,\n\nPlease find attached invoice for order Ref: AZ0034630001 and AZ003463-0004.\n"
+    "Backorder for CG105159 will ship next week. Consignment 88812345.\n\n"
+    "Kind regards,\nSupplier Accounts\n"
+) * 200
+
+
+def bench(label: str, func, number: int) -> None:
+    seconds = timeit.timeit(func, number=number)
+    print(f"{label:<45} {seconds / number * 1e6:10.2f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark order number parsing")
+    parser.add_argument('--number', type=int, default=20000, help="Iterations per benchmark")
+    args = parser.parse_args()
+    number = args.number
+
+    print("=" * 70)
+    print(f"order_utils micro-benchmarks ({number} iterations)")
+    print("=" * 70)
+
+    for name, value in FORMATS.items():
+        def cold(value=value):
+            order_utils._recognize.cache_clear()
+            recognize_order_number(value)
+        bench(f"recognize[{name}] cold", cold, number)
+        bench(f"recognize[{name}] warm", lambda value=value: recognize_order_number(value), number)
+
+    # search_orders_for_receiving pattern: normalize + variations on the same string
+    def receiving_lookup():
+        for value in FORMATS.values():
+            normalize_order_number(value)
+            get_order_number_variations(value)
+    bench("normalize + variations (all formats, warm)", receiving_lookup, number // 10)
+
+    text_number = max(1, number // 200)
+    print(f"\nEmail body: {len(EMAIL_BODY):,} characters ({text_number} iterations)")
+    bench("extract_order_number_from_text", lambda: extract_order_number_from_text(EMAIL_BODY), text_number)
+    pages = EMAIL_BODY.split('\n\n')
+    bench(f"extract_all ({len(pages)} texts)", lambda: extract_all(pages), text_number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the installer photo PDF pipeline on a synthetic order.
+
+Generates --photos camera-sized JPEGs, then builds the order PDF twice:
+  legacy  - compress each photo to a compressed_*.jpg file, re-open it with
+            Pillow for its size and let PyMuPDF load it from the file
+            (three decodes per photo)
+  engine  - utils.photo_pdf: one draft-mode decode per photo, JPEG stream
+            passed to PyMuPDF from memory
+
+Reports seconds, photos/second and PDF size for each.
+
+Usage:
+    python scripts/bench_photo_pdf.py [--photos N] [--width PX] [--height PX]
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image, ImageDraw
+
+from utils.photo_pdf import prepare_image, create_pdf_from_images, add_pdf_header, HEADER_HEIGHT
+
+ORDER_DETAILS = {
+    'order_number': 'AZ001234',
+    'po_number': 'PO-5678',
+    'sold_to_name': 'Bench Builders Pty Ltd',
+    'ship_to_name': 'Lot 12 Display Home',
+    'address': '12 Example Street, Springfield Lakes Estate Stage 4',
+    'city': 'SPRINGFIELD',
+}
+
+
+def make_photos(folder: Path, count: int, width: int, height: int):
+    base = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    paths = []
+    for i in range(count):
+        img = base.copy()
+        draw = ImageDraw.Draw(img)
+        for j in range(0, width, 97):
+            draw.line([(j, 0), (width - j, height)], fill=((i * 37 + j) % 255, j % 255, 128), width=5)
+        path = folder / f"attachment_{i}.jpg"
+        img.save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+
+def legacy_pipeline(paths, output_pdf: Path):
+    """The pre-engine flow: compressed_*.jpg on disk, Pillow size probe, PyMuPDF file load."""
+    import fitz  # PyMuPDF
+
+    compressed = []
+    for path in paths:
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            img.thumbnail((1920, 1920), Image.Resampling.LANCZOS)
+            compressed_path = path.parent / f"compressed_{path.name}"
+            img.save(compressed_path, 'JPEG', quality=75, optimize=True)
+            compressed.append(compressed_path)
+
+    doc = fitz.open()
+    for path in compressed:
+        with Image.open(path) as img:
+            width, height = img.size
+        page = doc.new_page(width=width, height=height + HEADER_HEIGHT)
+        add_pdf_header(page, ORDER_DETAILS, width, HEADER_HEIGHT)
+        page.insert_image(fitz.Rect(0, HEADER_HEIGHT, width, height + HEADER_HEIGHT), filename=str(path))
+    doc.save(str(output_pdf))
+    doc.close()
+    for path in compressed:
+        path.unlink()
+
+
+def engine_pipeline(paths, output_pdf: Path):
+    images = [prepared for prepared in map(prepare_image, paths) if prepared]
+    timings = {}
+    create_pdf_from_images(images, output_pdf, ORDER_DETAILS, timings=timings)
+    print(f"         header {timings['header'] * 1000:.1f} ms total, save {timings['save']:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark installer photo PDF creation")
+    parser.add_argument('--photos', type=int, default=100, help="Photos in the order")
+    parser.add_argument('--width', type=int, default=4032, help="Photo width (px)")
+    parser.add_argument('--height', type=int, default=3024, help="Photo height (px)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = Path(tempfile.mkdtemp(prefix='bench_photo_pdf_'))
+    try:
+        print(f"Generating {args.photos} photos ({args.width}x{args.height})...")
+        paths = make_photos(work_dir, args.photos, args.width, args.height)
+        input_mb = sum(p.stat().st_size for p in paths) / 1024 / 1024
+
+        print("=" * 70)
+        print(f"Photo PDF: {args.photos} photos, {input_mb:.1f} MB of JPEG input")
+        print("=" * 70)
+        timings = {}
+        for label, pipeline in (('legacy', legacy_pipeline), ('engine', engine_pipeline)):
+            output_pdf = work_dir / f"{label}.pdf"
+            start = time.perf_counter()
+            pipeline(paths, output_pdf)
+            seconds = time.perf_counter() - start
+            timings[label] = seconds
+            print(f"{label:<8} {seconds:7.2f} s  {args.photos / seconds:7.1f} photos/s  "
+                  f"PDF {output_pdf.stat().st_size / 1024 / 1024:6.1f} MB")
+
+        print(f"\nSpeed-up: {timings['legacy'] / timings['engine']:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
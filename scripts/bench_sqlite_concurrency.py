@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent SQLite reads and writes with and without the engine profile.
+
+Creates a throwaway database file with the app's schema, seeds it with
+StockReceiving rows, then for --seconds runs:
+  - --writers threads inserting StockReceiving rows, one commit per --batch rows
+    (like the stock receiving job)
+  - --readers threads running the daily report query (like portal dashboards)
+
+twice: once with SQLAlchemy's defaults (rollback journal, no pragmas) and once
+with utils.db_engine (WAL, synchronous=NORMAL, busy_timeout, cache/mmap, pool
+sizing). Reports reads/s, commits/s, worst read latency and "database is
+locked" errors for each.
+
+Usage:
+    python scripts/bench_sqlite_concurrency.py [--seconds S] [--readers N] [--writers N] [--batch N] [--rows N]
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import models and utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from models import db, StockReceiving
+from utils.db_engine import engine_options, configure_sqlite_engine
+
+
+def stock_rows(start: int, count: int):
+    today = date.today()
+    return [{
+        'order_number': f"AZ{(start + i) % 5000:06d}",
+        'sold_to_name': 'Bench Builders',
+        'supplier_name': f"Supplier {(start + i) % 40}",
+        'stock_received': 'HYBRID PLANK',
+        'quantity': 12.5,
+        'unit': 'M2',
+        'is_st_order': False,
+        'received_date': today - timedelta(days=(start + i) % 60),
+        'line_number': 1,
+    } for i in range(count)]
+
+
+def make_engine(path: Path, tuned: bool):
+    uri = f"sqlite:///{path}"
+    if not tuned:
+        return create_engine(uri)
+    engine = create_engine(uri, **engine_options(uri))
+    configure_sqlite_engine(engine)
+    return engine
+
+
+def run(path: Path, tuned: bool, seconds: float, readers: int, writers: int, batch: int):
+    engine = make_engine(path, tuned)
+    table = StockReceiving.__table__
+    report = (select(StockReceiving.supplier_name, func.count(), func.sum(StockReceiving.quantity))
+              .where(StockReceiving.received_date >= date.today() - timedelta(days=7))
+              .group_by(StockReceiving.supplier_name))
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'reads': 0, 'commits': 0, 'locked': 0, 'max_read_ms': 0.0}
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(report).all()
+            except OperationalError:
+                with lock:
+                    stats['locked'] += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                stats['reads'] += 1
+                stats['max_read_ms'] = max(stats['max_read_ms'], elapsed)
+
+    def writer(offset):
+        n = offset * 1_000_000
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(table), stock_rows(n, batch))
+            except OperationalError:
+                with lock:
+                    stats['locked'] += 1
+                continue
+            n += batch
+            with lock:
+                stats['commits'] += 1
+
+    threads = ([threading.Thread(target=reader) for _ in range(readers)] +
+               [threading.Thread(target=writer, args=(i,)) for i in range(writers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite reads/writes")
+    parser.add_argument('--seconds', type=float, default=10, help="Duration of each run")
+    parser.add_argument('--readers', type=int, default=8, help="Reader threads")
+    parser.add_argument('--writers', type=int, default=2, help="Writer threads")
+    parser.add_argument('--batch', type=int, default=20, help="Rows per commit")
+    parser.add_argument('--rows', type=int, default=50000, help="Rows seeded before each run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = Path(tempfile.mkdtemp(prefix='bench_sqlite_'))
+    try:
+        print("=" * 70)
+        print(f"SQLite concurrency: {args.readers} readers, {args.writers} writers "
+              f"({args.batch} rows/commit), {args.rows:,} seeded rows, {args.seconds:.0f}s per run")
+        print("=" * 70)
+        results = {}
+        for label, tuned in (('default', False), ('tuned', True)):
+            path = work_dir / f"{label}.db"
+            seed = create_engine(f"sqlite:///{path}")
+            db.metadata.create_all(seed)
+            with seed.begin() as conn:
+                conn.execute(insert(StockReceiving.__table__), stock_rows(0, args.rows))
+            seed.dispose()
+
+            stats = run(path, tuned, args.seconds, args.readers, args.writers, args.batch)
+            results[label] = stats
+            print(f"{label:<8} {stats['reads'] / args.seconds:8.1f} reads/s  "
+                  f"{stats['commits'] / args.seconds:7.1f} commits/s  "
+                  f"max read {stats['max_read_ms']:7.1f} ms  locked errors {stats['locked']}")
+
+        default_rate = results['default']['reads'] / args.seconds
+        if default_rate:
+            print(f"\nRead throughput: {results['tuned']['reads'] / args.seconds / default_rate:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Query-plan check for the app's hot queries.
+
+Builds the schema the way startup does (db.create_all, then the versioned
+migrations in utils/migrations.py) in a throwaway SQLite database - or uses
+--database to check an existing one, e.g. a copy of production - and runs
+EXPLAIN QUERY PLAN on each hot query. Exits non-zero if any of them scans a
+table without an index (a "SCAN <table>" step), so a dropped index or a query
+rewritten so it can no longer use one is caught before it ships.
+
+Sorting in a temp B-tree is reported as a warning. With --database, queries on
+tables that database does not have (yet) are reported as skipped.
+
+Usage:
+    python scripts/check_query_plans.py [--database sqlite:///path/to/copy.db] [--verbose]
+"""
+
+import sys
+import shutil
+import argparse
+import logging
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+
+# Add parent directory to path to import models and utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, func, inspect, select
+
+from models import (
+    db,
+    PdfData,
+    InstallerInvoice,
+    InvoiceLine,
+    InvoiceAttachment,
+    WorkOrderLine,
+    StockReceiving,
+)
+from utils.migrations import upgrade_schema
+
+
+def hot_queries():
+    """(name, statement) for the queries behind the busiest pages and jobs."""
+    today = date.today()
+    cursor = datetime(2025, 1, 1)
+    return [
+        ('history: processed uploads newest first',
+         select(PdfData).where(PdfData.processed.is_(True)).order_by(PdfData.created_at.desc())),
+        ('dashboard: processed upload count',
+         select(func.count()).select_from(PdfData).where(PdfData.processed.is_(True))),
+        ('accounts: submitted invoices page',
+         select(InstallerInvoice).where(InstallerInvoice.status == 'submitted', InstallerInvoice.submitted_at < cursor)
+         .order_by(InstallerInvoice.submitted_at.desc().nulls_last(), InstallerInvoice.id.desc()).limit(51)),
+        ('accounts: draft invoices page',
+         select(InstallerInvoice).where(InstallerInvoice.status == 'draft')
+         .order_by(InstallerInvoice.updated_at.desc().nulls_last(), InstallerInvoice.id.desc()).limit(51)),
+        ('portal: installer invoices',
+         select(InstallerInvoice).where(InstallerInvoice.installer_id == 1)),
+        ('portal: installer invoices by status',
+         select(InstallerInvoice).where(InstallerInvoice.installer_id == 1, InstallerInvoice.status == 'draft')),
+        ('invoice lines for an invoice',
+         select(InvoiceLine).where(InvoiceLine.invoice_id == 1)),
+        ('invoice attachments for an invoice',
+         select(InvoiceAttachment).where(InvoiceAttachment.invoice_id == 1)),
+        ('work order lines for a work order',
+         select(WorkOrderLine).where(WorkOrderLine.work_order_id == 1)),
+        ('daily stock report',
+         select(StockReceiving).where(StockReceiving.received_date == today)),
+        ('stock received for an order in a date range',
+         select(StockReceiving).where(StockReceiving.received_date >= today,
+                                      StockReceiving.order_number == 'AZ000001')),
+    ]
+
+
+def explain(conn, statement):
+    """EXPLAIN QUERY PLAN detail lines for a statement."""
+    compiled = statement.compile(conn, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+
+
+def tables_used(statement):
+    """Names of the tables a statement reads."""
+    return {from_.name for from_ in statement.get_final_froms()}
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t USING INDEX ix" / "USING COVERING INDEX" walk an index; a bare "SCAN t" reads the whole table
+    return detail.startswith('SCAN ') and 'USING' not in detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query does a full table scan")
+    parser.add_argument('--database', help="SQLAlchemy SQLite URI to check (default: a fresh migrated database)")
+    parser.add_argument('--verbose', action='store_true', help="Print every plan")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = None
+    if args.database:
+        uri = args.database
+    else:
+        work_dir = Path(tempfile.mkdtemp(prefix='query_plans_'))
+        uri = f"sqlite:///{work_dir / 'check.db'}"
+
+    engine = create_engine(uri)
+    try:
+        if engine.dialect.name != 'sqlite':
+            print(f"Query-plan check only supports SQLite (got {engine.dialect.name})")
+            return 2
+        if work_dir:
+            db.metadata.create_all(engine)
+            upgrade_schema(engine)
+
+        existing = set(inspect(engine).get_table_names())
+        failures = skipped = 0
+        with engine.connect() as conn:
+            for name, statement in hot_queries():
+                missing = sorted(tables_used(statement) - existing)
+                if missing:
+                    skipped += 1
+                    print(f"[SKIP] {name} (no table {', '.join(missing)})")
+                    continue
+                plan = explain(conn, statement)
+                scans = [detail for detail in plan if is_full_scan(detail)]
+                sorts = [detail for detail in plan if 'TEMP B-TREE' in detail]
+                status = 'FAIL' if scans else ('WARN' if sorts else 'OK')
+                failures += bool(scans)
+                print(f"[{status:<4}] {name}")
+                if scans or sorts or args.verbose:
+                    for detail in plan:
+                        print(f"         {detail}")
+    finally:
+        engine.dispose()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if skipped:
+        print(f"\n{skipped} hot quer{'y' if skipped == 1 else 'ies'} skipped: tables missing from the database")
+    if failures:
+        print(f"\n{failures} hot quer{'y' if failures == 1 else 'ies'} doing a full table scan")
+        return 1
+    print("\nAll hot queries use an index")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Migrate WorkOrder.order_payload rows to the compact, versioned projection.
+
+Rows still holding a full RFMS get_order() response (including attachment
+metadata and, for some orders, inline file data) are rewritten with
+utils.order_payload.compact_order_payload. Full payloads are written to the
+gzip side store first when ORDER_PAYLOAD_ARCHIVE_DIR (or --archive-dir) is set.
+The SQLite file is vacuumed afterwards and its size reported before and after.
+
+Usage:
+    python scripts/compact_order_payloads.py [--archive-dir DIR] [--batch-size N] [--dry-run]
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add parent directory to path to import the app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app_origin import app, db
+from models import WorkOrder
+from utils.order_payload import compact_order_payload, archive_order_payload, is_compact
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def sqlite_path():
+    """Path of the SQLite database file, or None for other databases."""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        return None
+    path = url.database
+    if not os.path.isabs(path) and not os.path.exists(path):
+        # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+        path = os.path.join(app.instance_path, os.path.basename(path))
+    return path
+
+
+def format_size(num_bytes):
+    return f"{num_bytes / 1024 / 1024:.2f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink WorkOrder.order_payload to the compact projection")
+    parser.add_argument('--archive-dir', default=os.getenv('ORDER_PAYLOAD_ARCHIVE_DIR'),
+                        help="Keep full payloads as gzip files in this directory (default: drop them)")
+    parser.add_argument('--batch-size', type=int, default=200, help="Rows per commit")
+    parser.add_argument('--dry-run', action='store_true', help="Report savings without writing")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db_path = sqlite_path()
+        size_before = os.path.getsize(db_path) if db_path and os.path.exists(db_path) else None
+
+        ids = [row[0] for row in db.session.query(WorkOrder.id).filter(WorkOrder.order_payload.isnot(None)).order_by(WorkOrder.id)]
+        converted = 0
+        bytes_before = 0
+        bytes_after = 0
+
+        for offset in range(0, len(ids), args.batch_size):
+            batch = WorkOrder.query.filter(WorkOrder.id.in_(ids[offset:offset + args.batch_size])).all()
+            for work_order in batch:
+                payload = work_order.order_payload
+                if is_compact(payload):
+                    continue
+                compact = compact_order_payload(payload)
+                bytes_before += len(json.dumps(payload))
+                bytes_after += len(json.dumps(compact)) if compact else 0
+                if args.dry_run:
+                    continue
+                if args.archive_dir:
+                    archive_order_payload(work_order.order_number or f"WO{work_order.id}", payload, args.archive_dir)
+                work_order.order_payload = compact
+                converted += 1
+            if not args.dry_run:
+                db.session.commit()
+            logger.info(f"Processed {min(offset + args.batch_size, len(ids))}/{len(ids)} work orders")
+
+        if not args.dry_run and converted and db_path:
+            # Return the freed pages to the filesystem
+            db.session.execute(db.text('VACUUM'))
+            db.session.commit()
+
+        size_after = os.path.getsize(db_path) if db_path and os.path.exists(db_path) else None
+
+    print("\n" + "=" * 70)
+    print(f"{'Would convert' if args.dry_run else 'Converted'} payloads of {len(ids)} work order(s) "
+          f"({converted if not args.dry_run else 'n/a'} rewritten)")
+    print(f"Payload JSON: {format_size(bytes_before)} -> {format_size(bytes_after)}")
+    if size_before is not None:
+        print(f"Database file ({db_path}): {format_size(size_before)} -> {format_size(size_after)}")
+    print("=" * 70)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,11 @@ from bs4 import BeautifulSoup
 import os
 import time
 import logging
+import threading
+from collections import deque
+
+from utils import metrics
+from utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +50,42 @@ def is_retryable(e) -> bool:
         return False
 
 
+class RateLimiter:
+    """
+    Sliding-window limiter shared by every DocumentAnalyzer in the process.
+
+    Keeps Gemini calls under the per-minute quota when several documents are
+    analyzed concurrently (batch uploads), instead of relying on 429 retries.
+    """
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a call is allowed. Returns the number of seconds waited."""
+        if self.max_calls <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return waited
+                sleep_for = self.period - (now - self._calls[0])
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+# Shared across threads so concurrent analyses respect the same quota (0 disables)
+gemini_rate_limiter = RateLimiter(int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '15')))
+
+
 @dataclass
 class AIProcessingResult:
     po_number: str
@@ -87,16 +128,22 @@ class DocumentAnalyzer:
     )
     def _generate_content(self, file_content, prompt):
         """Wrapper method for generate_content with retry logic"""
+        waited = gemini_rate_limiter.acquire()
+        if waited:
+            metrics.GEMINI_LIMITER_WAIT_SECONDS.inc(waited)
+            logger.info(f"Waited {waited:.2f} seconds for Gemini rate limiter")
         start_time = time.time()
         try:
-            response = self.client.models.generate_content(
-            model=self.model,
-            contents=[file_content, prompt],
-            config={
-                "response_mime_type": "application/json",
-            }
-        )
+            with span('gemini', 'generate_content', model=self.model):
+                response = self.client.models.generate_content(
+                    model=self.model,
+                    contents=[file_content, prompt],
+                    config={
+                        "response_mime_type": "application/json",
+                    }
+                )
             elapsed = time.time() - start_time
+            metrics.GEMINI_REQUESTS.labels('ok').inc()
             logger.info(f"AI API call completed in {elapsed:.2f} seconds")
             return response
         except Exception as e:
@@ -116,10 +163,13 @@ class DocumentAnalyzer:
             )
             
             if is_quota_exhausted:
+                metrics.GEMINI_REQUESTS.labels('quota_exhausted').inc()
                 logger.error(f"AI API quota exhausted after {elapsed:.2f} seconds - NOT retrying")
             elif is_429 and not is_quota_exhausted:
+                metrics.GEMINI_REQUESTS.labels('rate_limited').inc()
                 logger.warning(f"AI API rate limited (429) after {elapsed:.2f} seconds - will retry with backoff: {e}")
             else:
+                metrics.GEMINI_REQUESTS.labels('error').inc()
                 logger.warning(f"AI API call failed after {elapsed:.2f} seconds: {e}")
             raise
 
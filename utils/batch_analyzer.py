@@ -0,0 +1,207 @@
+"""
+Batch analysis of purchase orders.
+
+Expands a set of uploaded files and ZIP archives into individual documents and
+analyzes them with bounded concurrency. Gemini calls made by the analyzer go
+through the shared rate limiter in utils.ai_analyzer, so the worker count only
+controls how many documents are in flight, not the request rate.
+"""
+
+import logging
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+from werkzeug.utils import secure_filename
+
+from utils.tracing import traced_submit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WORKERS = int(os.getenv('BATCH_ANALYSIS_WORKERS', '4'))
+
+# Limits on what a ZIP may expand to (MAX_CONTENT_LENGTH only caps the compressed upload)
+BATCH_MAX_MEMBER_BYTES = int(os.getenv('BATCH_MAX_MEMBER_BYTES', str(50 * 1024 * 1024)))
+BATCH_MAX_EXTRACT_BYTES = int(os.getenv('BATCH_MAX_EXTRACT_BYTES', str(500 * 1024 * 1024)))
+
+
+@dataclass
+class BatchItem:
+    """Outcome of analyzing one document in a batch."""
+    filename: str
+    path: str
+    result: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class BatchReport:
+    """All items of a batch plus throughput figures."""
+    items: List[BatchItem] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> List[BatchItem]:
+        return [item for item in self.items if item.error is None]
+
+    @property
+    def failed(self) -> List[BatchItem]:
+        return [item for item in self.items if item.error is not None]
+
+    @property
+    def documents_per_minute(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return len(self.items) * 60.0 / self.elapsed_seconds
+
+
+def unique_path(directory: str, filename: str) -> str:
+    """
+    Path for filename in directory that does not exist yet.
+
+    Args:
+        directory: Target directory
+        filename: Desired (already sanitized) file name
+
+    Returns:
+        directory/filename, or directory/stem_N.ext if that name is taken
+    """
+    stem, ext = os.path.splitext(filename)
+    candidate = os.path.join(directory, filename)
+    counter = 1
+    while os.path.exists(candidate):
+        candidate = os.path.join(directory, f"{stem}_{counter}{ext}")
+        counter += 1
+    return candidate
+
+
+def _extract_archive(path: str, extract_dir: str, allowed_extensions: set) -> List[str]:
+    """
+    Extract the analyzable members of one ZIP, keeping their folders.
+
+    Members are written under extract_dir/<archive name>/<member folders>/, so
+    siteA/PO.pdf and siteB/PO.pdf stay separate documents.
+
+    Raises:
+        ValueError: If the members to extract add up to more than BATCH_MAX_EXTRACT_BYTES
+    """
+    archive_dir = unique_path(extract_dir, secure_filename(os.path.splitext(os.path.basename(path))[0]) or 'archive')
+    documents = []
+    total_bytes = 0
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or member.filename.startswith('__MACOSX/'):
+                continue
+            parts = [secure_filename(part) for part in member.filename.replace('\\', '/').split('/')]
+            parts = [part for part in parts if part]
+            member_name = parts[-1] if parts else ''
+            member_ext = os.path.splitext(member_name)[1].lower().lstrip('.')
+            if not member_name or member_ext not in allowed_extensions:
+                continue
+            if member.file_size > BATCH_MAX_MEMBER_BYTES:
+                logger.warning(f"Skipping {member.filename} in {os.path.basename(path)}: "
+                               f"{member.file_size:,} bytes exceeds the {BATCH_MAX_MEMBER_BYTES:,} byte limit")
+                continue
+            total_bytes += member.file_size
+            if total_bytes > BATCH_MAX_EXTRACT_BYTES:
+                raise ValueError(f"{os.path.basename(path)} expands to more than {BATCH_MAX_EXTRACT_BYTES:,} bytes")
+
+            member_dir = os.path.join(archive_dir, *parts[:-1])
+            os.makedirs(member_dir, exist_ok=True)
+            target = unique_path(member_dir, member_name)
+            # ZipExtFile stops at the declared file_size (and checks the CRC), so the size check above holds
+            with archive.open(member) as source, open(target, 'wb') as dest:
+                shutil.copyfileobj(source, dest)
+            documents.append(target)
+    return documents
+
+
+def collect_batch_files(paths: Iterable[str], extract_dir: str, allowed_extensions: set) -> List[str]:
+    """
+    Expand files and ZIP archives into a flat list of documents to analyze.
+
+    Args:
+        paths: Uploaded files, ZIP archives or directories
+        extract_dir: Directory that ZIP members are extracted into
+        allowed_extensions: Lowercase extensions (without dot) accepted for analysis
+
+    Returns:
+        Sorted list of document paths
+
+    Raises:
+        ValueError: If a ZIP expands beyond BATCH_MAX_EXTRACT_BYTES
+    """
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                documents.extend(collect_batch_files([os.path.join(path, name)], extract_dir, allowed_extensions))
+            continue
+
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        if ext == 'zip':
+            os.makedirs(extract_dir, exist_ok=True)
+            documents.extend(_extract_archive(path, extract_dir, allowed_extensions))
+        elif ext in allowed_extensions:
+            documents.append(path)
+        else:
+            logger.warning(f"Skipping unsupported file in batch: {path}")
+
+    return sorted(set(documents))
+
+
+def run_batch(file_paths: List[str], analyze: Callable[[str], Any],
+              max_workers: int = DEFAULT_BATCH_WORKERS,
+              on_progress: Optional[Callable[[int, int], None]] = None,
+              on_item: Optional[Callable[[BatchItem], None]] = None) -> BatchReport:
+    """
+    Analyze documents concurrently.
+
+    Callbacks run on the calling thread, so they may use its database session.
+
+    Args:
+        file_paths: Documents to analyze
+        analyze: Callable taking a file path and returning the analysis result
+        max_workers: Maximum number of documents analyzed at the same time
+        on_progress: Optional callback receiving (documents done, total) after each document
+        on_item: Optional callback receiving each BatchItem as soon as it is analyzed
+            (before on_progress); setting item.error marks it failed
+
+    Returns:
+        BatchReport with items in the same order as file_paths
+    """
+    report = BatchReport(items=[BatchItem(filename=os.path.basename(p), path=p) for p in file_paths])
+    if not file_paths:
+        return report
+
+    def _analyze(item: BatchItem) -> BatchItem:
+        start = time.time()
+        try:
+            item.result = analyze(item.path)
+        except Exception as e:
+            logger.warning(f"Batch analysis failed for {item.filename}: {e}")
+            item.error = str(e)
+        item.seconds = time.time() - start
+        return item
+
+    batch_start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [traced_submit(executor, _analyze, item) for item in report.items]
+        for done, future in enumerate(as_completed(futures), start=1):
+            item = future.result()
+            if on_item is not None and item.error is None:
+                on_item(item)
+            logger.info(f"Batch progress {done}/{len(futures)}: {item.filename} "
+                        f"({'failed' if item.error else 'ok'}, {item.seconds:.2f}s)")
+            if on_progress is not None:
+                on_progress(done, len(futures))
+    report.elapsed_seconds = time.time() - batch_start
+
+    logger.info(f"Batch of {len(report.items)} documents completed in {report.elapsed_seconds:.2f} seconds "
+                f"({report.documents_per_minute:.1f} documents/minute, {len(report.failed)} failed)")
+    return report
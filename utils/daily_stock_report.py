@@ -6,11 +6,13 @@ Runs at 3:45 PM AEST (15:45) on weekdays.
 """
 
 import os
+import time
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from utils.rfms_client import RFMSClient
 from utils.email_sender import EmailSender
+from utils import metrics
 import pytz
 
 logger = logging.getLogger(__name__)
@@ -209,16 +211,33 @@ class DailyStockReport:
             return False
 
 
+_scheduler = None
+
+
+def get_scheduler():
+    """
+    Get the shared background scheduler, starting it on first use.
+    
+    The daily report and the installer portal sync run as jobs on this one
+    scheduler so the app only ever has a single scheduler thread.
+    """
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        _scheduler = BackgroundScheduler()
+        _scheduler.start()
+    return _scheduler
+
+
 def schedule_daily_report():
     """
     Schedule the daily stock report to run at 3:45 PM AEST on weekdays.
     This should be called when the Flask app starts.
     """
-    from apscheduler.schedulers.background import BackgroundScheduler
     from apscheduler.triggers.cron import CronTrigger
     import pytz
     
-    scheduler = BackgroundScheduler()
+    scheduler = get_scheduler()
     
     # AEST timezone
     aest = pytz.timezone('Australia/Brisbane')
@@ -237,7 +256,6 @@ def schedule_daily_report():
         replace_existing=True
     )
     
-    scheduler.start()
     logger.info("Daily stock report scheduler started - will run at 3:45 PM AEST on weekdays")
     
     return scheduler
@@ -247,9 +265,17 @@ def run_daily_report():
     """
     Function to run the daily report (called by scheduler).
     """
+    start = time.perf_counter()
+    outcome = 'failed'
     try:
         report = DailyStockReport()
-        report.send_report()
+        if report.send_report():
+            outcome = 'sent'
+            metrics.DAILY_REPORT_LAST_SUCCESS.set(time.time())
     except Exception as e:
+        outcome = 'error'
         logger.error(f"Error running daily stock report: {e}", exc_info=True)
+    finally:
+        metrics.DAILY_REPORT_RUNS.labels(outcome).inc()
+        metrics.DAILY_REPORT_SECONDS.set(time.perf_counter() - start)
 
@@ -0,0 +1,133 @@
+"""
+Database Engine Configuration
+
+Engine and connection settings for the app database. For SQLite files every
+new connection is switched to:
+
+- journal_mode=WAL: readers no longer wait for a writer to commit (and vice
+  versa), so portal dashboards keep working while stock receiving or invoice
+  writes are in progress. WAL needs a local filesystem; set
+  SQLITE_JOURNAL_MODE=DELETE if the database ever lives on a network share.
+- synchronous=NORMAL: safe with WAL (a power cut can lose the last commits,
+  never corrupt the file) and avoids an fsync per commit.
+- busy_timeout: writers wait for the write lock instead of failing with
+  "database is locked".
+- cache_size / mmap_size / temp_store: keep hot pages and temp tables in memory.
+
+The connection pool is sized for Flask's threaded server plus the background
+workers (scheduler, outbox). Other databases get pre-ping and recycling.
+
+Usage (before db.init_app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    db.init_app(app)
+    install_sqlite_pragmas(app, db)
+"""
+
+import os
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+
+def is_sqlite_file(uri: str) -> bool:
+    """True for a file-backed SQLite URI (not :memory:)."""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """PRAGMAs applied to every new SQLite connection, in order."""
+    return {
+        'journal_mode': SQLITE_JOURNAL_MODE,
+        'synchronous': SQLITE_SYNCHRONOUS,
+        'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+        'cache_size': -SQLITE_CACHE_SIZE_KB,  # Negative = KiB rather than pages
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'temp_store': 'MEMORY',
+    }
+
+
+def engine_options(uri: str) -> Dict[str, Any]:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a database URI.
+
+    Args:
+        uri: SQLALCHEMY_DATABASE_URI
+
+    Returns:
+        Keyword arguments for create_engine
+    """
+    if make_url(uri).get_backend_name() == 'sqlite':
+        if not is_sqlite_file(uri):
+            # In-memory databases (tests) keep SQLAlchemy's single shared connection
+            return {}
+        return {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'connect_args': {
+                # Connections move between request and worker threads via the pool
+                'check_same_thread': False,
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: Dict[str, Any] = None) -> None:
+    """Run the PRAGMAs on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or sqlite_pragmas()).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_engine(engine: Engine) -> None:
+    """Apply the PRAGMAs to every connection an engine opens (no-op for other databases)."""
+    if engine.dialect.name != 'sqlite' or not is_sqlite_file(str(engine.url)):
+        return
+
+    logged = []
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
+        if not logged:
+            # Log what the database actually accepted once (journal_mode can silently stay DELETE)
+            logged.append(True)
+            cursor = dbapi_connection.cursor()
+            try:
+                journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+                synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+            finally:
+                cursor.close()
+            logger.info(f"SQLite {engine.url.database}: journal_mode={journal_mode}, synchronous={synchronous}, "
+                        f"busy_timeout={SQLITE_BUSY_TIMEOUT_MS}ms, pool_size={DB_POOL_SIZE}")
+
+
+def install_sqlite_pragmas(app, db) -> None:
+    """Hook the PRAGMAs into a Flask-SQLAlchemy engine (call after db.init_app)."""
+    with app.app_context():
+        configure_sqlite_engine(db.engine)
@@ -0,0 +1,393 @@
+"""
+Outbound Email Queue
+
+Request handlers queue Graph emails in the OutboundEmail table instead of
+sending them inline. A background worker claims due rows and sends them with
+bounded concurrency. Failed sends are retried with exponential backoff until
+EMAIL_OUTBOX_MAX_ATTEMPTS, and rows with the same dedupe key are only queued
+once.
+
+Queueing is transactional: enqueue_email adds the row to the caller's session,
+so an email about an invoice is only sent if the invoice change commits.
+
+Nothing starts the worker on import or blueprint registration: the server
+entrypoint (app_origin.py) calls start_outbox_worker, and any other process
+that should send queued emails must call it too. Emails queued elsewhere wait
+in the table until a worker runs.
+"""
+
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, OutboundEmail
+from utils.email_sender import EmailSender
+
+logger = logging.getLogger(__name__)
+
+EMAIL_OUTBOX_CONCURRENCY = int(os.getenv('EMAIL_OUTBOX_CONCURRENCY', '4'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv('EMAIL_OUTBOX_POLL_SECONDS', '2'))
+EMAIL_OUTBOX_BASE_BACKOFF_SECONDS = 30
+EMAIL_OUTBOX_MAX_BACKOFF_SECONDS = 3600
+# A 'sending' row whose claim is older than this is assumed abandoned (its process died) and is
+# requeued. Must stay well above the longest send: Graph calls time out after 30-60s.
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv('EMAIL_OUTBOX_LEASE_SECONDS', '300'))
+EMAIL_OUTBOX_DIR = os.getenv('EMAIL_OUTBOX_DIR', os.path.join('instance', 'email_outbox'))
+
+# Sent rows sampled for latency percentiles
+METRICS_SAMPLE_SIZE = 500
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _store_attachment(attachment_bytes: bytes, attachment_name: str) -> str:
+    os.makedirs(EMAIL_OUTBOX_DIR, exist_ok=True)
+    safe_name = ''.join(c for c in attachment_name if c.isalnum() or c in '-_.') or 'attachment'
+    path = os.path.join(EMAIL_OUTBOX_DIR, f"{uuid.uuid4().hex}_{safe_name}")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(attachment_bytes)
+    os.replace(tmp_path, path)
+    return path
+
+
+def enqueue_email(from_address: str, to_address: str, subject: str, body: str, body_type: str = 'HTML',
+                  attachment_bytes: bytes = None, attachment_name: str = None,
+                  dedupe_key: str = None, commit: bool = False) -> OutboundEmail:
+    """
+    Queue an email for the outbox worker.
+
+    Args:
+        from_address: Sender mailbox
+        to_address: Recipient address
+        subject: Email subject
+        body: Email body content
+        body_type: "HTML" or "Text"
+        attachment_bytes: Optional attachment content (stored in EMAIL_OUTBOX_DIR until sent)
+        attachment_name: File name for the attachment
+        dedupe_key: Emails with a key that is already queued are not queued again
+        commit: Commit now and wake the worker (otherwise the caller's commit queues it)
+
+    Returns:
+        The queued OutboundEmail (the existing row for a duplicate dedupe key)
+    """
+    if dedupe_key:
+        existing = OutboundEmail.query.filter_by(dedupe_key=dedupe_key).first()
+        if existing:
+            logger.info(f"Email '{dedupe_key}' already queued (#{existing.id}, {existing.status})")
+            return existing
+
+    email = OutboundEmail(
+        dedupe_key=dedupe_key,
+        from_address=from_address,
+        to_address=to_address,
+        subject=subject,
+        body=body,
+        body_type=body_type,
+        attachment_name=attachment_name,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    if attachment_bytes is not None:
+        email.attachment_path = _store_attachment(attachment_bytes, attachment_name or 'attachment')
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(email)
+    except IntegrityError:
+        # Queued concurrently under the same dedupe key
+        if email.attachment_path and os.path.exists(email.attachment_path):
+            os.unlink(email.attachment_path)
+        return OutboundEmail.query.filter_by(dedupe_key=dedupe_key).one()
+
+    if commit:
+        db.session.commit()
+        notify_outbox()
+    return email
+
+
+def notify_outbox() -> None:
+    """Wake the worker so newly committed emails go out without waiting for the next poll."""
+    if _worker is not None:
+        _worker.wake()
+
+
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(EMAIL_OUTBOX_MAX_BACKOFF_SECONDS, EMAIL_OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class OutboxWorker:
+    """
+    Background sender for the email outbox.
+
+    A single dispatcher thread claims due rows (pending -> sending, stamped with
+    claimed_at) and hands them to a thread pool of EMAIL_OUTBOX_CONCURRENCY
+    senders; it never claims more rows than there are free senders. Claims older
+    than EMAIL_OUTBOX_LEASE_SECONDS are requeued, so several processes can run a
+    worker against the same table without sending an email twice.
+    """
+
+    def __init__(self, app, concurrency: int = EMAIL_OUTBOX_CONCURRENCY, sender: EmailSender = None):
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.sender = sender or EmailSender()
+        self.counters = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='email-outbox')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_requeue = 0.0
+
+    def start(self) -> None:
+        with self.app.app_context():
+            self.requeue_expired()
+
+        self._thread = threading.Thread(target=self._run, name='email-outbox-dispatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Email outbox worker started ({self.concurrency} concurrent sender(s))")
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self._executor.shutdown(wait=wait)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def requeue_expired(self) -> int:
+        """
+        Send again rows whose sender died mid-send (requires an app context).
+
+        Only claims older than EMAIL_OUTBOX_LEASE_SECONDS are requeued, so rows another
+        live process is sending right now are left alone.
+
+        Returns:
+            Number of rows requeued
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS)
+        recovered = db.session.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.status == 'sending',
+                   (OutboundEmail.claimed_at.is_(None)) | (OutboundEmail.claimed_at < cutoff))
+            .values(status='pending', claimed_at=None)
+        ).rowcount
+        db.session.commit()
+        self._last_requeue = time.monotonic()
+        if recovered:
+            logger.warning(f"Requeued {recovered} email(s) whose send lease expired")
+        return recovered
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.dispatch()
+            except Exception as e:
+                logger.error(f"Email outbox dispatch failed: {e}", exc_info=True)
+            self._wake.wait(EMAIL_OUTBOX_POLL_SECONDS)
+            self._wake.clear()
+
+    def dispatch(self) -> List[Any]:
+        """
+        Claim due emails for the free senders and submit them (requires an app context).
+
+        Returns:
+            Futures for the submitted sends
+        """
+        if time.monotonic() - self._last_requeue > EMAIL_OUTBOX_LEASE_SECONDS / 2:
+            self.requeue_expired()
+
+        with self._lock:
+            free = self.concurrency - self._in_flight
+        if free <= 0:
+            return []
+
+        due_ids = db.session.execute(
+            select(OutboundEmail.id)
+            .where(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= datetime.utcnow())
+            .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+            .limit(free)
+        ).scalars().all()
+
+        claimed = []
+        for email_id in due_ids:
+            result = db.session.execute(
+                update(OutboundEmail)
+                .where(OutboundEmail.id == email_id, OutboundEmail.status == 'pending')
+                .values(status='sending', claimed_at=datetime.utcnow())
+            )
+            if result.rowcount:
+                claimed.append(email_id)
+        db.session.commit()
+
+        futures = []
+        for email_id in claimed:
+            with self._lock:
+                self._in_flight += 1
+            futures.append(self._executor.submit(self._send, email_id))
+        return futures
+
+    def drain(self, timeout: float = 60) -> None:
+        """Send everything currently due and wait for it (requires an app context)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            futures = self.dispatch()
+            if not futures:
+                break
+            for future in futures:
+                future.result(timeout=max(0, deadline - time.monotonic()))
+
+    def _send(self, email_id: int) -> None:
+        try:
+            with self.app.app_context():
+                email = db.session.get(OutboundEmail, email_id)
+                if email is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    if email.attachment_path:
+                        sent = self.sender.send_email_with_attachment(
+                            from_address=email.from_address,
+                            to_address=email.to_address,
+                            subject=email.subject,
+                            body=email.body,
+                            body_type=email.body_type or 'HTML',
+                            attachment_path=email.attachment_path,
+                            attachment_name=email.attachment_name,
+                        )
+                    else:
+                        sent = self.sender.send_email(email.from_address, email.to_address, email.subject,
+                                                      email.body, body_type=email.body_type or 'HTML')
+                    error = None if sent else 'Graph sendMail failed (see log)'
+                except Exception as e:
+                    sent, error = False, str(e)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                email.attempts = (email.attempts or 0) + 1
+                email.claimed_at = None
+                if sent:
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.send_ms = elapsed_ms
+                    email.last_error = None
+                    self.counters['sent'] += 1
+                elif email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    email.status = 'failed'
+                    email.last_error = error
+                    self.counters['failed'] += 1
+                    logger.error(f"Email #{email.id} to {email.to_address} failed after {email.attempts} attempt(s): {error}")
+                else:
+                    delay = _backoff_seconds(email.attempts)
+                    email.status = 'pending'
+                    email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    email.last_error = error
+                    self.counters['retried'] += 1
+                    logger.warning(f"Email #{email.id} to {email.to_address} failed (attempt {email.attempts}), "
+                                   f"retrying in {delay:.0f}s: {error}")
+
+                settled = email.status in ('sent', 'failed')
+                attachment_path = email.attachment_path
+                db.session.commit()
+
+                if settled and attachment_path and os.path.exists(attachment_path):
+                    os.unlink(attachment_path)
+        except Exception as e:
+            logger.error(f"Email outbox send of #{email_id} crashed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+
+
+def get_outbox_worker():
+    """The running outbox worker, or None if start_outbox_worker has not been called."""
+    return _worker
+
+
+def start_outbox_worker(app, concurrency: int = None) -> OutboxWorker:
+    """
+    Start the process-wide outbox worker for an app (later calls return the running worker).
+
+    Args:
+        app: Flask app whose database holds the outbox
+        concurrency: Concurrent senders (defaults to EMAIL_OUTBOX_CONCURRENCY)
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            worker = OutboxWorker(app, concurrency or EMAIL_OUTBOX_CONCURRENCY)
+            worker.start()
+            _worker = worker
+        return _worker
+
+
+def outbox_metrics() -> Dict[str, Any]:
+    """
+    Queue depth and latency figures for the outbox (requires an app context).
+
+    Returns:
+        Dict with counts by status, due/oldest pending, and p50/p95 of Graph send
+        time and of queue-to-sent time over the last METRICS_SAMPLE_SIZE sent emails
+    """
+    now = datetime.utcnow()
+    by_status = dict(db.session.execute(
+        select(OutboundEmail.status, func.count()).group_by(OutboundEmail.status)
+    ).all())
+    due = db.session.execute(
+        select(func.count()).select_from(OutboundEmail)
+        .where(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now)
+    ).scalar()
+    oldest_pending = db.session.execute(
+        select(func.min(OutboundEmail.created_at)).where(OutboundEmail.status.in_(('pending', 'sending')))
+    ).scalar()
+
+    recent = db.session.execute(
+        select(OutboundEmail.send_ms, OutboundEmail.created_at, OutboundEmail.sent_at)
+        .where(OutboundEmail.status == 'sent')
+        .order_by(OutboundEmail.sent_at.desc())
+        .limit(METRICS_SAMPLE_SIZE)
+    ).all()
+    send_ms = [row.send_ms for row in recent if row.send_ms is not None]
+    queue_ms = [(row.sent_at - row.created_at).total_seconds() * 1000
+                for row in recent if row.sent_at and row.created_at]
+
+    def _round(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        'depth': by_status.get('pending', 0) + by_status.get('sending', 0),
+        'due': due,
+        'by_status': by_status,
+        'oldest_pending_seconds': _round((now - oldest_pending).total_seconds()) if oldest_pending else None,
+        'send_ms_p50': _round(_percentile(send_ms, 50)),
+        'send_ms_p95': _round(_percentile(send_ms, 95)),
+        'queue_to_sent_ms_p50': _round(_percentile(queue_ms, 50)),
+        'queue_to_sent_ms_p95': _round(_percentile(queue_ms, 95)),
+        'sample_size': len(recent),
+        'worker': dict(_worker.counters, running=True, concurrency=_worker.concurrency) if _worker else {'running': False},
+    }
@@ -8,6 +8,8 @@ Uses Microsoft Graph API with OAuth2 authentication.
 """
 
 import os
+import time
+import random
 import logging
 import requests
 from typing import Dict, List, Optional
@@ -15,11 +17,44 @@ from datetime import datetime, timedelta
 import re
 import tempfile
 import base64
-from msal import ConfidentialClientApplication
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, quote
+from utils import metrics
+from utils.graph_auth import get_graph_token, graph_session, invalidate_graph_token
 from utils.supplier_folders import get_supplier_folder_paths
+from utils.tracing import traced_submit
 
 logger = logging.getLogger(__name__)
 
+# Fields requested when listing messages (bodies are fetched lazily)
+MESSAGE_LIST_FIELDS = 'id,subject,from,sender,receivedDateTime,bodyPreview,hasAttachments'
+ATTACHMENT_LIST_FIELDS = 'id,name,contentType,size'
+
+# Microsoft Graph accepts at most 20 sub-requests per $batch call
+GRAPH_BATCH_LIMIT = 20
+# Number of $batch calls sent concurrently (Graph throttles per mailbox, so keep this low)
+GRAPH_BATCH_WORKERS = int(os.getenv('GRAPH_BATCH_WORKERS', '2'))
+# Sub-requests throttled (429) or unavailable (503/504) are resent after their Retry-After
+GRAPH_BATCH_RETRIES = 3
+GRAPH_BATCH_RETRY_STATUSES = (429, 503, 504)
+GRAPH_BATCH_MAX_RETRY_AFTER = 30
+
+
+def _body_text(body_content: Dict) -> str:
+    """Return message body text, with HTML tags removed for HTML bodies."""
+    if not body_content:
+        return ''
+    body = body_content.get('content', '') or ''
+    if body_content.get('contentType') == 'html':
+        body = re.sub(r'<[^>]+>', '', body)
+    return body
+
+
+def _kql_terms(text: str) -> List[str]:
+    """Split free text into KQL-safe search terms (quotes and operators stripped)."""
+    return [term for term in re.split(r'[^A-Za-z0-9]+', text or '')
+            if len(term) > 1 and term.upper() not in ('AND', 'OR', 'NOT', 'NEAR')]
+
 
 class EmailScraper:
     """
@@ -52,56 +87,19 @@ class EmailScraper:
             'cost_of_goods': '1630',  # INVENTORY
         }
         
-        # OAuth2 token cache
-        self._access_token = None
-        self._token_expires_at = None
+        # Folder listings by parent folder ID (None for root folders)
+        self._folder_list_cache = {}
     
     def _get_access_token(self) -> Optional[str]:
         """
         Get OAuth2 access token for Microsoft Graph API.
         
+        Tokens are cached process-wide (utils.graph_auth), so new instances reuse them.
+        
         Returns:
             Access token string or None if authentication fails
         """
-        # Check if we have a valid cached token
-        if self._access_token and self._token_expires_at:
-            if datetime.now() < self._token_expires_at:
-                return self._access_token
-        
-        if not self.client_id or not self.client_secret or not self.tenant_id:
-            logger.error("Azure AD credentials not configured (AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_TENANT_ID)")
-            return None
-        
-        try:
-            # Create MSAL app
-            authority = f"https://login.microsoftonline.com/{self.tenant_id}"
-            app = ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=authority
-            )
-            
-            # Request token with client credentials flow (application permissions)
-            # Scope for Microsoft Graph API
-            scopes = ["https://graph.microsoft.com/.default"]
-            
-            result = app.acquire_token_for_client(scopes=scopes)
-            
-            if "access_token" in result:
-                self._access_token = result["access_token"]
-                # Token expires in ~1 hour, refresh 5 minutes early
-                expires_in = result.get("expires_in", 3600)
-                self._token_expires_at = datetime.now() + timedelta(seconds=expires_in - 300)
-                logger.info("Successfully obtained Microsoft Graph API access token")
-                return self._access_token
-            else:
-                error = result.get("error_description", result.get("error", "Unknown error"))
-                logger.error(f"Failed to obtain access token: {error}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error obtaining access token: {e}", exc_info=True)
-            return None
+        return get_graph_token(self.client_id, self.client_secret, self.tenant_id)
     
     def _make_graph_request(self, endpoint: str, method: str = 'GET', params: Dict = None, data: Dict = None) -> Optional[Dict]:
         """
@@ -127,12 +125,15 @@ class EmailScraper:
         }
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, params=params, timeout=30)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, json=data, params=params, timeout=30)
-            else:
-                response = requests.request(method, url, headers=headers, json=data, params=params, timeout=30)
+            response = graph_session().request(method, url, headers=headers, json=data, params=params, timeout=30)
+            if response.status_code == 401:
+                # Token revoked or rotated early: drop it and retry once with a fresh one
+                invalidate_graph_token(self.client_id, self.tenant_id, token)
+                token = self._get_access_token()
+                if not token:
+                    return None
+                headers['Authorization'] = f'Bearer {token}'
+                response = graph_session().request(method, url, headers=headers, json=data, params=params, timeout=30)
             
             response.raise_for_status()
             return response.json()
@@ -157,45 +158,9 @@ class EmailScraper:
         Returns:
             Folder ID or None if not found
         """
-        # Handle special folder names (use well-known folder names)
-        folder_map = {
-            'INBOX': 'inbox',
-            'Sent Items': 'sentitems',
-            'Drafts': 'drafts',
-            'Deleted Items': 'deleteditems',
-            'Junk Email': 'junkemail'
-        }
-        
-        # Check if it's a special folder
-        if folder_name.upper() in folder_map:
-            return folder_map[folder_name.upper()]
-        
-        # For custom folders, search recursively
-        if '/' in folder_name:
-            # Handle nested folders like "Suppliers/Supplier1"
-            parts = folder_name.split('/')
-            current_id = None
-            
-            # Start from root mailFolders
-            for part in parts:
-                part = part.strip()
-                if not part:
-                    continue
-                
-                if current_id is None:
-                    # Search root folders
-                    current_id = self._find_folder_in_list(part, None)
-                else:
-                    # Search child folders
-                    current_id = self._find_folder_in_list(part, current_id)
-                
-                if current_id is None:
-                    return None
-            
-            return current_id
-        else:
-            # Single folder name - search all folders
-            return self._find_folder_in_list(folder_name, None)
+        # Well-known names map directly; custom and nested folders ("Suppliers/Supplier1")
+        # are walked one level at a time using cached folder listings
+        return self._resolve_folder_ids([folder_name]).get(folder_name)
     
     def _find_folder_in_list(self, folder_name: str, parent_id: Optional[str] = None) -> Optional[str]:
         """
@@ -208,23 +173,147 @@ class EmailScraper:
         Returns:
             Folder ID or None if not found
         """
-        if parent_id:
-            endpoint = f"/users/{self.email_address}/mailFolders/{parent_id}/childFolders"
-        else:
-            endpoint = f"/users/{self.email_address}/mailFolders"
-        
-        result = self._make_graph_request(endpoint)
-        if not result or 'value' not in result:
-            return None
+        metrics.cache_lookup('graph_folders', hit=parent_id in self._folder_list_cache)
+        if parent_id not in self._folder_list_cache:
+            result = self._make_graph_request(self._folder_list_endpoint(parent_id),
+                                              params={'$select': 'id,displayName', '$top': 100})
+            if not result or 'value' not in result:
+                return None
+            self._folder_list_cache[parent_id] = result['value']
         
+        return self._match_folder(self._folder_list_cache[parent_id], folder_name)
+    
+    def _folder_list_endpoint(self, parent_id: Optional[str] = None) -> str:
+        if parent_id:
+            return f"/users/{self.email_address}/mailFolders/{parent_id}/childFolders"
+        return f"/users/{self.email_address}/mailFolders"
+    
+    @staticmethod
+    def _match_folder(folders: List[Dict], folder_name: str) -> Optional[str]:
         folder_name_lower = folder_name.lower()
-        for folder in result['value']:
+        for folder in folders:
             display_name = folder.get('displayName', '')
             if display_name.lower() == folder_name_lower:
                 return folder.get('id')
-        
         return None
     
+    def _resolve_folder_ids(self, folder_names: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Resolve many folder paths at once.
+        
+        Paths are walked level by level; every folder listing still needed at a level
+        is fetched in one $batch call, and listings are cached on the instance.
+        
+        Returns:
+            Dict mapping each folder name to its folder ID (None if not found)
+        """
+        well_known = {'INBOX': 'inbox', 'SENT ITEMS': 'sentitems', 'DRAFTS': 'drafts',
+                      'DELETED ITEMS': 'deleteditems', 'JUNK EMAIL': 'junkemail'}
+        resolved = {}
+        # Remaining path segments and the current parent ID for each folder name
+        pending = {}
+        for name in folder_names:
+            if name.upper() in well_known:
+                resolved[name] = well_known[name.upper()]
+            else:
+                pending[name] = ([part.strip() for part in name.split('/') if part.strip()], None)
+        
+        while pending:
+            parents = {parent for _, parent in pending.values()}
+            missing_parents = [parent for parent in parents if parent not in self._folder_list_cache]
+            metrics.cache_lookup('graph_folders', hit=True, count=len(parents) - len(missing_parents))
+            metrics.cache_lookup('graph_folders', hit=False, count=len(missing_parents))
+            if missing_parents:
+                responses = self._graph_batch([
+                    self._relative_url(self._folder_list_endpoint(parent), {'$select': 'id,displayName', '$top': 100})
+                    for parent in missing_parents
+                ])
+                for parent, response in zip(missing_parents, responses):
+                    if response is None or 'value' not in response:
+                        # Not cached, so the next search lists this folder again
+                        logger.warning(f"Could not list mail folders under {parent or 'the mailbox root'}")
+                        continue
+                    self._folder_list_cache[parent] = response['value']
+            
+            next_pending = {}
+            for name, (parts, parent) in pending.items():
+                folder_id = self._match_folder(self._folder_list_cache.get(parent, []), parts[0]) if parts else None
+                if folder_id is None:
+                    resolved[name] = None
+                elif len(parts) == 1:
+                    resolved[name] = folder_id
+                else:
+                    next_pending[name] = (parts[1:], folder_id)
+            pending = next_pending
+        
+        return resolved
+    
+    def _relative_url(self, endpoint: str, params: Dict = None) -> str:
+        """Build a $batch sub-request URL (relative to the Graph version root)."""
+        if not params:
+            return endpoint
+        return f"{endpoint}?{urlencode(params, quote_via=quote, safe='$(),=')}"
+    
+    def _graph_batch(self, urls: List[str]) -> List[Optional[Dict]]:
+        """
+        Send GET requests through Microsoft Graph JSON batching.
+        
+        Requests are split into $batch calls of GRAPH_BATCH_LIMIT sub-requests,
+        which are sent concurrently. Sub-requests that come back throttled (429) or
+        unavailable (503/504) are resent, after the longest Retry-After among them,
+        up to GRAPH_BATCH_RETRIES times.
+        
+        Args:
+            urls: Request URLs relative to the Graph version root
+            
+        Returns:
+            Response bodies in the same order as urls (None for failed sub-requests)
+        """
+        if not urls:
+            return []
+        
+        chunks = [urls[i:i + GRAPH_BATCH_LIMIT] for i in range(0, len(urls), GRAPH_BATCH_LIMIT)]
+        
+        def _send(chunk: List[str]) -> List[Optional[Dict]]:
+            bodies = [None] * len(chunk)
+            pending = list(range(len(chunk)))
+            for attempt in range(GRAPH_BATCH_RETRIES + 1):
+                payload = {'requests': [{'id': str(i), 'method': 'GET', 'url': chunk[i]} for i in pending]}
+                result = self._make_graph_request('/$batch', method='POST', data=payload)
+                retry, retry_after = [], 0.0
+                for response in (result or {}).get('responses', []):
+                    index = int(response.get('id', -1))
+                    status = response.get('status', 500)
+                    if index not in pending:
+                        continue
+                    if 200 <= status < 300:
+                        bodies[index] = response.get('body')
+                    elif status in GRAPH_BATCH_RETRY_STATUSES and attempt < GRAPH_BATCH_RETRIES:
+                        retry.append(index)
+                        headers = {k.lower(): v for k, v in (response.get('headers') or {}).items()}
+                        try:
+                            retry_after = max(retry_after, float(headers.get('retry-after', 0)))
+                        except (TypeError, ValueError):
+                            pass
+                    else:
+                        logger.warning(f"Graph batch sub-request failed ({status}): {chunk[index]}")
+                if not retry:
+                    break
+                # Without a Retry-After, back off exponentially (with jitter so concurrent batches spread out)
+                delay = min(retry_after or (2 ** attempt + random.random()), GRAPH_BATCH_MAX_RETRY_AFTER)
+                logger.info(f"Graph throttled {len(retry)} batch sub-request(s), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                pending = retry
+            return bodies
+        
+        if len(chunks) == 1:
+            return _send(chunks[0])
+        
+        with ThreadPoolExecutor(max_workers=min(GRAPH_BATCH_WORKERS, len(chunks))) as executor:
+            futures = [traced_submit(executor, _send, chunk) for chunk in chunks]
+            results = [future.result() for future in futures]
+        return [body for chunk_bodies in results for body in chunk_bodies]
+    
     def search_invoices(self, supplier_name: str = None, order_number: str = None, 
                        packing_slip_number: str = None, date_from: datetime = None, 
                        date_to: datetime = None) -> List[Dict]:
@@ -245,18 +334,17 @@ class EmailScraper:
             logger.warning("Azure AD credentials not configured, skipping email search")
             return []
         
+        search_start = time.perf_counter()
+        metrics.INVOICE_SEARCHES.inc()
+        
         # Default date range: last 30 days
         if not date_from:
             date_from = datetime.now() - timedelta(days=30)
         if not date_to:
             date_to = datetime.now()
         
-        all_emails = []
-        
         # ALWAYS search inbox first (invoices may not have been moved yet)
-        logger.info(f"Searching inbox for invoices from {date_from.date()} to {date_to.date()}")
-        inbox_emails = self._search_folder('INBOX', supplier_name, order_number, packing_slip_number, date_from, date_to)
-        all_emails.extend(inbox_emails)
+        folder_names = ['INBOX']
         
         # Get supplier folder paths based on supplier name
         supplier_folder_paths = []
@@ -265,14 +353,45 @@ class EmailScraper:
             logger.info(f"Matched supplier '{supplier_name}' to {len(supplier_folder_paths)} folder(s)")
         
         # Also search manually configured supplier folders
-        all_supplier_folders = list(set(supplier_folder_paths + self.supplier_folders))
+        for folder in supplier_folder_paths + self.supplier_folders:
+            if folder and folder not in folder_names:
+                folder_names.append(folder)
+        
+        logger.info(f"Searching {len(folder_names)} folder(s) for invoices from {date_from.date()} to {date_to.date()}")
+        
+        # Resolve every folder, then list all folders' messages with batched requests
+        folder_ids = self._resolve_folder_ids(folder_names)
+        searchable = [name for name in folder_names if folder_ids.get(name)]
+        for name in folder_names:
+            if not folder_ids.get(name):
+                logger.warning(f"Could not find folder: {name}")
+        
+        params = self._message_query_params(supplier_name, packing_slip_number, date_from, date_to)
+        responses = self._graph_batch([
+            self._relative_url(f"/users/{self.email_address}/mailFolders/{folder_ids[name]}/messages", params)
+            for name in searchable
+        ])
+        
+        matched_by_folder = {}
+        undecided = []
+        for name, response in zip(searchable, responses):
+            if not response or 'value' not in response:
+                continue
+            matched, folder_undecided = self._partition_messages(response['value'], name, supplier_name,
+                                                                 order_number, packing_slip_number)
+            matched_by_folder[name] = matched
+            undecided.extend(folder_undecided)
+        
+        # Full bodies for every folder's undecided messages in one batched round
+        for email_data in self._load_full_bodies(undecided):
+            if self._matches_filters(email_data, supplier_name, order_number, packing_slip_number):
+                matched_by_folder[email_data['folder']].append(email_data)
         
-        # Search in supplier folders
-        for folder in all_supplier_folders:
-            if folder:
-                logger.info(f"Searching supplier folder: {folder}")
-                folder_emails = self._search_folder(folder, supplier_name, order_number, packing_slip_number, date_from, date_to)
-                all_emails.extend(folder_emails)
+        all_emails = []
+        for name in searchable:
+            folder_emails = matched_by_folder.get(name, [])
+            folder_emails.sort(key=lambda e: e.get('date', ''), reverse=True)
+            all_emails.extend(folder_emails)
         
         # Remove duplicates (same email ID)
         seen_ids = set()
@@ -283,6 +402,7 @@ class EmailScraper:
                 seen_ids.add(email_id)
                 unique_emails.append(email)
         
+        metrics.INVOICE_SEARCH_SECONDS.observe(time.perf_counter() - search_start)
         logger.info(f"Found {len(unique_emails)} unique potential invoice emails")
         return unique_emails
     
@@ -292,6 +412,11 @@ class EmailScraper:
         """
         Search a specific email folder for invoices.
         
+        The listing request selects only the fields we need and expands attachment
+        metadata, and the invoice/date/supplier/packing slip terms are pushed to the
+        server with $search. Full bodies are only fetched for messages whose subject,
+        sender and body preview are not enough to decide the remaining filters.
+        
         Args:
             folder_name: Folder name to search
             supplier_name: Filter by supplier name
@@ -311,109 +436,207 @@ class EmailScraper:
                 logger.warning(f"Could not find folder: {folder_name}")
                 return emails
             
-            # Build search query
-            search_query_parts = []
-            
-            # Date filter
-            if date_from:
-                date_from_str = date_from.strftime('%Y-%m-%dT%H:%M:%SZ')
-                search_query_parts.append(f"receivedDateTime ge {date_from_str}")
-            if date_to:
-                date_to_str = date_to.strftime('%Y-%m-%dT%H:%M:%SZ')
-                search_query_parts.append(f"receivedDateTime le {date_to_str}")
-            
-            # Invoice keywords - subject line will likely say "INVOICE"
-            invoice_keywords = "(subject:invoice OR subject:inv)"
-            search_query_parts.append(invoice_keywords)
-            
-            # If packing slip number provided, search for it in subject/body
-            # Patterns: SI-, INV, INV-, SALES INVOICE I..., SALES INVOICE-PSI..., or just the number
-            if packing_slip_number:
-                # Clean the packing slip number
-                psn_clean = packing_slip_number.strip().upper()
-                # Add to search - search in subject and body
-                search_query_parts.append(f"(subject:{psn_clean} OR body:{psn_clean})")
-            
-            # Build filter query
-            filter_query = ' AND '.join(search_query_parts) if search_query_parts else None
-            
-            # Get messages
             endpoint = f"/users/{self.email_address}/mailFolders/{folder_id}/messages"
-            params = {
-                '$top': 50,  # Limit to 50 most recent
-                '$orderby': 'receivedDateTime desc',
-                '$filter': filter_query
-            } if filter_query else {
-                '$top': 50,
-                '$orderby': 'receivedDateTime desc'
-            }
-            
-            result = self._make_graph_request(endpoint, params=params)
+            result = self._make_graph_request(
+                endpoint, params=self._message_query_params(supplier_name, packing_slip_number, date_from, date_to)
+            )
             if not result or 'value' not in result:
                 return emails
             
-            # Process each message
-            for message in result['value']:
-                try:
-                    email_data = self._parse_message(message, folder_name)
-                    if email_data:
-                        # Filter by supplier name if provided
-                        if supplier_name:
-                            supplier_lower = supplier_name.lower()
-                            subject_lower = email_data.get('subject', '').lower()
-                            from_lower = email_data.get('from', '').lower()
-                            body_lower = email_data.get('body', '').lower()
-                            
-                            # Check if supplier name appears in subject, from, or body
-                            if (supplier_lower not in subject_lower and 
-                                supplier_lower not in from_lower and
-                                supplier_lower not in body_lower):
-                                continue
-                        
-                        # Filter by order number if provided
-                        if order_number:
-                            order_normalized = order_number.replace('-', '').upper()
-                            subject_upper = email_data.get('subject', '').upper()
-                            body_upper = email_data.get('body', '').upper()
-                            
-                            if (order_normalized not in subject_upper.replace('-', '') and 
-                                order_normalized not in body_upper.replace('-', '')):
-                                continue
-                        
-                        # Filter by packing slip number if provided
-                        if packing_slip_number:
-                            psn_clean = packing_slip_number.strip().upper()
-                            subject_upper = email_data.get('subject', '').upper()
-                            body_upper = email_data.get('body', '').upper()
-                            
-                            # Check for various patterns: SI-XXX, INV-XXX, INVXXX, SALES INVOICE IXXX, etc.
-                            found = False
-                            if psn_clean in subject_upper or psn_clean in body_upper:
-                                found = True
-                            # Also check for patterns like "SI-" + number, "INV-" + number, etc.
-                            if not found:
-                                # Remove common prefixes and check if number matches
-                                psn_numeric = re.sub(r'^[A-Z\-]+', '', psn_clean)
-                                if psn_numeric and (psn_numeric in subject_upper or psn_numeric in body_upper):
-                                    found = True
-                            
-                            if not found:
-                                continue
-                        
-                        emails.append(email_data)
-                except Exception as e:
-                    logger.warning(f"Error processing email: {e}")
-                    continue
+            emails = self._filter_messages(result['value'], folder_name, supplier_name,
+                                           order_number, packing_slip_number)
             
         except Exception as e:
             logger.error(f"Error searching folder {folder_name}: {e}", exc_info=True)
         
         return emails
     
+    def _message_query_params(self, supplier_name: str = None, packing_slip_number: str = None,
+                              date_from: datetime = None, date_to: datetime = None) -> Dict:
+        """
+        Query parameters for listing a folder's candidate invoice messages.
+        
+        $search cannot be combined with $filter/$orderby, so the date range is part
+        of the search query and results are sorted in _filter_messages.
+        """
+        return {
+            '$top': 50,  # Limit to 50 most relevant
+            '$select': MESSAGE_LIST_FIELDS,
+            '$expand': f"attachments($select={ATTACHMENT_LIST_FIELDS})",
+            '$search': f'"{self._build_search_query(supplier_name, packing_slip_number, date_from, date_to)}"'
+        }
+    
+    def _filter_messages(self, messages: List[Dict], folder_name: str, supplier_name: str = None,
+                         order_number: str = None, packing_slip_number: str = None) -> List[Dict]:
+        """
+        Parse listed messages and apply the supplier/order/packing slip filters.
+        
+        Messages are checked on subject, sender and body preview first; full bodies
+        are fetched (batched) only for those the preview cannot decide.
+        """
+        matched, undecided = self._partition_messages(messages, folder_name, supplier_name,
+                                                      order_number, packing_slip_number)
+        for email_data in self._load_full_bodies(undecided):
+            if self._matches_filters(email_data, supplier_name, order_number, packing_slip_number):
+                matched.append(email_data)
+        
+        # Keep newest first, as listed
+        matched.sort(key=lambda e: e.get('date', ''), reverse=True)
+        return matched
+    
+    def _partition_messages(self, messages: List[Dict], folder_name: str, supplier_name: str = None,
+                            order_number: str = None, packing_slip_number: str = None):
+        """
+        Split listed messages using only subject, sender and body preview.
+        
+        Returns:
+            Tuple of (matched emails, emails that need their full body to decide)
+        """
+        matched = []
+        undecided = []
+        for message in sorted(messages, key=lambda m: m.get('receivedDateTime', ''), reverse=True):
+            try:
+                email_data = self._parse_message(message, folder_name)
+                if not email_data:
+                    continue
+                if self._matches_filters(email_data, supplier_name, order_number, packing_slip_number):
+                    matched.append(email_data)
+                elif email_data.get('body_is_preview'):
+                    # Only the full body can rule the message out
+                    undecided.append(email_data)
+            except Exception as e:
+                logger.warning(f"Error processing email: {e}")
+                continue
+        
+        logger.info(f"Folder {folder_name}: {len(messages)} candidate(s), {len(matched)} matched on preview, "
+                    f"{len(undecided)} need full body")
+        return matched, undecided
+    
+    def _build_search_query(self, supplier_name: str = None, packing_slip_number: str = None,
+                            date_from: datetime = None, date_to: datetime = None) -> str:
+        """
+        Build the KQL query used for $search on a folder's messages.
+        
+        Invoice keywords - subject line will likely say "INVOICE". Supplier name and
+        packing slip terms are included so the server does the body matching.
+        """
+        search_query_parts = ["(subject:invoice OR subject:inv)"]
+        
+        # Date filter
+        if date_from:
+            search_query_parts.append(f"received>={date_from.strftime('%Y-%m-%d')}")
+        if date_to:
+            search_query_parts.append(f"received<={date_to.strftime('%Y-%m-%d')}")
+        
+        if supplier_name:
+            supplier_terms = _kql_terms(supplier_name)
+            if supplier_terms:
+                search_query_parts.append(f"({' AND '.join(supplier_terms)})")
+        
+        # If packing slip number provided, search for it in subject/body
+        # Patterns: SI-, INV, INV-, SALES INVOICE I..., SALES INVOICE-PSI..., or just the number
+        if packing_slip_number:
+            psn_clean = packing_slip_number.strip().upper()
+            psn_numeric = re.sub(r'^[A-Z\-]+', '', psn_clean)
+            psn_terms = [t for t in {psn_clean, psn_numeric} if t and re.fullmatch(r'[A-Z0-9\-]+', t)]
+            if psn_terms:
+                search_query_parts.append(f"({' OR '.join(sorted(psn_terms))})")
+        
+        return ' AND '.join(search_query_parts)
+    
+    def _matches_filters(self, email_data: Dict, supplier_name: str = None,
+                         order_number: str = None, packing_slip_number: str = None) -> bool:
+        """Apply the supplier, order number and packing slip filters to the message text we have."""
+        subject = email_data.get('subject', '')
+        body = email_data.get('body', '')
+        
+        # Filter by supplier name if provided
+        if supplier_name:
+            supplier_lower = supplier_name.lower()
+            # Check if supplier name appears in subject, from, or body
+            if (supplier_lower not in subject.lower() and
+                supplier_lower not in email_data.get('from', '').lower() and
+                supplier_lower not in body.lower()):
+                return False
+        
+        # Filter by order number if provided
+        if order_number:
+            order_normalized = order_number.replace('-', '').upper()
+            if (order_normalized not in subject.upper().replace('-', '') and
+                order_normalized not in body.upper().replace('-', '')):
+                return False
+        
+        # Filter by packing slip number if provided
+        if packing_slip_number:
+            psn_clean = packing_slip_number.strip().upper()
+            subject_upper = subject.upper()
+            body_upper = body.upper()
+            
+            # Check for various patterns: SI-XXX, INV-XXX, INVXXX, SALES INVOICE IXXX, etc.
+            found = psn_clean in subject_upper or psn_clean in body_upper
+            # Also check for patterns like "SI-" + number, "INV-" + number, etc.
+            if not found:
+                # Remove common prefixes and check if number matches
+                psn_numeric = re.sub(r'^[A-Z\-]+', '', psn_clean)
+                found = bool(psn_numeric) and (psn_numeric in subject_upper or psn_numeric in body_upper)
+            if not found:
+                return False
+        
+        return True
+    
+    def _load_full_bodies(self, emails: List[Dict]) -> List[Dict]:
+        """
+        Load full bodies for several parsed messages using batched requests.
+        
+        Returns:
+            The emails whose full body was loaded
+        """
+        if len(emails) <= 1:
+            return [email_data for email_data in emails if self._load_full_body(email_data)]
+        
+        responses = self._graph_batch([
+            self._relative_url(f"/users/{self.email_address}/messages/{email_data['id']}", {'$select': 'body'})
+            for email_data in emails
+        ])
+        loaded = []
+        for email_data, message in zip(emails, responses):
+            if not message:
+                continue
+            self._apply_full_body(email_data, message)
+            loaded.append(email_data)
+        return loaded
+    
+    def _apply_full_body(self, email_data: Dict, message: Dict) -> None:
+        email_data['body'] = _body_text(message.get('body', {}))
+        email_data['body_is_preview'] = False
+        email_data['is_invoice'] = self._is_likely_invoice(email_data['subject'], email_data['body'],
+                                                           email_data['attachments'])
+    
+    def _load_full_body(self, email_data: Dict) -> bool:
+        """
+        Replace the body preview of a parsed message with its full body.
+        
+        Returns:
+            True if the full body was loaded
+        """
+        message = self._make_graph_request(
+            f"/users/{self.email_address}/messages/{email_data['id']}",
+            params={'$select': 'body'}
+        )
+        if not message:
+            return False
+        
+        self._apply_full_body(email_data, message)
+        return True
+    
     def _parse_message(self, message: Dict, folder_name: str) -> Optional[Dict]:
         """
         Parse a Microsoft Graph message object into our email format.
         
+        Messages listed by _search_folder already carry the selected fields and
+        expanded attachment metadata, so no extra request is made for them; the
+        body is the server's bodyPreview until _load_full_body is called.
+        
         Args:
             message: Graph API message object
             folder_name: Folder name
@@ -422,30 +645,31 @@ class EmailScraper:
             Dictionary with email data or None
         """
         try:
-            # Get message body
             message_id = message.get('id')
             if not message_id:
                 return None
             
-            # Get full message with body
-            full_message = self._make_graph_request(f"/users/{self.email_address}/messages/{message_id}")
-            if not full_message:
-                return None
+            body_is_preview = 'body' not in message
+            if body_is_preview and 'receivedDateTime' not in message:
+                # Bare message reference - fetch the fields we need
+                message = self._make_graph_request(
+                    f"/users/{self.email_address}/messages/{message_id}",
+                    params={'$select': f"{MESSAGE_LIST_FIELDS},body",
+                            '$expand': f"attachments($select={ATTACHMENT_LIST_FIELDS})"}
+                )
+                if not message:
+                    return None
+                body_is_preview = False
             
             # Extract body text
-            body = ''
-            body_content = full_message.get('body', {})
-            if body_content:
-                body = body_content.get('content', '')
-                # Remove HTML tags if HTML
-                if body_content.get('contentType') == 'html':
-                    import re
-                    body = re.sub(r'<[^>]+>', '', body)
+            if body_is_preview:
+                body = message.get('bodyPreview', '') or ''
+            else:
+                body = _body_text(message.get('body', {}))
             
             # Get attachments
             attachments = []
-            attachments_data = full_message.get('attachments', [])
-            for att in attachments_data:
+            for att in message.get('attachments', []) or []:
                 attachments.append({
                     'id': att.get('id'),
                     'filename': att.get('name', ''),
@@ -455,7 +679,7 @@ class EmailScraper:
             
             # Extract sender
             from_addr = ''
-            sender = full_message.get('sender', {})
+            sender = message.get('sender') or message.get('from') or {}
             if sender:
                 email_address = sender.get('emailAddress', {})
                 if email_address:
@@ -464,12 +688,13 @@ class EmailScraper:
             return {
                 'id': message_id,
                 'folder': folder_name,
-                'subject': full_message.get('subject', ''),
+                'subject': message.get('subject', '') or '',
                 'from': from_addr,
-                'date': full_message.get('receivedDateTime', ''),
+                'date': message.get('receivedDateTime', ''),
                 'body': body,
+                'body_is_preview': body_is_preview,
                 'attachments': attachments,
-                'is_invoice': self._is_likely_invoice(full_message.get('subject', ''), body, attachments)
+                'is_invoice': self._is_likely_invoice(message.get('subject', '') or '', body, attachments)
             }
             
         except Exception as e:
@@ -516,20 +741,20 @@ class EmailScraper:
             if not message_id:
                 return None
             
-            # Get attachments
-            attachments_endpoint = f"/users/{self.email_address}/messages/{message_id}/attachments"
-            result = self._make_graph_request(attachments_endpoint)
-            if not result or 'value' not in result:
-                return None
+            # Attachment metadata is normally already on the email (expanded when listing)
+            attachments = email_data.get('attachments') or []
+            if not attachments or not all(att.get('id') for att in attachments):
+                attachments_endpoint = f"/users/{self.email_address}/messages/{message_id}/attachments"
+                result = self._make_graph_request(attachments_endpoint, params={'$select': ATTACHMENT_LIST_FIELDS})
+                if not result or 'value' not in result:
+                    return None
+                attachments = result['value']
             
-            attachments = result['value']
             if attachment_index >= len(attachments):
                 return None
             
-            attachment = attachments[attachment_index]
-            
             # Get attachment content
-            attachment_id = attachment.get('id')
+            attachment_id = attachments[attachment_index].get('id')
             if not attachment_id:
                 return None
             
@@ -542,7 +767,9 @@ class EmailScraper:
             if not content_bytes:
                 return None
             
-            return base64.b64decode(content_bytes)
+            attachment_bytes = base64.b64decode(content_bytes)
+            metrics.ATTACHMENT_BYTES.labels('email').inc(len(attachment_bytes))
+            return attachment_bytes
             
         except Exception as e:
             logger.error(f"Error downloading attachment: {e}", exc_info=True)
@@ -8,8 +8,8 @@ import os
 import logging
 import requests
 from typing import Dict, Optional
-from msal import ConfidentialClientApplication
-from datetime import datetime, timedelta
+from utils import metrics
+from utils.graph_auth import get_graph_token, graph_session
 
 logger = logging.getLogger(__name__)
 
@@ -28,57 +28,17 @@ class EmailSender:
         
         # Microsoft Graph API endpoint
         self.graph_endpoint = 'https://graph.microsoft.com/v1.0'
-        
-        # OAuth2 token cache
-        self._access_token = None
-        self._token_expires_at = None
     
     def _get_access_token(self) -> Optional[str]:
         """
         Get OAuth2 access token for Microsoft Graph API.
         
+        Tokens are cached process-wide (utils.graph_auth), so new instances reuse them.
+        
         Returns:
             Access token string or None if authentication fails
         """
-        # Check if we have a valid cached token
-        if self._access_token and self._token_expires_at:
-            if datetime.now() < self._token_expires_at:
-                return self._access_token
-        
-        if not self.client_id or not self.client_secret or not self.tenant_id:
-            logger.error("Azure AD credentials not configured (AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_TENANT_ID)")
-            return None
-        
-        try:
-            # Create MSAL app
-            authority = f"https://login.microsoftonline.com/{self.tenant_id}"
-            app = ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=authority
-            )
-            
-            # Request token with client credentials flow (application permissions)
-            # Scope for Microsoft Graph API
-            scopes = ["https://graph.microsoft.com/.default"]
-            
-            result = app.acquire_token_for_client(scopes=scopes)
-            
-            if "access_token" in result:
-                self._access_token = result["access_token"]
-                # Token expires in ~1 hour, refresh 5 minutes early
-                expires_in = result.get("expires_in", 3600)
-                self._token_expires_at = datetime.now() + timedelta(seconds=expires_in - 300)
-                logger.info("Successfully obtained Microsoft Graph API access token")
-                return self._access_token
-            else:
-                error = result.get("error_description", result.get("error", "Unknown error"))
-                logger.error(f"Failed to obtain access token: {error}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error obtaining access token: {e}", exc_info=True)
-            return None
+        return get_graph_token(self.client_id, self.client_secret, self.tenant_id)
     
     def send_email(self, from_address: str, to_address: str, subject: str, 
                    body: str, body_type: str = "HTML") -> bool:
@@ -98,6 +58,7 @@ class EmailSender:
         token = self._get_access_token()
         if not token:
             logger.error("Cannot send email: No access token available")
+            metrics.EMAILS_SENT.labels('failed').inc()
             return False
         
         url = f"{self.graph_endpoint}/users/{from_address}/sendMail"
@@ -125,12 +86,14 @@ class EmailSender:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=message, timeout=30)
+            response = graph_session().post(url, headers=headers, json=message, timeout=30)
             response.raise_for_status()
+            metrics.EMAILS_SENT.labels('sent').inc()
             logger.info(f"Email sent successfully from {from_address} to {to_address}")
             return True
             
         except requests.exceptions.RequestException as e:
+            metrics.EMAILS_SENT.labels('failed').inc()
             logger.error(f"Failed to send email: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -161,6 +124,7 @@ class EmailSender:
         token = self._get_access_token()
         if not token:
             logger.error("Cannot send email: No access token available")
+            metrics.EMAILS_SENT.labels('failed').inc()
             return False
         
         import base64
@@ -219,12 +183,14 @@ class EmailSender:
             ]
         
         try:
-            response = requests.post(url, headers=headers, json=message, timeout=60)
+            response = graph_session().post(url, headers=headers, json=message, timeout=60)
             response.raise_for_status()
+            metrics.EMAILS_SENT.labels('sent').inc()
             logger.info(f"Email with attachment sent successfully from {from_address} to {to_address}")
             return True
             
         except requests.exceptions.RequestException as e:
+            metrics.EMAILS_SENT.labels('failed').inc()
             logger.error(f"Failed to send email with attachment: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -239,7 +205,10 @@ def send_no_invoice_notification(order_number: str, supplier_name: str,
                                  packing_slip_number: str = None, 
                                  order_date: str = None) -> bool:
     """
-    Send notification email to accounts when no supplier invoice is found.
+    Queue a notification email to accounts when no supplier invoice is found.
+    
+    The email goes through the outbox (utils.email_outbox), so this needs an app
+    context. The same order and packing slip is only notified once.
     
     Args:
         order_number: Order number
@@ -248,7 +217,7 @@ def send_no_invoice_notification(order_number: str, supplier_name: str,
         order_date: Order date (optional)
         
     Returns:
-        True if email sent successfully, False otherwise
+        True if the email was queued, False otherwise
     """
     from_address = os.environ.get('REPORTS_EMAIL_ADDRESS', 'reports@atozflooringsolutions.com.au')
     to_address = os.environ.get('ACCOUNTS_EMAIL_ADDRESS', 'accounts@atozflooringsolutions.com.au')
@@ -285,6 +254,12 @@ def send_no_invoice_notification(order_number: str, supplier_name: str,
     </html>
     """
     
-    sender = EmailSender()
-    return sender.send_email(from_address, to_address, subject, body)
+    from utils.email_outbox import enqueue_email
+    try:
+        enqueue_email(from_address, to_address, subject, body,
+                      dedupe_key=f"no-invoice:{order_number}:{packing_slip_number or ''}", commit=True)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to queue no-invoice notification for {order_number}: {e}", exc_info=True)
+        return False
 
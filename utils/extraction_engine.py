@@ -0,0 +1,258 @@
+"""
+Tiered extraction engine for uploaded purchase orders.
+
+Known builder templates (Ambrose, Profile, Campbell, Rizon, ...) are matched
+against the PDF text layer using TemplateDetector. When every required field
+is found the template result is returned immediately, otherwise the document
+falls back to the Gemini-backed DocumentAnalyzer (unknown layouts, scans,
+images).
+"""
+
+import logging
+import pathlib
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import pdfplumber
+
+from utils.ai_analyzer import AIProcessingResult
+from utils.template_detector import TemplateDetector, BuilderType
+
+logger = logging.getLogger(__name__)
+
+# Fields that must all be present before a template result is trusted
+REQUIRED_FIELDS = ('po_number', 'customer_name', 'address', 'description', 'amount')
+
+# Minimum number of characters in the text layer before we treat a PDF as
+# digitally generated (scanned PDFs usually have an empty or tiny text layer)
+MIN_TEXT_LAYER_CHARS = 200
+
+
+class ExtractionEngine:
+    """
+    Run the template fast path first and fall back to DocumentAnalyzer.
+
+    Results are always returned as AIProcessingResult so callers can treat
+    both tiers the same way. Fast-path hits are counted so the hit rate can
+    be reported.
+    """
+
+    def __init__(self, document_analyzer=None, template_detector: TemplateDetector = None,
+                 min_confidence: float = 1.0):
+        """
+        Args:
+            document_analyzer: DocumentAnalyzer used for the fallback tier (may be None)
+            template_detector: TemplateDetector instance (created if not supplied)
+            min_confidence: Fraction of REQUIRED_FIELDS that must be found for a fast-path hit
+        """
+        self.document_analyzer = document_analyzer
+        self.template_detector = template_detector or TemplateDetector()
+        self.min_confidence = min_confidence
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'fast_path_hits': 0,
+            'fallbacks': 0,
+            'fast_path_seconds': 0.0,
+            'fallback_seconds': 0.0,
+        }
+
+    def extract_text_layer(self, pdf_path: str) -> str:
+        """
+        Extract the PDF text layer once, using pdfplumber with a PyMuPDF fallback.
+
+        Returns:
+            The concatenated page text, or an empty string if there is no usable text layer
+        """
+        text = ''
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                text = '\n'.join((page.extract_text() or '') for page in pdf.pages)
+        except Exception as e:
+            logger.debug(f"pdfplumber could not read {pdf_path}: {e}")
+
+        if not text.strip():
+            try:
+                import fitz  # PyMuPDF
+                with fitz.open(pdf_path) as doc:
+                    text = '\n'.join(page.get_text() for page in doc)
+            except Exception as e:
+                logger.debug(f"PyMuPDF could not read {pdf_path}: {e}")
+                text = ''
+
+        return text
+
+    def _extract_po_number(self, text: str, pattern: str) -> Optional[str]:
+        """Extract the PO number - some template PO patterns have no capture group."""
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        if not match:
+            return None
+        value = match.group(1) if match.groups() else match.group(0)
+        return value.strip() if value else None
+
+    def _extract_block(self, text: str, pattern: str) -> Optional[str]:
+        """Extract a multi-line block (descriptions run until the next blank line)."""
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE | re.DOTALL)
+        if not match:
+            return None
+        value = match.group(1).strip()
+        return value or None
+
+    def _split_address(self, address_text: str) -> Dict[str, str]:
+        """Split a single-line template address into the RFMS job_address layout."""
+        job_address = {'address1': '', 'address2': '', 'city': '', 'state': '', 'postalCode': ''}
+        if not address_text:
+            return job_address
+
+        address_text = address_text.strip()
+        match = re.search(r'^(.*?)[,\s]+([A-Za-z][A-Za-z\s]*?)[,\s]+(QLD|NSW|VIC|SA|WA|TAS|NT|ACT)[,\s]+(\d{4})\s*$',
+                          address_text, re.IGNORECASE)
+        if match:
+            job_address['address1'] = match.group(1).strip(' ,')
+            job_address['city'] = match.group(2).strip(' ,')
+            job_address['state'] = match.group(3).upper()
+            job_address['postalCode'] = match.group(4)
+        else:
+            job_address['address1'] = address_text
+        return job_address
+
+    def try_template(self, text: str) -> Optional[AIProcessingResult]:
+        """
+        Attempt a template-only extraction from already extracted text.
+
+        Returns:
+            AIProcessingResult when the builder is known and enough required fields
+            were found, otherwise None
+        """
+        if not text or len(text.strip()) < MIN_TEXT_LAYER_CHARS:
+            return None
+
+        builder_type, patterns = self.template_detector.detect_template(text)
+        if builder_type == BuilderType.UNKNOWN or not patterns:
+            return None
+
+        detector = self.template_detector
+        try:
+            fields = {
+                'po_number': self._extract_po_number(text, patterns.po_pattern),
+                'customer_name': detector.extract_field(text, patterns.customer_name_pattern),
+                'address': detector.extract_field(text, patterns.address_pattern),
+                'description': self._extract_block(text, patterns.description_pattern),
+                'amount': detector.extract_dollar_value(text, patterns.dollar_value_pattern),
+            }
+            supervisor = detector.extract_field(text, patterns.supervisor_pattern)
+            start_date = (detector.extract_field(text, patterns.commencement_date_pattern)
+                          if patterns.commencement_date_pattern else None)
+            end_date = (detector.extract_field(text, patterns.completion_date_pattern)
+                        if patterns.completion_date_pattern else None)
+        except Exception as e:
+            logger.warning(f"Template extraction failed for {builder_type.value}: {e}")
+            return None
+
+        found = [name for name in REQUIRED_FIELDS if fields.get(name)]
+        confidence = len(found) / len(REQUIRED_FIELDS)
+        if confidence < self.min_confidence:
+            missing = [name for name in REQUIRED_FIELDS if name not in found]
+            logger.info(f"Template {builder_type.value} matched but confidence {confidence:.0%} "
+                        f"below threshold (missing: {', '.join(missing)})")
+            return None
+
+        name_parts = fields['customer_name'].split()
+        main_contacts = [{
+            'first_name': name_parts[0] if name_parts else '',
+            'last_name': ' '.join(name_parts[1:]),
+            'emails': None,
+            'phone': None,
+            'mobile': None,
+            'title': 'Owner',
+        }]
+        if supervisor:
+            supervisor_parts = supervisor.split()
+            main_contacts.append({
+                'first_name': supervisor_parts[0] if supervisor_parts else '',
+                'last_name': ' '.join(supervisor_parts[1:]),
+                'emails': None,
+                'phone': None,
+                'mobile': None,
+                'title': 'Supervisor',
+            })
+
+        description = fields['description'].replace('\n', '<br>')
+        return AIProcessingResult(
+            po_number=fields['po_number'],
+            job_description=description,
+            main_contacts=main_contacts,
+            job_address=self._split_address(fields['address']),
+            model_used=f"template:{builder_type.value}",
+            amount=f"{fields['amount']:.2f}",
+            start_date=start_date,
+            end_date=end_date,
+            job_summary=None,
+            email_contact={},
+            is_provisional='pc allowance' in text.lower(),
+            notes=None,
+            raw_response={'builder_type': builder_type.value, 'confidence': confidence},
+        )
+
+    def analyze_document(self, pdf_path: str, email_body: str = None,
+                         document_type: str = "purchase_order") -> AIProcessingResult:
+        """
+        Analyze a document, using the template fast path when possible.
+
+        Only purchase order PDFs are eligible for the fast path; everything else
+        goes straight to DocumentAnalyzer.analyze_document.
+        """
+        start_time = time.time()
+        is_pdf = bool(pdf_path) and pathlib.Path(pdf_path).suffix.lower() == '.pdf'
+
+        if is_pdf and document_type == "purchase_order":
+            text = self.extract_text_layer(pdf_path)
+            result = self.try_template(text)
+            if result:
+                elapsed = time.time() - start_time
+                self._record('fast_path_hits', 'fast_path_seconds', elapsed)
+                logger.info(f"Template fast path hit ({result.model_used}) in {elapsed:.2f} seconds - "
+                            f"hit rate {self.hit_rate:.0%}")
+                return result
+
+        if self.document_analyzer is None:
+            raise ValueError("AI analyzer not available. Please check GEMINI_API_KEY configuration.")
+
+        result = self.document_analyzer.analyze_document(
+            pdf_path=pdf_path,
+            email_body=email_body,
+            document_type=document_type
+        )
+        elapsed = time.time() - start_time
+        self._record('fallbacks', 'fallback_seconds', elapsed)
+        logger.info(f"AI fallback completed in {elapsed:.2f} seconds - fast path hit rate {self.hit_rate:.0%}")
+        return result
+
+    def _record(self, counter: str, timer: str, elapsed: float) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+            self._stats[timer] += elapsed
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of analyzed documents served by the template fast path."""
+        with self._stats_lock:
+            total = self._stats['fast_path_hits'] + self._stats['fallbacks']
+            return self._stats['fast_path_hits'] / total if total else 0.0
+
+    def get_stats(self) -> Dict:
+        """Return counters, average latency per tier and the fast path hit rate."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        hits, fallbacks = stats['fast_path_hits'], stats['fallbacks']
+        total = hits + fallbacks
+        return {
+            'documents': total,
+            'fast_path_hits': hits,
+            'fallbacks': fallbacks,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'avg_fast_path_seconds': round(stats['fast_path_seconds'] / hits, 3) if hits else None,
+            'avg_fallback_seconds': round(stats['fallback_seconds'] / fallbacks, 3) if fallbacks else None,
+        }
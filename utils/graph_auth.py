@@ -0,0 +1,216 @@
+"""
+Shared Microsoft Graph Authentication
+
+One client-credentials token per Azure AD app (tenant + client id), shared by
+every EmailScraper, EmailSender and outbox worker in the process. Refresh is
+single-flight: when the token is about to expire, one thread acquires a new
+one and the others wait for it instead of each calling
+login.microsoftonline.com.
+
+Set GRAPH_TOKEN_CACHE_FILE to also share the token between processes (e.g. the
+web app and scripts). The file is created with owner-only permissions, and
+refreshes are serialized across processes with a lock file on platforms that
+support fcntl.
+
+graph_session() returns a process-wide requests.Session so Graph calls reuse
+pooled HTTPS connections (and are timed for request tracing).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from msal import ConfidentialClientApplication
+
+from utils import metrics
+from utils.tracing import traced_session
+
+try:
+    import fcntl
+except ImportError:  # Windows: the file cache still works, without the cross-process lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+GRAPH_TOKEN_CACHE_FILE = os.getenv('GRAPH_TOKEN_CACHE_FILE')
+
+# Refresh this long before the token expires (tokens last ~1 hour)
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+GRAPH_POOL_SIZE = int(os.getenv('GRAPH_POOL_SIZE', '16'))
+
+_tokens: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_apps: Dict[Tuple[str, str], ConfidentialClientApplication] = {}
+_refresh_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def graph_session() -> requests.Session:
+    """Shared HTTP session for Graph API calls (connection pooling across requests and threads)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = traced_session('graph')
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GRAPH_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _cache_key(tenant_id: str, client_id: str) -> str:
+    return f"{tenant_id}:{client_id}"
+
+
+def _read_file_token(key: Tuple[str, str]) -> Optional[Tuple[str, float]]:
+    try:
+        with open(GRAPH_TOKEN_CACHE_FILE, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(_cache_key(*key))
+    except (OSError, ValueError):
+        return None
+    if not entry or not entry.get('access_token'):
+        return None
+    return entry['access_token'], float(entry.get('expires_at', 0))
+
+
+def _write_file_token(key: Tuple[str, str], token: str, expires_at: float) -> None:
+    try:
+        try:
+            with open(GRAPH_TOKEN_CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[_cache_key(*key)] = {'access_token': token, 'expires_at': expires_at}
+
+        tmp_path = f"{GRAPH_TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, GRAPH_TOKEN_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Could not write Graph token cache {GRAPH_TOKEN_CACHE_FILE}: {e}")
+
+
+class _FileLock:
+    """Exclusive lock across processes (no-op without a cache file or fcntl)."""
+
+    def __enter__(self):
+        self._fd = None
+        if GRAPH_TOKEN_CACHE_FILE and fcntl is not None:
+            try:
+                self._fd = os.open(f"{GRAPH_TOKEN_CACHE_FILE}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning(f"Could not lock Graph token cache: {e}")
+                self._fd = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+
+
+def _usable(entry: Optional[Tuple[str, float]]) -> bool:
+    return bool(entry) and time.time() < entry[1] - TOKEN_REFRESH_MARGIN_SECONDS
+
+
+def get_graph_token(client_id: str, client_secret: str, tenant_id: str) -> Optional[str]:
+    """
+    Get a Microsoft Graph access token (client credentials flow), shared process-wide.
+
+    Args:
+        client_id: Azure AD application (client) id
+        client_secret: Azure AD client secret
+        tenant_id: Azure AD tenant id
+
+    Returns:
+        Access token string or None if authentication fails
+    """
+    if not client_id or not client_secret or not tenant_id:
+        logger.error("Azure AD credentials not configured (AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_TENANT_ID)")
+        return None
+
+    key = (tenant_id, client_id)
+    entry = _tokens.get(key)
+    if _usable(entry):
+        metrics.cache_lookup('graph_token', hit=True)
+        return entry[0]
+
+    with _registry_lock:
+        refresh_lock = _refresh_locks.setdefault(key, threading.Lock())
+
+    # Single flight: the first caller refreshes, the rest pick up its token
+    with refresh_lock:
+        entry = _tokens.get(key)
+        if _usable(entry):
+            metrics.cache_lookup('graph_token', hit=True)
+            return entry[0]
+
+        with _FileLock():
+            if GRAPH_TOKEN_CACHE_FILE:
+                entry = _read_file_token(key)
+                if _usable(entry):
+                    _tokens[key] = entry
+                    metrics.cache_lookup('graph_token', hit=True)
+                    return entry[0]
+
+            metrics.cache_lookup('graph_token', hit=False)
+
+            try:
+                app = _apps.get(key)
+                if app is None:
+                    app = ConfidentialClientApplication(
+                        client_id=client_id,
+                        client_credential=client_secret,
+                        authority=f"https://login.microsoftonline.com/{tenant_id}"
+                    )
+                    _apps[key] = app
+
+                result = app.acquire_token_for_client(scopes=GRAPH_SCOPES)
+            except Exception as e:
+                logger.error(f"Error obtaining access token: {e}", exc_info=True)
+                return None
+
+            if "access_token" not in result:
+                error = result.get("error_description", result.get("error", "Unknown error"))
+                logger.error(f"Failed to obtain access token: {error}")
+                return None
+
+            expires_at = time.time() + int(result.get("expires_in", 3600))
+            _tokens[key] = (result["access_token"], expires_at)
+            if GRAPH_TOKEN_CACHE_FILE:
+                _write_file_token(key, result["access_token"], expires_at)
+            logger.info("Successfully obtained Microsoft Graph API access token")
+            return result["access_token"]
+
+
+def invalidate_graph_token(client_id: str, tenant_id: str, token: str = None) -> None:
+    """
+    Drop a cached token that Graph rejected (401), so the next call refreshes.
+
+    Args:
+        client_id: Azure AD application (client) id
+        tenant_id: Azure AD tenant id
+        token: The rejected token; a newer token already cached by another thread is kept
+    """
+    key = (tenant_id, client_id)
+    entry = _tokens.get(key)
+    if entry and (token is None or entry[0] == token):
+        _tokens.pop(key, None)
+        # MSAL keeps its own copy; a fresh app forces a new acquisition
+        _apps.pop(key, None)
+        if GRAPH_TOKEN_CACHE_FILE:
+            with _FileLock():
+                cached = _read_file_token(key)
+                if cached and cached[0] == entry[0]:
+                    _write_file_token(key, '', 0)
@@ -0,0 +1,239 @@
+"""
+Installer Invoice PDF Rendering
+
+Renders installer invoices to PDF with reportlab. Paragraph and table styles
+are built once per process and reused for every invoice. Large batches are
+rendered one invoice per task in a pool of worker processes, and the per-invoice
+PDFs are merged with PyMuPDF.
+
+Workers receive plain dictionaries (see invoice_to_dict), never ORM objects,
+so rendering needs no database or app context.
+"""
+
+import io
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, List, Tuple
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for bulk rendering; batches smaller than PDF_PARALLEL_MIN render inline
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN = int(os.getenv('PDF_PARALLEL_MIN', '4'))
+
+BRAND_COLOR = '#01998e'
+
+_pool = None
+_pool_lock = Lock()
+
+
+def invoice_to_dict(invoice, installer) -> Dict[str, Any]:
+    """
+    Snapshot an invoice and its installer into the plain data the renderer needs.
+
+    Args:
+        invoice: InstallerInvoice (lines and work_order should already be loaded)
+        installer: Installer the invoice is issued from
+    """
+    work_order = invoice.work_order
+    return {
+        'invoice_number': invoice.invoice_number,
+        'invoice_date': invoice.submitted_at.strftime('%d %B %Y') if invoice.submitted_at else 'Draft',
+        'order_number': work_order.order_number if work_order else 'N/A',
+        'job_number': work_order.job_number if work_order else None,
+        'installer_name': installer.name,
+        'installer_email': installer.email or '',
+        'installer_phone': installer.phone or '',
+        'crew_code': installer.crew_code,
+        'lines': [
+            {'description': line.description, 'quantity': line.quantity or 0, 'unit_price': line.unit_price or 0}
+            for line in invoice.lines
+        ],
+        'subtotal': invoice.subtotal or 0,
+        'tax_amount': invoice.tax_amount or 0,
+        'total': invoice.total or 0,
+        'notes': invoice.notes,
+    }
+
+
+@lru_cache(maxsize=1)
+def _styles() -> Dict[str, Any]:
+    """Paragraph and table styles, built once per process."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    sample = getSampleStyleSheet()
+    brand = colors.HexColor(BRAND_COLOR)
+    return {
+        'title': ParagraphStyle('CustomTitle', parent=sample['Heading1'], fontSize=18, textColor=brand, spaceAfter=30),
+        'heading': sample['Heading3'],
+        'normal': sample['Normal'],
+        'installer': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        'invoice': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ]),
+        'lines': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), brand),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ]),
+        'totals': TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('TEXTCOLOR', (-1, -1), (-1, -1), brand),
+        ]),
+    }
+
+
+def render_invoice_pdf(data: Dict[str, Any]) -> bytes:
+    """
+    Render one invoice (from invoice_to_dict) to PDF bytes.
+
+    Top-level so it can run in a worker process.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+    styles = _styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = [
+        Paragraph(f"TAX INVOICE - {data['invoice_number']}", styles['title']),
+        Spacer(1, 0.2*inch),
+    ]
+
+    # Installer details
+    installer_info = [
+        ['From:', data['installer_name']],
+        ['Email:', data['installer_email']],
+        ['Phone:', data['installer_phone']],
+    ]
+    if data.get('crew_code'):
+        installer_info.append(['Crew:', data['crew_code']])
+    elements.append(Table(installer_info, colWidths=[1.5*inch, 4*inch], style=styles['installer']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Invoice details
+    invoice_info = [
+        ['Invoice Number:', data['invoice_number']],
+        ['Invoice Date:', data['invoice_date']],
+        ['Order Number:', data['order_number']],
+    ]
+    if data.get('job_number'):
+        invoice_info.append(['Job Number:', data['job_number']])
+    elements.append(Table(invoice_info, colWidths=[1.5*inch, 4*inch], style=styles['invoice']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Line items
+    line_data = [['Description', 'Quantity', 'Unit Price', 'Line Total']]
+    for line in data['lines']:
+        line_data.append([
+            line['description'],
+            f"{line['quantity']:.2f}",
+            f"${line['unit_price']:.2f}",
+            f"${(line['quantity'] * line['unit_price']):.2f}",
+        ])
+    elements.append(Table(line_data, colWidths=[3.5*inch, 0.8*inch, 1*inch, 1*inch], style=styles['lines'], repeatRows=1))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Totals
+    totals_data = [
+        ['Subtotal:', f"${data['subtotal']:.2f}"],
+        ['GST (10%):', f"${data['tax_amount']:.2f}"],
+        ['Total:', f"${data['total']:.2f}"],
+    ]
+    elements.append(Table(totals_data, colWidths=[1.5*inch, 1*inch], style=styles['totals']))
+
+    # Notes
+    if data.get('notes'):
+        elements.append(Spacer(1, 0.3*inch))
+        elements.append(Paragraph('<b>Notes:</b>', styles['heading']))
+        elements.append(Paragraph(data['notes'], styles['normal']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool, started on first use (spawned, so no app threads or DB handles are forked)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def merge_pdfs(documents: List[bytes]) -> Tuple[bytes, int]:
+    """
+    Concatenate PDF documents.
+
+    Returns:
+        Tuple of (merged PDF bytes, page count)
+    """
+    import fitz  # PyMuPDF
+
+    merged = fitz.open()
+    try:
+        for document in documents:
+            with fitz.open(stream=document, filetype='pdf') as part:
+                merged.insert_pdf(part)
+        return merged.tobytes(garbage=1, deflate=True), merged.page_count
+    finally:
+        merged.close()
+
+
+def render_invoices_pdf(invoices: List[Dict[str, Any]], max_workers: int = None) -> Tuple[bytes, int, float]:
+    """
+    Render invoices into a single PDF, each invoice starting on a new page.
+
+    Args:
+        invoices: Invoice snapshots from invoice_to_dict
+        max_workers: Override for parallelism (1 renders inline)
+
+    Returns:
+        Tuple of (PDF bytes, page count, seconds taken)
+    """
+    start = time.perf_counter()
+    workers = PDF_RENDER_WORKERS if max_workers is None else max_workers
+    with metrics.pdf_job('invoices'):
+        if workers > 1 and len(invoices) >= PDF_PARALLEL_MIN:
+            # Large chunks keep per-task pickling overhead down
+            chunksize = max(1, len(invoices) // (workers * 4))
+            parts = list(_get_pool().map(render_invoice_pdf, invoices, chunksize=chunksize))
+        else:
+            parts = [render_invoice_pdf(data) for data in invoices]
+
+        pdf_bytes, pages = merge_pdfs(parts)
+    seconds = time.perf_counter() - start
+    logger.info(f"Rendered {len(invoices)} invoice(s), {pages} page(s) in {seconds:.2f}s "
+                f"({pages / seconds if seconds else 0:.1f} pages/s)")
+    return pdf_bytes, pages, seconds
@@ -0,0 +1,154 @@
+"""
+Prometheus Metrics
+
+Counters, gauges and histograms for the uploader and portal, exposed at
+/metrics in the Prometheus text format for the Prometheus on the NAS to scrape:
+
+- External calls (RFMS, Gemini, Graph) by operation and outcome, fed from the
+  request tracer (utils/tracing.py), plus RFMS session begins, Gemini
+  rate-limit (429) and quota errors, and time spent in the Gemini limiter
+- Cache lookups (hit/miss) for the thumbnail cache, Graph tokens, RFMS
+  sessions and Graph folder listings
+- Attachment bytes downloaded from RFMS and from email
+- Emails sent and invoice searches (EmailSender / EmailScraper)
+- PDF jobs in flight and their duration (photo PDFs, invoice PDFs)
+- Daily stock report runs, duration and last success
+- Request duration per route
+
+Multiple processes: set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+the app starts (e.g. a tmpfs volume cleared by the container entrypoint) when
+running more than one WSGI worker process. Each process then writes its values
+to files in that directory and /metrics aggregates them, so any worker can
+answer a scrape with totals for all of them. Servers that reap workers should
+call mark_process_dead(pid) from their child-exit hook. Without the variable,
+/metrics reports the current process only.
+
+Useful queries:
+    rate(uploader_external_calls_total{service="rfms"}[5m]) * 60     RFMS calls per minute
+    sum(rate(uploader_gemini_requests_total{outcome="rate_limited"}[1h]))
+      / sum(rate(uploader_gemini_requests_total[1h]))                  Gemini 429 rate
+    sum by (cache) (rate(uploader_cache_lookups_total{result="hit"}[1h]))
+      / sum by (cache) (rate(uploader_cache_lookups_total[1h]))        Cache hit ratios
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Tuple
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402 - the multiprocess directory must exist first
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+# External API calls take 50 ms - 30 s; PDF jobs and the daily report can run for minutes
+CALL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+JOB_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# External calls (fed by utils.tracing.record_call)
+EXTERNAL_CALLS = Counter('uploader_external_calls_total', 'Calls to external services',
+                         ['service', 'operation', 'outcome'])
+EXTERNAL_CALL_SECONDS = Histogram('uploader_external_call_seconds', 'Duration of calls to external services',
+                                  ['service', 'operation'], buckets=CALL_BUCKETS)
+
+# RFMSClient
+RFMS_SESSIONS_STARTED = Counter('uploader_rfms_sessions_started_total', 'RFMS API sessions begun')
+RFMS_AUTH_RETRIES = Counter('uploader_rfms_auth_retries_total', 'RFMS calls retried after a 401/403')
+
+# DocumentAnalyzer
+GEMINI_REQUESTS = Counter('uploader_gemini_requests_total', 'Gemini generate_content attempts',
+                          ['outcome'])  # ok, rate_limited, quota_exhausted, error
+GEMINI_LIMITER_WAIT_SECONDS = Counter('uploader_gemini_limiter_wait_seconds_total',
+                                      'Time spent waiting for the Gemini rate limiter')
+
+# Caches
+CACHE_LOOKUPS = Counter('uploader_cache_lookups_total', 'Cache lookups', ['cache', 'result'])  # hit, miss
+
+# Attachments
+ATTACHMENT_BYTES = Counter('uploader_attachment_bytes_downloaded_total', 'Attachment bytes downloaded',
+                           ['source'])  # rfms, email
+
+# EmailSender / EmailScraper
+EMAILS_SENT = Counter('uploader_emails_sent_total', 'Emails sent through Graph', ['outcome'])
+INVOICE_SEARCHES = Counter('uploader_invoice_searches_total', 'Supplier invoice mailbox searches')
+INVOICE_SEARCH_SECONDS = Histogram('uploader_invoice_search_seconds', 'Duration of supplier invoice searches',
+                                   buckets=CALL_BUCKETS)
+
+# PDF pipeline
+PDF_JOBS_IN_FLIGHT = Gauge('uploader_pdf_jobs_in_flight', 'PDF jobs currently running', ['kind'],
+                           multiprocess_mode='livesum')
+PDF_JOB_SECONDS = Histogram('uploader_pdf_job_seconds', 'Duration of PDF jobs', ['kind', 'outcome'],
+                            buckets=JOB_BUCKETS)
+
+# Daily stock report
+DAILY_REPORT_RUNS = Counter('uploader_daily_report_runs_total', 'Daily stock report runs', ['outcome'])
+DAILY_REPORT_SECONDS = Gauge('uploader_daily_report_duration_seconds', 'Duration of the last daily stock report',
+                             multiprocess_mode='mostrecent')
+DAILY_REPORT_LAST_SUCCESS = Gauge('uploader_daily_report_last_success_timestamp_seconds',
+                                  'Unix time the daily stock report last succeeded', multiprocess_mode='max')
+
+# Web requests (fed by utils.tracing)
+REQUEST_SECONDS = Histogram('uploader_http_request_seconds', 'Duration of web requests',
+                            ['method', 'route', 'status'], buckets=CALL_BUCKETS)
+
+
+def cache_lookup(cache: str, hit: bool, count: int = 1) -> None:
+    """Count lookups in a named cache."""
+    if count:
+        CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc(count)
+
+
+@contextmanager
+def pdf_job(kind: str):
+    """
+    Track a PDF job: in-flight gauge while it runs, duration by outcome when it ends.
+
+    The yielded dict may set 'outcome' (default 'ok', or 'error' if the block raises).
+    """
+    result = {'outcome': 'ok'}
+    gauge = PDF_JOBS_IN_FLIGHT.labels(kind)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield result
+    except Exception:
+        result['outcome'] = 'error'
+        raise
+    finally:
+        gauge.dec()
+        PDF_JOB_SECONDS.labels(kind, result['outcome']).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (body, content type); aggregated across processes when
+        PROMETHEUS_MULTIPROC_DIR is set
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a dead worker's live gauges (call from the server's child-exit hook)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
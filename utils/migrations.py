@@ -0,0 +1,148 @@
+"""
+Versioned Schema Migrations
+
+db.create_all() creates tables that do not exist yet, but never changes an
+existing table - new indexes and columns on a live database need a migration.
+Migrations are numbered steps applied in order at startup (after create_all);
+the schema_migrations table records which have run, so each runs once per
+database.
+
+To change the schema: update the model in models.py (so new databases get it
+from create_all) and append a Migration here that brings existing databases
+to the same state. Never edit or renumber a migration that has shipped. Steps
+must be idempotent (check before creating), since a new database already has
+everything create_all made.
+
+Usage:
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db.engine)
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Sequence, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_indexes(indexes: Sequence[Tuple[str, str, Sequence[str]]]) -> Callable[[Connection], None]:
+    """Migration step creating (name, table, columns) indexes that are missing."""
+    def apply(conn: Connection) -> None:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        for name, table, columns in indexes:
+            if table not in tables:
+                continue  # create_all makes the table, with its indexes, when the model is first used
+            if name in {index['name'] for index in inspector.get_indexes(table)}:
+                continue
+            column_list = ', '.join(columns)
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({column_list})"))
+            logger.info(f"Created index {name} on {table} ({column_list})")
+    return apply
+
+
+def _add_columns(columns: Sequence[Tuple[str, str, str]]) -> Callable[[Connection], None]:
+    """Migration step adding (table, column, SQL type) columns that are missing."""
+    def apply(conn: Connection) -> None:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        for table, column, sql_type in columns:
+            if table not in tables:
+                continue  # create_all makes the table, with the column, when the model is first used
+            if column in {existing['name'] for existing in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+            logger.info(f"Added column {table}.{column}")
+    return apply
+
+
+def _baseline(conn: Connection) -> None:
+    """Tables as created by db.create_all() before migrations existed."""
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'Baseline (tables from db.create_all)', _baseline),
+    Migration(2, 'Indexes for hot queries', _create_indexes([
+        ('ix_pdf_data_processed_created_at', 'pdf_data', ['processed', 'created_at']),
+        ('ix_installer_invoice_status_submitted_at', 'installer_invoice', ['status', 'submitted_at', 'id']),
+        ('ix_installer_invoice_status_updated_at', 'installer_invoice', ['status', 'updated_at', 'id']),
+        ('ix_installer_invoice_installer_status', 'installer_invoice', ['installer_id', 'status']),
+        ('ix_installer_invoice_work_order_id', 'installer_invoice', ['work_order_id']),
+        ('ix_invoice_line_invoice_id', 'invoice_line', ['invoice_id']),
+        ('ix_invoice_attachment_invoice_id', 'invoice_attachment', ['invoice_id']),
+        ('ix_work_order_line_work_order_id', 'work_order_line', ['work_order_id']),
+        ('ix_stock_receiving_received_date_order_number', 'stock_receiving', ['received_date', 'order_number']),
+    ])),
+    Migration(3, 'Outbox send lease (outbound_email.claimed_at)', _add_columns([
+        ('outbound_email', 'claimed_at', 'DATETIME'),
+    ])),
+]
+
+
+def _ensure_migrations_table(conn: Connection) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def current_version(engine: Engine) -> int:
+    """Highest migration applied to the database (0 if none)."""
+    with engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {MIGRATIONS_TABLE}")).scalar()
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    """Migrations not yet applied, in order."""
+    version = current_version(engine)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def upgrade_schema(engine: Engine) -> int:
+    """
+    Apply pending migrations, each in its own transaction.
+
+    Args:
+        engine: Database engine (call after db.create_all)
+
+    Returns:
+        Schema version after the upgrade
+
+    Raises:
+        Exception: A failing migration is rolled back and re-raised; later migrations are not run
+    """
+    version = current_version(engine)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with engine.begin() as conn:
+            # Another process may have applied it since we looked
+            if conn.execute(text(f"SELECT 1 FROM {MIGRATIONS_TABLE} WHERE version = :version"),
+                            {'version': migration.version}).first():
+                version = migration.version
+                continue
+            logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+            migration.apply(conn)
+            conn.execute(text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) "
+                              "VALUES (:version, :description, :applied_at)"),
+                         {'version': migration.version, 'description': migration.description,
+                          'applied_at': datetime.utcnow()})
+        version = migration.version
+    return version
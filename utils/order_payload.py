@@ -0,0 +1,175 @@
+"""
+Compact RFMS Order Payloads
+
+Reduces a full RFMS get_order() response to the fields the installer portal
+reads back from WorkOrder.order_payload: order lines, sold-to/ship-to, dates
+and attachment metadata (ids and tags, never file data).
+
+The projection keeps the same shape as the RFMS response ('result' with
+'lines', 'soldTo', 'shipTo'; top-level 'attachments'), so code written for
+the full payload reads it unchanged. It is tagged with a version number so
+the projection can evolve. Full payloads can optionally be kept in a
+gzip side store (ORDER_PAYLOAD_ARCHIVE_DIR); otherwise they are dropped and
+can be fetched from RFMS again when needed.
+"""
+
+import os
+import gzip
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ORDER_PAYLOAD_VERSION = 1
+VERSION_KEY = '_v'
+
+# Order-level scalar fields kept (plus every field ending in 'Date')
+ORDER_FIELDS = (
+    'documentNumber', 'orderNumber', 'poNumber', 'jobNumber', 'storeNumber',
+    'customerId', 'salesperson1', 'userOrderTypeId', 'serviceTypeId',
+)
+
+# Party (sold-to / ship-to) fields kept
+PARTY_FIELDS = (
+    'businessName', 'firstName', 'lastName', 'address1', 'address2',
+    'city', 'state', 'postalCode', 'county', 'phone1', 'email',
+)
+
+# Line fields read by the portal's line parsers and invoice editor
+LINE_FIELDS = (
+    'lineNumber', 'productCode', 'productNumber', 'productCategoryCode', 'categoryCode',
+    'productCategory', 'styleName', 'colorName', 'description', 'productDescription',
+    'productName', 'quantity', 'qty', 'units', 'unitCost', 'unitPrice', 'price', 'taxRate',
+    'rollItemNumber', 'installDate', 'scheduledDate', 'isDeleted',
+)
+
+# Attachment metadata kept (file data is never stored)
+ATTACHMENT_FIELDS = (
+    'id', 'attachmentId', 'description', 'name', 'title', 'tag', 'type',
+    'fileExtension', 'file_type', 'dateAdded',
+)
+
+ARCHIVE_DIR = os.getenv('ORDER_PAYLOAD_ARCHIVE_DIR')
+
+
+def is_compact(payload: Any) -> bool:
+    """True if the payload is a current-version projection."""
+    return isinstance(payload, dict) and payload.get(VERSION_KEY) == ORDER_PAYLOAD_VERSION
+
+
+def _pick(source: Any, fields) -> Dict[str, Any]:
+    if not isinstance(source, dict):
+        return {}
+    return {field: source[field] for field in fields if source.get(field) not in (None, '')}
+
+
+def _order_object(order_details: Dict[str, Any]) -> Dict[str, Any]:
+    """Locate the order object in an RFMS response (result, detail or detail.order)."""
+    for key in ('result', 'detail', 'data'):
+        candidate = order_details.get(key)
+        if isinstance(candidate, dict):
+            if isinstance(candidate.get('order'), dict):
+                return candidate['order']
+            if candidate.get('lines') or candidate.get('soldTo') or candidate.get('shipTo'):
+                return candidate
+    return order_details
+
+
+def _find_attachments(order_details: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Find the attachment list wherever RFMS put it (top level, detail, result or data)."""
+    if isinstance(order_details.get('attachments'), list):
+        return order_details['attachments']
+    for key in ('detail', 'result', 'data'):
+        container = order_details.get(key)
+        if not isinstance(container, dict):
+            continue
+        if isinstance(container.get('attachments'), list):
+            return container['attachments']
+        if isinstance(container.get('order'), dict) and isinstance(container['order'].get('attachments'), list):
+            return container['order']['attachments']
+    return []
+
+
+def compact_order_payload(order_details: Any) -> Optional[Dict[str, Any]]:
+    """
+    Project a full RFMS get_order() response onto the fields the portal uses.
+
+    Args:
+        order_details: Full RFMS response (already-compact payloads are returned as-is)
+
+    Returns:
+        Versioned compact payload, or None for an empty/invalid response
+    """
+    if not isinstance(order_details, dict) or not order_details:
+        return None
+    if is_compact(order_details):
+        return order_details
+
+    order = _order_object(order_details)
+    result = _pick(order, ORDER_FIELDS)
+    for key, value in order.items():
+        if key.endswith('Date') and isinstance(value, (str, int, float)) and value not in ('', None):
+            result[key] = value
+
+    for party in ('soldTo', 'shipTo'):
+        picked = _pick(order.get(party), PARTY_FIELDS)
+        if picked:
+            result[party] = picked
+
+    lines = order.get('lines') or order.get('lineItems') or []
+    result['lines'] = [_pick(line, LINE_FIELDS) for line in lines if isinstance(line, dict)]
+
+    compact = {
+        VERSION_KEY: ORDER_PAYLOAD_VERSION,
+        'status': order_details.get('status'),
+        'result': result,
+        'attachments': [_pick(att, ATTACHMENT_FIELDS) for att in _find_attachments(order_details) if isinstance(att, dict)],
+    }
+    return compact
+
+
+def _archive_path(archive_dir: str, order_number: str) -> str:
+    safe_name = ''.join(c for c in str(order_number).upper() if c.isalnum() or c in '-_')
+    return os.path.join(archive_dir, f"{safe_name}.json.gz")
+
+
+def archive_order_payload(order_number: str, order_details: Any, archive_dir: str = None) -> Optional[str]:
+    """
+    Write a full RFMS payload to the gzip side store, if one is configured.
+
+    Args:
+        order_number: Order the payload belongs to (used as the file name)
+        order_details: Full RFMS response
+        archive_dir: Side store directory (defaults to ORDER_PAYLOAD_ARCHIVE_DIR)
+
+    Returns:
+        Path written, or None when no side store is configured
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not archive_dir or not order_number or not isinstance(order_details, dict):
+        return None
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = _archive_path(archive_dir, order_number)
+    tmp_path = f"{path}.tmp"
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(order_details, f)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        logger.warning(f"Failed to archive order payload for {order_number}: {e}")
+        return None
+
+
+def load_archived_order_payload(order_number: str, archive_dir: str = None) -> Optional[Dict[str, Any]]:
+    """Read a full payload back from the gzip side store (None if not archived)."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not archive_dir or not order_number:
+        return None
+    path = _archive_path(archive_dir, order_number)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
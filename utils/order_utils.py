@@ -9,9 +9,114 @@ Handles various formats of order numbers:
 """
 import re
 import logging
+from functools import lru_cache
+from typing import Iterable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Patterns are compiled once at import time; they used to be rebuilt on every call
+_PREFIX_RE = re.compile(r'^(ref|reference|order|po|p/o|purchase\s*order)[:\s]+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_ST_RE = re.compile(r'^#?(ST)(\d{5})$', re.IGNORECASE)
+_HYPHEN_RE = re.compile(r'^([A-Z]{2,3})(\d{6})-(\d{4})$', re.IGNORECASE)
+_JOINED_RE = re.compile(r'^([A-Z]{2,3})(\d{6})(\d{4})$', re.IGNORECASE)
+_BASE_RE = re.compile(r'^([A-Z]{2,3})(\d{6})$', re.IGNORECASE)
+_VALID_PREFIX_RE = re.compile(r'^[A-Z]{2,3}\d{6}', re.IGNORECASE)
+# Matches: 2-3 letters + 6 digits, optionally followed by -4digits or 4digits
+_IN_TEXT_RE = re.compile(r'\b([A-Z]{2,3}\d{6}(?:-?\d{4})?)\b', re.IGNORECASE)
+
+# Number of distinct order number strings remembered by recognize_order_number
+RECOGNIZER_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=RECOGNIZER_CACHE_SIZE)
+def _recognize(original: str) -> Tuple[str, str, str, str, Tuple[str, ...]]:
+    """
+    Parse a stripped order number once and return (base, suffix, full, full_joined, variations).
+
+    The result is immutable so it can be shared safely between callers via the LRU cache.
+    """
+    # Remove common prefixes like "Ref:", "Reference:", "Order:", etc. and any whitespace
+    cleaned = _WHITESPACE_RE.sub('', _PREFIX_RE.sub('', original).strip())
+
+    suffix = None
+    # Special handling for #ST orders (ST + 5 digits, e.g., ST00536)
+    if cleaned.upper().startswith('ST') and len(cleaned) >= 7:
+        match = _ST_RE.match(cleaned)
+        if match:
+            base = f"{match.group(1).upper()}{match.group(2)}"
+        else:
+            logger.warning(f"Could not parse ST order number format: {original}")
+            base = cleaned.upper()
+        full = full_joined = base
+    else:
+        # Standard order numbers (AZ, CG, etc. with 6 digits):
+        # AZ003463-0001, then AZ0034630001, then AZ003463
+        match = _HYPHEN_RE.match(cleaned) or _JOINED_RE.match(cleaned)
+        if match:
+            base = f"{match.group(1).upper()}{match.group(2)}"
+            suffix = match.group(3)
+            full = f"{base}-{suffix}"
+            full_joined = f"{base}{suffix}"
+        else:
+            match = _BASE_RE.match(cleaned)
+            if match:
+                base = f"{match.group(1).upper()}{match.group(2)}"
+            elif cleaned.isdigit():
+                # Numeric-only order number (like 6396458) - return as-is
+                base = cleaned
+            else:
+                logger.warning(f"Could not parse order number format: {original}")
+                base = cleaned.upper()
+            full = full_joined = base
+
+    variations = [full] if full else []
+    if full_joined and full_joined != full:
+        variations.append(full_joined)
+    if base and base not in variations:
+        variations.append(base)
+    # Also include original if it's different and looks like a valid order number
+    if original and original not in variations and _VALID_PREFIX_RE.match(original):
+        variations.append(original)
+
+    return base, suffix, full, full_joined, tuple(variations)
+
+
+def recognize_order_number(order_number: str) -> dict:
+    """
+    Parse an order number in one pass and return every form of it.
+
+    Results are memoized (LRU), so repeatedly recognizing the same strings -
+    as receiving searches do - costs a dictionary lookup.
+
+    Args:
+        order_number: The order number string to recognize
+
+    Returns:
+        Dict with the keys of normalize_order_number plus:
+            - variations: List of variations to search for (see get_order_number_variations)
+    """
+    if not order_number:
+        return {
+            'base': None,
+            'suffix': None,
+            'full': None,
+            'full_joined': None,
+            'original': None,
+            'variations': []
+        }
+
+    original = str(order_number).strip()
+    base, suffix, full, full_joined, variations = _recognize(original)
+    return {
+        'base': base,
+        'suffix': suffix,
+        'full': full,
+        'full_joined': full_joined,
+        'original': original,
+        'variations': list(variations)
+    }
+
 
 def normalize_order_number(order_number: str) -> dict:
     """
@@ -35,120 +140,9 @@ def normalize_order_number(order_number: str) -> dict:
             - full_joined: Full order number without hyphen (e.g., "AZ0034630001")
             - original: Original input string
     """
-    if not order_number:
-        return {
-            'base': None,
-            'suffix': None,
-            'full': None,
-            'full_joined': None,
-            'original': None
-        }
-    
-    original = str(order_number).strip()
-    
-    # Remove common prefixes like "Ref:", "Reference:", "Order:", etc.
-    cleaned = re.sub(r'^(ref|reference|order|po|p/o|purchase\s*order)[:\s]+', 
-                     '', original, flags=re.IGNORECASE).strip()
-    
-    # Remove any whitespace
-    cleaned = re.sub(r'\s+', '', cleaned)
-    
-    # Pattern to match order numbers:
-    # - Starts with 2-3 letters (AZ, CG, ST, etc.)
-    # - Followed by 5-6 digits (base number - ST orders use 5 digits, others use 6)
-    # - Optionally followed by a hyphen and 4 digits (suffix)
-    # - OR optionally followed directly by 4 digits (joined suffix)
-    
-    # Special handling for #ST orders (ST + 5 digits, e.g., ST00536)
-    if cleaned.upper().startswith('ST') and len(cleaned) >= 7:
-        # ST orders: ST + 5 digits (e.g., ST00536)
-        st_pattern = re.compile(r'^(ST)(\d{5})$', re.IGNORECASE)
-        match = st_pattern.match(cleaned)
-        if match:
-            prefix = match.group(1).upper()
-            base_num = match.group(2)
-            base = f"{prefix}{base_num}"
-            suffix = None
-            full = base
-            full_joined = base
-        else:
-            # Try ST with # prefix
-            st_hash_pattern = re.compile(r'^#?(ST)(\d{5})$', re.IGNORECASE)
-            match = st_hash_pattern.match(cleaned)
-            if match:
-                prefix = match.group(1).upper()
-                base_num = match.group(2)
-                base = f"#{prefix}{base_num}"
-                suffix = None
-                full = base
-                full_joined = base
-            else:
-                # If no pattern matches, return as-is
-                logger.warning(f"Could not parse ST order number format: {original}")
-                base = cleaned.upper()
-                suffix = None
-                full = base
-                full_joined = base
-    else:
-        # Standard order numbers (AZ, CG, etc. with 6 digits)
-        # Try pattern with hyphen first: AZ003463-0001
-        pattern_with_hyphen = re.compile(r'^([A-Z]{2,3})(\d{6})-(\d{4})$', re.IGNORECASE)
-        match = pattern_with_hyphen.match(cleaned)
-        
-        if match:
-            prefix = match.group(1).upper()
-            base_num = match.group(2)
-            suffix = match.group(3)
-            base = f"{prefix}{base_num}"
-            full = f"{base}-{suffix}"
-            full_joined = f"{base}{suffix}"
-        else:
-            # Try pattern without hyphen but with suffix: AZ0034630001
-            pattern_joined = re.compile(r'^([A-Z]{2,3})(\d{6})(\d{4})$', re.IGNORECASE)
-            match = pattern_joined.match(cleaned)
-            
-            if match:
-                prefix = match.group(1).upper()
-                base_num = match.group(2)
-                suffix = match.group(3)
-                base = f"{prefix}{base_num}"
-                full = f"{base}-{suffix}"
-                full_joined = f"{base}{suffix}"
-            else:
-                # Try base only: AZ003463
-                pattern_base = re.compile(r'^([A-Z]{2,3})(\d{6})$', re.IGNORECASE)
-                match = pattern_base.match(cleaned)
-                
-                if match:
-                    prefix = match.group(1).upper()
-                    base_num = match.group(2)
-                    base = f"{prefix}{base_num}"
-                    suffix = None
-                    full = base
-                    full_joined = base
-                else:
-                    # If no pattern matches, return as-is but try to extract what we can
-                    # Check if it's a numeric-only order number (like 6396458)
-                    if cleaned.isdigit():
-                        # Numeric-only order number - return as-is
-                        base = cleaned
-                        suffix = None
-                        full = base
-                        full_joined = base
-                    else:
-                        logger.warning(f"Could not parse order number format: {original}")
-                        base = cleaned.upper()
-                        suffix = None
-                        full = base
-                        full_joined = base
-    
-    return {
-        'base': base,
-        'suffix': suffix,
-        'full': full,
-        'full_joined': full_joined,
-        'original': original
-    }
+    recognized = recognize_order_number(order_number)
+    recognized.pop('variations')
+    return recognized
 
 
 def get_order_number_variations(order_number: str) -> list:
@@ -156,8 +150,8 @@ def get_order_number_variations(order_number: str) -> list:
     Get all possible variations of an order number for searching.
     
     For example, if input is "AZ0034630001", returns:
-    - AZ0034630001 (original joined)
     - AZ003463-0001 (with hyphen)
+    - AZ0034630001 (original joined)
     - AZ003463 (base only)
     
     Args:
@@ -166,25 +160,7 @@ def get_order_number_variations(order_number: str) -> list:
     Returns:
         List of order number variations to search for
     """
-    normalized = normalize_order_number(order_number)
-    variations = []
-    
-    if normalized['full']:
-        variations.append(normalized['full'])
-    
-    if normalized['full_joined'] and normalized['full_joined'] != normalized['full']:
-        variations.append(normalized['full_joined'])
-    
-    if normalized['base'] and normalized['base'] not in variations:
-        variations.append(normalized['base'])
-    
-    # Also include original if it's different
-    if normalized['original'] and normalized['original'] not in variations:
-        # Only add if it looks like a valid order number
-        if re.match(r'^[A-Z]{2,3}\d{6}', normalized['original'], re.IGNORECASE):
-            variations.append(normalized['original'])
-    
-    return variations
+    return recognize_order_number(order_number)['variations']
 
 
 def extract_order_number_from_text(text: str) -> list:
@@ -206,13 +182,18 @@ def extract_order_number_from_text(text: str) -> list:
     if not text:
         return []
     
-    # Pattern to find order numbers in text
-    # Matches: 2-3 letters + 6 digits, optionally followed by -4digits or 4digits
-    pattern = re.compile(
-        r'\b([A-Z]{2,3}\d{6}(?:-?\d{4})?)\b',
-        re.IGNORECASE
-    )
-    
-    matches = pattern.findall(text)
-    return [match.upper() for match in matches if match]
+    return [match.upper() for match in _IN_TEXT_RE.findall(text) if match]
+
 
+def extract_all(texts: Iterable[str]) -> List[List[str]]:
+    """
+    Extract order numbers from many texts (email bodies, PDF pages) in one call.
+
+    Args:
+        texts: Iterable of text strings (None/empty entries are allowed)
+
+    Returns:
+        One list of found order number strings per input text, in the same order
+    """
+    findall = _IN_TEXT_RE.findall
+    return [[match.upper() for match in findall(text)] if text else [] for text in texts]
@@ -0,0 +1,250 @@
+"""
+Incremental Installer Photo Exports
+
+Keeps a manifest per exported photo PDF (in a .manifests folder beside the
+PDFs) recording the header it was stamped with and, for every page, the RFMS
+attachment id and a SHA-256 of the photo. Re-exporting an order then only
+costs the delta:
+
+- unchanged:  same attachments and header, PDF still on the share - nothing is
+              downloaded or written
+- appended:   attachments were only added - only the new photos are downloaded
+              and decoded, and their pages are appended to the existing PDF
+              (which keeps its file name)
+- rebuilt:    photos removed, header changed or the PDF/manifest is missing
+
+PDFs and manifests are written to a temp file in the target folder and
+renamed into place, so the SMB/NFS share never holds a half-written file.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import metrics
+from utils.photo_pdf import PreparedImage, PdfHeaderTemplate, prepare_image
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_DIR = '.manifests'
+
+
+def attachment_key(attachment: Dict) -> Optional[str]:
+    """RFMS attachment id as a string (None if the attachment has no id)."""
+    for field in ('id', 'attachmentId', 'attachment_id'):
+        if attachment.get(field) is not None:
+            return str(attachment[field])
+    return None
+
+
+def _header_hash(order_details: Optional[Dict]) -> str:
+    return hashlib.sha256(json.dumps(order_details or {}, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _manifest_path(output_folder: Path, manifest_name: str) -> Path:
+    return Path(output_folder) / MANIFEST_DIR / f"{manifest_name}.json"
+
+
+def load_manifest(output_folder: Path, manifest_name: str) -> Optional[Dict[str, Any]]:
+    """Read an export manifest (None if missing, unreadable or from another version)."""
+    path = _manifest_path(output_folder, manifest_name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write a file via a temp file in the same folder and a rename (no partial files on the share)."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _save_manifest(output_folder: Path, manifest_name: str, manifest: Dict[str, Any]) -> None:
+    path = _manifest_path(output_folder, manifest_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, json.dumps(manifest, indent=2).encode('utf-8'))
+
+
+def _download_and_prepare(attachments: List[Dict], download: Callable[[Dict], Path],
+                          known_hashes: set) -> Tuple[List[Tuple[Dict, PreparedImage, str]], List[str]]:
+    """
+    Download and decode attachments.
+
+    Returns:
+        Tuple of ((attachment, image, sha256) per new page, ids of attachments that never
+        will make a page: duplicates of a photo already in the PDF, or not readable as images).
+        Attachments that failed to download are in neither, so they are tried again next time.
+    """
+    prepared = []
+    skipped = []
+    for attachment in attachments:
+        try:
+            file_path = Path(download(attachment))
+        except Exception as e:
+            logger.error(f"Failed to download attachment {attachment_key(attachment)}: {e}")
+            continue
+        digest = hashlib.sha256(file_path.read_bytes()).hexdigest()
+        if digest in known_hashes:
+            logger.info(f"Attachment {attachment_key(attachment)} duplicates a photo already in the PDF, skipping")
+            skipped.append(attachment_key(attachment))
+            continue
+        image = prepare_image(file_path)
+        if image is None:
+            skipped.append(attachment_key(attachment))
+            continue
+        known_hashes.add(digest)
+        prepared.append((attachment, image, digest))
+    return prepared, skipped
+
+
+def _add_pages(doc, images: List[PreparedImage], header: Optional[PdfHeaderTemplate]) -> None:
+    import fitz  # PyMuPDF
+
+    header_height = header.header_height if header else 0
+    for image in images:
+        try:
+            page_height = image.height + header_height
+            page = doc.new_page(width=image.width, height=page_height)
+            if header:
+                header.stamp(page, image.width)
+            page.insert_image(fitz.Rect(0, header_height, image.width, page_height), stream=image.data)
+        except Exception as e:
+            logger.error(f"Failed to add image {image.source} to PDF: {e}")
+
+
+def export_order_photos(attachments: List[Dict], download: Callable[[Dict], Path], output_folder: Path,
+                        pdf_filename: str, manifest_name: str, order_details: Dict = None,
+                        timings: Dict = None) -> Dict[str, Any]:
+    """
+    Create or update an order's photo PDF, doing only the work its manifest says is new.
+
+    Args:
+        attachments: RFMS attachments to include, in page order
+        download: Saves one attachment to disk and returns its path
+        output_folder: Folder the PDF is written to (network share)
+        pdf_filename: File name for a rebuilt PDF (appends keep the existing file's name)
+        manifest_name: Stable name identifying this export (e.g. '<ORDER>_Pics')
+        order_details: Header fields (see add_pdf_header)
+        timings: Optional dict that receives 'images', 'header' and 'save' seconds
+
+    Returns:
+        Dict with 'status' (unchanged/appended/rebuilt), 'path', 'pages', 'added' and
+        'new_images' (attachment, PreparedImage) for the photos processed this time
+
+    Raises:
+        ValueError: If none of the attachments could be turned into a page
+    """
+    with metrics.pdf_job('photos') as job:
+        result = _export_order_photos(attachments, download, output_folder, pdf_filename, manifest_name,
+                                      order_details, timings)
+        job['outcome'] = result['status']
+        return result
+
+
+def _export_order_photos(attachments: List[Dict], download: Callable[[Dict], Path], output_folder: Path,
+                         pdf_filename: str, manifest_name: str, order_details: Optional[Dict],
+                         timings: Optional[Dict]) -> Dict[str, Any]:
+    import fitz  # PyMuPDF
+
+    output_folder = Path(output_folder)
+    header_hash = _header_hash(order_details)
+    wanted = [(attachment_key(att), att) for att in attachments if attachment_key(att)]
+    wanted_ids = [key for key, _ in wanted]
+
+    manifest = load_manifest(output_folder, manifest_name)
+    existing_path = output_folder / manifest['pdf'] if manifest else None
+    usable = (
+        manifest is not None
+        and manifest.get('header') == header_hash
+        and existing_path.exists()
+        and existing_path.stat().st_size == manifest.get('size')
+    )
+    done_ids = set()
+    if usable:
+        done_ids = {page['attachment_id'] for page in manifest['pages']} | set(manifest.get('skipped', []))
+        if not done_ids.issubset(wanted_ids):
+            usable = False  # Photos were removed from the selection
+            done_ids = set()
+
+    if timings is not None:
+        timings.update(images=0.0, header=0.0, save=0.0)
+
+    new_attachments = [att for key, att in wanted if key not in done_ids]
+    if usable and not new_attachments:
+        logger.info(f"Photo PDF {existing_path.name} is up to date ({len(manifest['pages'])} pages), skipping")
+        return {'status': 'unchanged', 'path': existing_path, 'pages': len(manifest['pages']), 'added': 0, 'new_images': []}
+
+    images_start = time.perf_counter()
+    known_hashes = {page['sha256'] for page in manifest['pages']} if usable else set()
+    prepared, skipped = _download_and_prepare(new_attachments, download, known_hashes)
+    if timings is not None:
+        timings['images'] = time.perf_counter() - images_start
+
+    pages = list(manifest['pages']) if usable else []
+    if not pages and not prepared:
+        raise ValueError('No valid image files available for PDF creation')
+    if usable and not prepared:
+        # Nothing new made it into a page; keep the PDF, remember what to skip
+        manifest['skipped'] = sorted(set(manifest.get('skipped', [])) | set(skipped))
+        _save_manifest(output_folder, manifest_name, manifest)
+        return {'status': 'unchanged', 'path': existing_path, 'pages': len(pages), 'added': 0, 'new_images': []}
+
+    header = PdfHeaderTemplate(order_details) if order_details else None
+    doc = fitz.open(str(existing_path)) if usable else fitz.open()
+    try:
+        _add_pages(doc, [image for _, image, _ in prepared], header)
+        save_start = time.perf_counter()
+        # Appends update the existing file in place (keeping its name); rebuilds use pdf_filename
+        output_path = existing_path if usable else output_folder / pdf_filename
+        atomic_write_bytes(output_path, doc.tobytes(garbage=1, deflate=True))
+        save_seconds = time.perf_counter() - save_start
+    finally:
+        doc.close()
+        if header:
+            header.close()
+
+    pages.extend({'attachment_id': attachment_key(att), 'sha256': digest, 'width': image.width, 'height': image.height}
+                 for att, image, digest in prepared)
+    # Duplicates and unreadable photos are remembered so they are not fetched again
+    if usable:
+        skipped = sorted(set(manifest.get('skipped', [])) | set(skipped))
+    _save_manifest(output_folder, manifest_name, {
+        'version': MANIFEST_VERSION,
+        'pdf': output_path.name,
+        'size': output_path.stat().st_size,
+        'header': header_hash,
+        'pages': pages,
+        'skipped': skipped,
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+    })
+
+    if timings is not None:
+        timings['header'] = header.seconds if header else 0.0
+        timings['save'] = save_seconds
+
+    status = 'appended' if usable else 'rebuilt'
+    logger.info(f"Photo PDF {output_path.name} {status}: {len(prepared)} new page(s), {len(pages)} total")
+    return {
+        'status': status,
+        'path': output_path,
+        'pages': len(pages),
+        'added': len(prepared),
+        'new_images': [(att, image) for att, image, _ in prepared],
+    }
@@ -0,0 +1,281 @@
+"""
+Installer Photo PDF Engine
+
+Turns downloaded installer photos into the order photo PDFs. Each photo is
+decoded once: JPEGs are opened in Pillow draft mode so the decoder scales
+them down by a power of two while decoding, the result is resized and
+re-encoded to JPEG in memory, and the encoded stream is handed to PyMuPDF
+with its dimensions (PyMuPDF embeds JPEG data without decoding it again).
+No intermediate compressed files are written.
+
+The order details header is drawn once per order and page width
+(PdfHeaderTemplate) and stamped onto each page as a shared form XObject.
+"""
+
+import io
+import time
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PHOTO_MAX_SIZE = (1920, 1920)
+PHOTO_JPEG_QUALITY = 75
+HEADER_HEIGHT = 80
+
+
+@dataclass
+class PreparedImage:
+    """A photo resized and re-encoded in memory, ready to place on a PDF page."""
+    source: Path
+    data: bytes  # JPEG stream
+    width: int
+    height: int
+    original_size: int
+
+
+def prepare_image(image_path: Path, max_size: tuple = PHOTO_MAX_SIZE, quality: int = PHOTO_JPEG_QUALITY) -> Optional[PreparedImage]:
+    """
+    Decode, downscale and JPEG-encode a photo in memory.
+
+    Args:
+        image_path: Downloaded photo
+        max_size: Bounding box for the output image
+        quality: JPEG quality
+
+    Returns:
+        PreparedImage, or None if the file could not be read as an image
+    """
+    from PIL import Image
+
+    image_path = Path(image_path)
+    try:
+        original_size = image_path.stat().st_size
+        with Image.open(image_path) as img:
+            if img.format == 'JPEG':
+                # Let the JPEG decoder do the bulk of the downscale (1/2, 1/4, 1/8); draft
+                # keeps the image at least as large as the requested size, so ask for the
+                # fitted thumbnail size rather than the bounding box
+                scale = min(max_size[0] / img.width, max_size[1] / img.height)
+                if scale < 1:
+                    img.draft('RGB', (int(img.width * scale), int(img.height * scale)))
+
+            # Convert to RGB if necessary
+            if img.mode in ('RGBA', 'LA', 'P'):
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality, optimize=True)
+            prepared = PreparedImage(image_path, buffer.getvalue(), img.width, img.height, original_size)
+
+        logger.info(f"Compressed {image_path.name}: {original_size:,} bytes -> {len(prepared.data):,} bytes")
+        return prepared
+    except Exception as e:
+        logger.error(f"Failed to prepare image {image_path}: {e}")
+        return None
+
+
+def _truncate_to_width(text: str, max_width: float, fontsize: float = 10, fontname: str = 'helv') -> str:
+    """Longest prefix of text that fits max_width with an ellipsis (binary search on the cut)."""
+    import fitz  # PyMuPDF
+
+    if fitz.get_text_length(text, fontname=fontname, fontsize=fontsize) <= max_width:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fitz.get_text_length(text[:mid] + '...', fontname=fontname, fontsize=fontsize) <= max_width:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + '...'
+
+
+def add_pdf_header(page, order_details: Dict, page_width: float, header_height: float):
+    """Add order details header to a PDF page."""
+    import fitz  # PyMuPDF
+
+    try:
+        margin = 10
+        y_pos = 8
+
+        # Draw header background
+        header_rect = fitz.Rect(0, 0, page_width, header_height)
+        page.draw_rect(header_rect, color=(0.94, 0.94, 0.94), fill=(0.94, 0.94, 0.94))
+
+        # Get order information
+        order_number = order_details.get('order_number', 'N/A')
+        po_number = order_details.get('po_number', '')
+        sold_to_name = order_details.get('sold_to_name', '')
+        ship_to_name = order_details.get('ship_to_name', '')
+        address = order_details.get('address', '')
+        city = order_details.get('city', '')
+
+        # Order Number (left side, bold)
+        page.insert_text(
+            (margin, y_pos),
+            f"Order: {order_number}",
+            fontsize=10,
+            color=(0, 0, 0),
+            fontname="hebo"  # Helvetica-Bold
+        )
+
+        # PO Number (right side, if available)
+        if po_number:
+            po_text = f"PO: {po_number}"
+            text_width = fitz.get_text_length(po_text, fontname="helv", fontsize=10)
+            page.insert_text(
+                (page_width - margin - text_width, y_pos),
+                po_text,
+                fontsize=10,
+                color=(0, 0, 0)
+            )
+
+        y_pos += 15
+
+        # Builder/Customer Name (left side, bold)
+        if sold_to_name:
+            page.insert_text(
+                (margin, y_pos),
+                f"Builder/Customer: {sold_to_name}",
+                fontsize=10,
+                color=(0, 0, 0),
+                fontname="hebo"  # Helvetica-Bold
+            )
+
+        y_pos += 15
+
+        # Ship To Customer (if different from sold to)
+        if ship_to_name and ship_to_name != sold_to_name:
+            page.insert_text(
+                (margin, y_pos),
+                f"Ship To: {ship_to_name}",
+                fontsize=10,
+                color=(0, 0, 0)
+            )
+            y_pos += 15
+
+        # Address (if available)
+        if address or city:
+            address_text = f"{address}, {city}".strip(', ')
+            if address_text:
+                # Truncate if too long
+                address_text = _truncate_to_width(address_text, page_width - (2 * margin))
+                page.insert_text(
+                    (margin, y_pos),
+                    f"Address: {address_text}",
+                    fontsize=10,
+                    color=(0, 0, 0)
+                )
+
+        # Draw line under header
+        line_y = header_height - 5
+        page.draw_line(
+            (margin, line_y),
+            (page_width - margin, line_y),
+            color=(0.78, 0.78, 0.78),
+            width=1
+        )
+    except Exception as e:
+        logger.error(f"Failed to add PDF header: {e}")
+
+
+class PdfHeaderTemplate:
+    """
+    An order's header, drawn once per page width and stamped onto pages.
+
+    Each width is rendered into a one-page PDF with add_pdf_header; stamping
+    shows that page on the target page, which PyMuPDF stores as a single form
+    XObject shared by every page of the output document.
+    """
+
+    def __init__(self, order_details: Dict, header_height: float = HEADER_HEIGHT):
+        self.order_details = order_details
+        self.header_height = header_height
+        self.seconds = 0.0  # Time spent rendering and stamping headers
+        self._templates = {}
+
+    def stamp(self, page, page_width: float) -> None:
+        """Place the header across the top of a page."""
+        import fitz  # PyMuPDF
+
+        start = time.perf_counter()
+        try:
+            template = self._templates.get(page_width)
+            if template is None:
+                template = fitz.open()
+                add_pdf_header(template.new_page(width=page_width, height=self.header_height),
+                               self.order_details, page_width, self.header_height)
+                self._templates[page_width] = template
+            page.show_pdf_page(fitz.Rect(0, 0, page_width, self.header_height), template, 0)
+        except Exception as e:
+            logger.error(f"Failed to add PDF header: {e}")
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def close(self) -> None:
+        for template in self._templates.values():
+            template.close()
+        self._templates.clear()
+
+
+def create_pdf_from_images(images: List[PreparedImage], output_pdf_path: Path, order_details: Dict = None,
+                           timings: Dict = None) -> Path:
+    """
+    Create a PDF with one page per prepared image and an optional order details header.
+
+    Args:
+        images: Photos from prepare_image
+        output_pdf_path: Where to save the PDF
+        order_details: Header fields (order_number, po_number, sold_to_name, ship_to_name, address, city)
+        timings: Optional dict that receives 'header' and 'save' seconds
+
+    Returns:
+        output_pdf_path
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ImportError("PyMuPDF (pymupdf) is required for PDF creation")
+
+    header = PdfHeaderTemplate(order_details) if order_details else None
+    header_height = header.header_height if header else 0
+    doc = fitz.open()
+    try:
+        for image in images:
+            try:
+                page_height = image.height + header_height
+                page = doc.new_page(width=image.width, height=page_height)
+
+                if header:
+                    header.stamp(page, image.width)
+
+                # Insert image below header; the JPEG stream is embedded as-is
+                image_rect = fitz.Rect(0, header_height, image.width, page_height)
+                page.insert_image(image_rect, stream=image.data)
+            except Exception as e:
+                logger.error(f"Failed to add image {image.source} to PDF: {e}")
+                continue
+
+        save_start = time.perf_counter()
+        doc.save(str(output_pdf_path))
+        save_seconds = time.perf_counter() - save_start
+    finally:
+        doc.close()
+        if header:
+            header.close()
+    if timings is not None:
+        timings['header'] = header.seconds if header else 0.0
+        timings['save'] = save_seconds
+    logger.info(f"Created PDF with {len(images)} images: {output_pdf_path}")
+    return Path(output_pdf_path)
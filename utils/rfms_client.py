@@ -5,9 +5,16 @@ import os
 import logging
 from datetime import datetime, timedelta
 
+from utils import metrics
+from utils.tracing import traced_session, trace_methods
+
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session: pooled connections, and every call is timed for request tracing
+_http = traced_session('rfms')
+
 
+@trace_methods('rfms')
 class RFMSClient:
     """
     Enhanced RFMS API Client for handling RFMS-specific operations including
@@ -75,7 +82,7 @@ class RFMSClient:
         if not self.store_code or not self.api_key:
             raise ValueError("RFMS credentials not configured. Please set RFMS_STORE_CODE and RFMS_API_KEY environment variables.")
         
-        response = requests.post(
+        response = _http.post(
             endpoint, 
             auth=(self.store_code, self.api_key)
         )
@@ -105,6 +112,7 @@ class RFMSClient:
         
         # Assume session tokens are valid for 55 minutes (refresh before expiry)
         self.session_expiry = datetime.now() + timedelta(minutes=55)
+        metrics.RFMS_SESSIONS_STARTED.inc()
         logger.info(f"RFMS session started: {self.session_token[:20]}...")
         
     def _invalidate_session(self):
@@ -116,7 +124,9 @@ class RFMSClient:
     @property
     def auth(self) -> tuple:
         """Get authentication tuple for requests. Reuses existing session if valid."""
-        if not self.session_token or (self.session_expiry and datetime.now() >= self.session_expiry):
+        expired = not self.session_token or (self.session_expiry and datetime.now() >= self.session_expiry)
+        metrics.cache_lookup('rfms_session', hit=not expired)
+        if expired:
             self.start_session()
         return (self.store_code, self.session_token)
     
@@ -129,6 +139,7 @@ class RFMSClient:
         """
         if response.status_code in (401, 403):
             logger.warning(f"RFMS authentication failed (HTTP {response.status_code}), invalidating session")
+            metrics.RFMS_AUTH_RETRIES.inc()
             self._invalidate_session()
 
     def find_customers(self, search_text: str) -> List[Dict]:
@@ -151,7 +162,7 @@ class RFMSClient:
             "referralType": "Standalone"
         }
         
-        response = requests.post(
+        response = _http.post(
             endpoint, 
             auth=self.auth, 
             json=params, 
@@ -180,7 +191,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=order_data,
@@ -219,7 +230,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=quote_data,
@@ -276,7 +287,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=file_data,
@@ -323,7 +334,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=update_data,
@@ -363,7 +374,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -403,7 +414,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -565,7 +576,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=update_data,
@@ -703,7 +714,7 @@ class RFMSClient:
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
             try:
-                response = requests.post(
+                response = _http.post(
                     endpoint,
                     auth=self.auth,
                     json=client_data,
@@ -794,7 +805,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.get(
+            response = _http.get(
                 endpoint,
                 auth=self.auth,
                 params=params,
@@ -833,7 +844,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.get(
+            response = _http.get(
                 endpoint,
                 auth=self.auth,
                 headers=self.headers
@@ -841,6 +852,7 @@ class RFMSClient:
             
             # If successful, return the data
             if response.status_code in [200, 201]:
+                metrics.ATTACHMENT_BYTES.labels('rfms').inc(len(response.content))
                 return response.json()
             
             # If authentication error, invalidate session and retry once
@@ -875,7 +887,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.get(
+            response = _http.get(
                 endpoint,
                 auth=self.auth,
                 headers=self.headers
@@ -900,7 +912,8 @@ class RFMSClient:
         raise Exception(f"RFMS API error: Failed to get order jobs for {order_number} after retry")
 
     def find_jobs_by_date_range(self, start_date: str, end_date: str, crews: List[str] = None, 
-                                job_status: List[str] = None, record_status: str = "Both") -> Dict:
+                                job_status: List[str] = None, record_status: str = "Both",
+                                record_start_date: str = None, record_end_date: str = None) -> Dict:
         """
         Find scheduled jobs from Schedule Pro by date range.
         
@@ -914,6 +927,9 @@ class RFMSClient:
             crews: Optional list of crew names to filter by
             job_status: Optional list of job statuses to filter by
             record_status: "Inserted", "Updated", or "Both" (default: "Both")
+            record_start_date: Optional record status range start (MM-DD-YYYY) to only return
+                jobs inserted/updated since then; defaults to start_date
+            record_end_date: Optional record status range end (MM-DD-YYYY); defaults to end_date
             
         Returns:
             Dict: Job details including order information
@@ -922,8 +938,8 @@ class RFMSClient:
         
         # API requires BOTH date ranges: record status range AND scheduled date range
         payload = {
-            "startDate": start_date,  # Record status date range start
-            "endDate": end_date,      # Record status date range end
+            "startDate": record_start_date or start_date,  # Record status date range start
+            "endDate": record_end_date or end_date,        # Record status date range end
             "scheduledStartDate": start_date,  # Scheduled date range start
             "scheduledEndDate": end_date,      # Scheduled date range end
             "installStartDate": start_date,    # Install date range start (same as requested range)
@@ -937,12 +953,13 @@ class RFMSClient:
             payload["jobStatus"] = job_status
         
         # Log the request payload for debugging
-        logger.info(f"Finding jobs with date range: {start_date} to {end_date} (store: {self.store_code})")
+        logger.info(f"Finding jobs with date range: {start_date} to {end_date}, records changed "
+                    f"{payload['startDate']} to {payload['endDate']} (store: {self.store_code})")
         logger.debug(f"Jobs find payload: {payload}")
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -998,7 +1015,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1112,7 +1129,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1154,7 +1171,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1202,7 +1219,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1259,7 +1276,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1577,7 +1594,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
@@ -1618,7 +1635,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.get(
+            response = _http.get(
                 endpoint,
                 auth=self.auth,
                 headers=self.headers
@@ -1718,7 +1735,7 @@ class RFMSClient:
         
         # Try request, retry once if 401/403 (session expired)
         for attempt in range(2):
-            response = requests.post(
+            response = _http.post(
                 endpoint,
                 auth=self.auth,
                 json=payload,
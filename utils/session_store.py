@@ -0,0 +1,214 @@
+"""
+Server-Side Sessions
+
+Flask's default session is a signed cookie holding the whole session dict.
+The upload flow stores extracted data (contacts, notes with full email
+bodies, attachment lists) in the session, which made every request carry
+kilobytes of cookie and broke silently past the browser's ~4 KB cookie limit.
+
+SqlSessionInterface keeps session data in the server_session table and puts
+only a random session id in the cookie:
+
+- Data is serialized with Flask's tagged JSON (same types as cookie sessions).
+- Rows are written only when the session changed; otherwise the expiry is
+  extended at most once per SESSION_TOUCH_INTERVAL_SECONDS.
+- Sessions expire SESSION_LIFETIME_HOURS after their last use; expired rows
+  are purged from a request at most once per SESSION_CLEANUP_INTERVAL_SECONDS.
+- Reads and writes use their own connections (Core statements), so saving the
+  session never flushes or commits the request's ORM session.
+- Logins call regenerate_session() so the id a visitor had before signing in
+  (which could have been planted) stops working once they are authenticated.
+"""
+
+import os
+import time
+import logging
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app, session as flask_session
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+from models import ServerSession
+
+logger = logging.getLogger(__name__)
+
+SESSION_LIFETIME_HOURS = float(os.getenv('SESSION_LIFETIME_HOURS', '72'))
+SESSION_TOUCH_INTERVAL_SECONDS = int(os.getenv('SESSION_TOUCH_INTERVAL_SECONDS', '600'))
+SESSION_CLEANUP_INTERVAL_SECONDS = int(os.getenv('SESSION_CLEANUP_INTERVAL_SECONDS', '3600'))
+
+_SID_BYTES = 32
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it changed."""
+
+    def __init__(self, initial=None, sid: str = None, new: bool = False, expires_at: datetime = None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class SqlSessionInterface(SessionInterface):
+    """Session interface storing session data in the app database."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db, lifetime: timedelta = None):
+        self.db = db
+        self.lifetime = lifetime or timedelta(hours=SESSION_LIFETIME_HOURS)
+        self._table = ServerSession.__table__
+        self._table_ready = False
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def _engine(self):
+        engine = self.db.engine
+        if not self._table_ready:
+            with self._lock:
+                if not self._table_ready:
+                    # Databases created before sessions moved server-side get the table on first use
+                    self._table.create(engine, checkfirst=True)
+                    self._table_ready = True
+        return engine
+
+    @staticmethod
+    def _valid_sid(sid: Optional[str]) -> bool:
+        return bool(sid) and len(sid) <= 64 and sid.replace('-', '').replace('_', '').isalnum()
+
+    def open_session(self, app, request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not self._valid_sid(sid):
+            return ServerSideSession(sid=secrets.token_urlsafe(_SID_BYTES), new=True)
+
+        try:
+            with self._engine().connect() as conn:
+                row = conn.execute(
+                    select(self._table.c.data, self._table.c.expires_at)
+                    .where(self._table.c.id == sid, self._table.c.expires_at > datetime.utcnow())
+                ).first()
+        except Exception as e:
+            logger.error(f"Failed to load session: {e}")
+            row = None
+
+        if row is None:
+            # Unknown or expired id: start over with a fresh one (never adopt a client-chosen id)
+            return ServerSideSession(sid=secrets.token_urlsafe(_SID_BYTES), new=True)
+        try:
+            data = self.serializer.loads(row.data)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable session data: {e}")
+            data = {}
+        return ServerSideSession(data, sid=sid, expires_at=row.expires_at)
+
+    def save_session(self, app, session: ServerSideSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        engine = self._engine()
+
+        if not session:
+            if session.modified and not session.new:
+                # Session was emptied (e.g. logout): drop the row and the cookie
+                with engine.begin() as conn:
+                    conn.execute(delete(self._table).where(self._table.c.id == session.sid))
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = datetime.utcnow()
+        expires_at = now + self.lifetime
+        touch_due = (session.expires_at is None or
+                     expires_at - session.expires_at > timedelta(seconds=SESSION_TOUCH_INTERVAL_SECONDS))
+
+        if session.modified or session.new:
+            payload = self.serializer.dumps(dict(session))
+            with engine.begin() as conn:
+                result = conn.execute(update(self._table).where(self._table.c.id == session.sid)
+                                      .values(data=payload, expires_at=expires_at, updated_at=now))
+                if result.rowcount == 0:
+                    conn.execute(insert(self._table).values(id=session.sid, data=payload,
+                                                            expires_at=expires_at, updated_at=now))
+        elif touch_due:
+            with engine.begin() as conn:
+                conn.execute(update(self._table).where(self._table.c.id == session.sid)
+                             .values(expires_at=expires_at))
+        else:
+            return
+
+        self._maybe_cleanup(engine)
+
+        # Browser-session cookie unless the session is permanent; the server-side expiry applies either way
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def regenerate(self, session: ServerSideSession) -> None:
+        """
+        Move a session to a new random id, keeping its data.
+
+        The old id stops working immediately; the new one reaches the browser
+        when the session is saved at the end of the request.
+
+        Args:
+            session: The current request's session
+        """
+        old_sid = session.sid
+        session.sid = secrets.token_urlsafe(_SID_BYTES)
+        session.modified = True
+        if session.new:
+            return
+        try:
+            with self._engine().begin() as conn:
+                conn.execute(update(self._table).where(self._table.c.id == old_sid)
+                             .values(id=session.sid))
+        except Exception as e:
+            # save_session still writes the data under the new id; the old row just expires
+            logger.error(f"Failed to move session to a new id: {e}")
+
+    def _maybe_cleanup(self, engine) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_cleanup < SESSION_CLEANUP_INTERVAL_SECONDS:
+                return
+            self._last_cleanup = now
+        purge_expired_sessions(engine)
+
+
+def regenerate_session() -> None:
+    """Give the current request's session a new id (call on login)."""
+    interface = current_app.session_interface
+    if isinstance(interface, SqlSessionInterface):
+        interface.regenerate(flask_session._get_current_object())
+
+
+def purge_expired_sessions(engine) -> int:
+    """Delete expired session rows; returns how many were removed."""
+    table = ServerSession.__table__
+    try:
+        with engine.begin() as conn:
+            removed = conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+    except Exception as e:
+        logger.error(f"Failed to purge expired sessions: {e}")
+        return 0
+    if removed:
+        logger.info(f"Purged {removed} expired session(s)")
+    return removed
@@ -0,0 +1,276 @@
+"""
+Attachment Thumbnail Service
+
+Renders gallery thumbnails for RFMS attachments off the request threads:
+
+- Images are decoded (JPEG draft mode, so the decoder downscales), resized and
+  encoded in a pool of worker processes, so Pillow never holds the web
+  process's GIL.
+- PDFs get a preview of their first page, rasterized with PyMuPDF in the same
+  pool.
+- Output is AVIF or WebP when the browser's Accept header allows it (and this
+  Pillow build can encode it), otherwise JPEG.
+
+Concurrent requests for the same attachment share one RFMS fetch and one
+render, finished thumbnails are kept in a small LRU cache, and at most
+THUMBNAIL_QUEUE_SIZE renders may be queued - further requests get
+ThumbnailBusy rather than piling up behind the pool.
+"""
+
+import io
+import os
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 200
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', str(min(2, os.cpu_count() or 1))))
+THUMBNAIL_QUEUE_SIZE = int(os.getenv('THUMBNAIL_QUEUE_SIZE', '32'))
+THUMBNAIL_CACHE_SIZE = int(os.getenv('THUMBNAIL_CACHE_SIZE', '512'))
+THUMBNAIL_TIMEOUT = float(os.getenv('THUMBNAIL_TIMEOUT', '30'))
+# Preferred output formats, best first (JPEG is always the fallback)
+THUMBNAIL_FORMATS = [f.strip().lower() for f in os.getenv('THUMBNAIL_FORMATS', 'avif,webp').split(',') if f.strip()]
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic', 'heif', 'tif', 'tiff'}
+
+_MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+class ThumbnailUnavailable(Exception):
+    """The attachment has no data or cannot be previewed."""
+
+
+class ThumbnailBusy(Exception):
+    """Too many thumbnails are already queued; the client should retry later."""
+
+
+@dataclass
+class Thumbnail:
+    data: bytes
+    mimetype: str
+
+
+def _encoder_available(fmt: str) -> bool:
+    from PIL import features
+
+    return fmt == 'jpeg' or bool(features.check(fmt))
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Pick the thumbnail format for a request.
+
+    Args:
+        accept: The request's Accept header
+
+    Returns:
+        'avif', 'webp' or 'jpeg'
+    """
+    accepted = {part.split(';')[0].strip().lower() for part in (accept or '').split(',')}
+    for fmt in THUMBNAIL_FORMATS:
+        if _MIME_TYPES.get(fmt) in accepted and _encoder_available(fmt):
+            return fmt
+    return 'jpeg'
+
+
+def preview_kind(file_bytes: bytes, file_extension: str) -> Optional[str]:
+    """'image', 'pdf' or None (no preview) for an attachment."""
+    file_extension = (file_extension or '').lstrip('.').lower()
+    if file_extension == 'pdf' or file_bytes[:5] == b'%PDF-':
+        return 'pdf'
+    if file_extension in IMAGE_EXTENSIONS:
+        return 'image'
+    return None
+
+
+def render_thumbnail(file_bytes: bytes, kind: str, fmt: str, size: int = THUMBNAIL_SIZE) -> bytes:
+    """
+    Render a thumbnail (runs in the worker processes).
+
+    Args:
+        file_bytes: Attachment contents
+        kind: 'image' or 'pdf' (first page)
+        fmt: 'avif', 'webp' or 'jpeg'
+        size: Bounding box edge in pixels
+
+    Returns:
+        Encoded thumbnail
+    """
+    from PIL import Image
+
+    if kind == 'pdf':
+        import fitz  # PyMuPDF
+
+        with fitz.open(stream=file_bytes, filetype='pdf') as doc:
+            if doc.page_count == 0:
+                raise ValueError('PDF has no pages')
+            page = doc[0]
+            # Rasterize straight at thumbnail resolution
+            zoom = size / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    else:
+        img = Image.open(io.BytesIO(file_bytes))
+        if img.format == 'JPEG':
+            img.draft('RGB', (size, size))
+
+    # Flatten transparency onto white
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    if fmt == 'avif':
+        img.save(output, format='AVIF', quality=60, speed=8)
+    elif fmt == 'webp':
+        img.save(output, format='WEBP', quality=80, method=4)
+    else:
+        img.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+class ThumbnailService:
+    """Process pool renderer with request deduplication, a bounded queue and an LRU cache."""
+
+    def __init__(self, workers: int = THUMBNAIL_WORKERS, queue_size: int = THUMBNAIL_QUEUE_SIZE,
+                 cache_size: int = THUMBNAIL_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._inflight: Dict[Tuple, Future] = {}
+        self._cache: 'OrderedDict[Tuple, Thumbnail]' = OrderedDict()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Spawned, so no app threads or DB handles are forked
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _reset_pool(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cached(self, key: Tuple) -> Optional[Thumbnail]:
+        with self._lock:
+            thumbnail = self._cache.get(key)
+            if thumbnail is not None:
+                self._cache.move_to_end(key)
+            return thumbnail
+
+    def _remember(self, key: Tuple, thumbnail: Thumbnail) -> None:
+        with self._lock:
+            self._cache[key] = thumbnail
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, attachment_id, load: Callable[[], Tuple[bytes, str]], accept: str = None,
+            size: int = THUMBNAIL_SIZE) -> Thumbnail:
+        """
+        Get an attachment's thumbnail, rendering it if needed.
+
+        Args:
+            attachment_id: RFMS attachment id (cache and deduplication key)
+            load: Returns (file bytes, file extension); only called by the first of any concurrent requests
+            accept: The request's Accept header, for format negotiation
+            size: Bounding box edge in pixels
+
+        Returns:
+            Thumbnail
+
+        Raises:
+            ThumbnailUnavailable: No file data, or the file cannot be previewed
+            ThumbnailBusy: The render queue is full or the render timed out
+        """
+        fmt = negotiate_format(accept)
+        key = (str(attachment_id), fmt, size)
+        thumbnail = self._cached(key)
+        metrics.cache_lookup('thumbnails', hit=thumbnail is not None)
+        if thumbnail is not None:
+            return thumbnail
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            try:
+                return future.result(timeout=THUMBNAIL_TIMEOUT)
+            except FutureTimeout:
+                raise ThumbnailBusy('Timed out waiting for a thumbnail worker')
+
+        try:
+            thumbnail = self._render(load, fmt, size)
+            self._remember(key, thumbnail)
+            future.set_result(thumbnail)
+            return thumbnail
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _render(self, load: Callable[[], Tuple[bytes, str]], fmt: str, size: int) -> Thumbnail:
+        file_bytes, file_extension = load()
+        kind = preview_kind(file_bytes, file_extension)
+        if kind is None:
+            raise ThumbnailUnavailable('Preview not available for this file type')
+
+        if not self._slots.acquire(blocking=False):
+            raise ThumbnailBusy('Thumbnail queue is full')
+        try:
+            try:
+                data = self._get_pool().submit(render_thumbnail, file_bytes, kind, fmt, size).result(timeout=THUMBNAIL_TIMEOUT)
+            except BrokenProcessPool:
+                logger.warning("Thumbnail worker pool died; restarting it")
+                self._reset_pool()
+                data = self._get_pool().submit(render_thumbnail, file_bytes, kind, fmt, size).result(timeout=THUMBNAIL_TIMEOUT)
+        except FutureTimeout:
+            raise ThumbnailBusy('Timed out waiting for a thumbnail worker')
+        except Exception as e:
+            raise ThumbnailUnavailable(f'Could not render preview: {e}') from e
+        finally:
+            self._slots.release()
+        return Thumbnail(data, _MIME_TYPES[fmt])
+
+    def shutdown(self) -> None:
+        self._reset_pool()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    """Process-wide thumbnail service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService()
+        return _service
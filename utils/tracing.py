@@ -0,0 +1,334 @@
+"""
+Request Tracing
+
+Lightweight per-request timing so a slow page can be pinned on RFMS, Gemini,
+Graph, the database or our own code without grepping app.log:
+
+- Every request gets a trace (init_tracing). External calls made while it is
+  active add spans to it: RFMS and Graph HTTP calls (traced_session), RFMS
+  client methods (trace_methods), Gemini calls (span) and DB queries
+  (install_db_tracing).
+- When the request finishes the trace is written as a Server-Timing header
+  (visible in the browser's network panel), as one JSON log line on the
+  'request_trace' logger, and into rolling per-route and per-call windows
+  (stats()) that the performance admin page shows as p50/p95.
+- Calls and request durations also feed the Prometheus metrics (utils/metrics.py).
+
+Calls made outside a request (scheduler jobs, workers) still feed the per-call
+windows; they are just not attached to a request. Work a request fans out to
+a thread pool must be submitted with traced_submit, otherwise the calls it
+makes are not attached to the request either.
+"""
+
+import re
+import json
+import inspect
+import time
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger('request_trace')
+
+STATS_WINDOW = 1000  # Most recent samples kept per route / call
+SERVER_TIMING_SERVICES = ('rfms', 'gemini', 'graph', 'db')
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('request_trace', default=None)
+_current_operation: contextvars.ContextVar = contextvars.ContextVar('trace_operation', default=None)
+
+_VERSION_SEGMENT = re.compile(r'^v\d+(\.\d+)?$')
+
+
+class RequestTrace:
+    """Timings collected for one request."""
+
+    def __init__(self, method: str, route: str, path: str):
+        self.method = method
+        self.route = route
+        self.path = path
+        self.start = time.perf_counter()
+        self.totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])  # service -> [count, seconds]
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, service: str, seconds: float, detail: Dict[str, Any] = None) -> None:
+        with self._lock:
+            total = self.totals[service]
+            total[0] += 1
+            total[1] += seconds
+            if detail is not None and len(self.calls) < 200:
+                self.calls.append(detail)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+class _Stats:
+    """Rolling windows of durations (ms) per route and per external call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows: Dict[tuple, deque] = {}
+        self._errors: Dict[tuple, int] = defaultdict(int)
+        self._counts: Dict[tuple, int] = defaultdict(int)
+
+    def add(self, kind: str, key: str, ms: float, error: bool = False) -> None:
+        with self._lock:
+            window = self._windows.get((kind, key))
+            if window is None:
+                window = self._windows[(kind, key)] = deque(maxlen=STATS_WINDOW)
+            window.append(ms)
+            self._counts[(kind, key)] += 1
+            if error:
+                self._errors[(kind, key)] += 1
+
+    def summary(self, kind: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [(key, sorted(window), self._counts[(k, key)], self._errors[(k, key)])
+                     for (k, key), window in self._windows.items() if k == kind]
+        rows = [{
+            'name': key,
+            'count': count,
+            'errors': errors,
+            'p50_ms': round(_percentile(samples, 50), 1),
+            'p95_ms': round(_percentile(samples, 95), 1),
+            'max_ms': round(samples[-1], 1),
+        } for key, samples, count, errors in items]
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(samples) + 0.5)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+_stats = _Stats()
+
+
+def stats() -> Dict[str, List[Dict[str, Any]]]:
+    """p50/p95/max per route and per external call (most recent STATS_WINDOW samples each)."""
+    return {'routes': _stats.summary('route'), 'calls': _stats.summary('call')}
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def traced_submit(executor, fn, *args, **kwargs):
+    """
+    Submit fn to an executor in a copy of the caller's context.
+
+    Thread pool workers do not inherit context variables, so calls made by work
+    submitted with a plain executor.submit never reach the request's trace.
+
+    Returns:
+        The executor's Future
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def record_call(service: str, name: str, seconds: float, error: bool = False, **detail) -> None:
+    """
+    Record one external call.
+
+    Args:
+        service: 'rfms', 'gemini', 'graph', ...
+        name: Operation within the service (client method or endpoint)
+        seconds: Duration
+        error: Whether the call failed
+        detail: Extra fields for the request's JSON log line (status, bytes, endpoint, ...)
+    """
+    _stats.add('call', f"{service} {name}", seconds * 1000, error)
+    metrics.EXTERNAL_CALLS.labels(service, name, 'error' if error else 'ok').inc()
+    metrics.EXTERNAL_CALL_SECONDS.labels(service, name).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(service, seconds, {'service': service, 'name': name, 'ms': round(seconds * 1000, 1), **detail})
+
+
+@contextmanager
+def span(service: str, name: str, **detail):
+    """Time a block as an external call (e.g. a Gemini request)."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield detail
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if error is not None:
+            detail.setdefault('error', type(error).__name__)
+            code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+            if isinstance(code, int):
+                detail.setdefault('status', code)
+        record_call(service, name, time.perf_counter() - start, error=error is not None, **detail)
+
+
+def _endpoint(url: str) -> str:
+    """URL path with id-like segments collapsed, e.g. /v2/order/{id}."""
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    segments = path.split('/')[1:]  # Drop the host
+    return '/' + '/'.join('{id}' if any(c.isdigit() for c in segment) and not _VERSION_SEGMENT.match(segment)
+                          else segment for segment in segments)
+
+
+def traced_session(service: str) -> requests.Session:
+    """
+    requests.Session that records every response as a call of the service.
+
+    Calls are named after the enclosing trace_methods operation (e.g. the RFMSClient
+    method) when there is one, otherwise after the HTTP method and endpoint.
+    Cookies are not kept between calls, matching plain requests.get/post.
+    """
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def on_response(response, *args, **kwargs):
+        read_start = time.perf_counter()
+        if kwargs.get('stream'):
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)  # Read here so the body download is part of the timing
+        seconds = response.elapsed.total_seconds() + (time.perf_counter() - read_start)
+        endpoint = _endpoint(response.request.url)
+        operation = _current_operation.get()
+        if operation is not None:
+            operation['calls'] += 1
+            if response.status_code in (401, 403):
+                operation['auth_retries'] += 1
+        record_call(service, operation['name'] if operation else f"{response.request.method} {endpoint}",
+                    seconds, error=response.status_code >= 400,
+                    method=response.request.method, endpoint=endpoint,
+                    status=response.status_code, bytes=size)
+        return response
+
+    session.hooks['response'].append(on_response)
+    return session
+
+
+def trace_methods(service: str):
+    """
+    Class decorator: HTTP calls made inside any public method are attributed to it.
+
+    Only the outermost method counts (process_po_order calling find_po_match is one
+    process_po_order operation). The method's own duration, HTTP call count and
+    auth retries go into the request's JSON log line.
+    """
+    def decorate(cls):
+        for attr, func in list(vars(cls).items()):
+            if attr.startswith('_') or not inspect.isfunction(func):
+                continue
+            setattr(cls, attr, _wrap_operation(service, attr, func))
+        return cls
+    return decorate
+
+
+def _wrap_operation(service: str, name: str, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_operation.get() is not None:
+            return func(*args, **kwargs)
+        operation = {'name': name, 'calls': 0, 'auth_retries': 0}
+        token = _current_operation.set(operation)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_operation.reset(token)
+            trace = _current_trace.get()
+            if trace is not None and len(trace.calls) < 200:
+                trace.calls.append({'service': f"{service}.method", 'name': name,
+                                    'ms': round((time.perf_counter() - start) * 1000, 1),
+                                    'http_calls': operation['calls'], 'retries': operation['auth_retries']})
+    return wrapper
+
+
+def install_db_tracing(engine) -> None:
+    """Count and time every DB query made during a request."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('trace_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('trace_query_start')
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add('db', seconds)
+
+
+def _server_timing(trace: RequestTrace, total: float) -> str:
+    parts = [f"app;dur={total * 1000:.1f}"]
+    for service in SERVER_TIMING_SERVICES:
+        if service in trace.totals:
+            count, seconds = trace.totals[service]
+            parts.append(f'{service};dur={seconds * 1000:.1f};desc="{service} x{count}"')
+    return ', '.join(parts)
+
+
+def init_tracing(app, db=None) -> None:
+    """Trace every request of a Flask app (and its DB queries when db is given)."""
+    from flask import request
+
+    if db is not None:
+        with app.app_context():
+            install_db_tracing(db.engine)
+
+    @app.before_request
+    def _start_trace():
+        if request.endpoint == 'static':
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        request.environ['request_trace.token'] = _current_trace.set(
+            RequestTrace(request.method, route, request.path))
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _current_trace.get()
+        if trace is None:
+            return response
+        total = trace.elapsed()
+        response.headers['Server-Timing'] = _server_timing(trace, total)
+        _stats.add('route', f"{trace.method} {trace.route}", total * 1000, error=response.status_code >= 500)
+        # Unmatched paths (404s, scanners) share one label so they cannot grow the series count
+        metrics.REQUEST_SECONDS.labels(trace.method, trace.route if request.url_rule else '<unmatched>',
+                                       str(response.status_code)).observe(total)
+        trace_logger.info(json.dumps({
+            'method': trace.method,
+            'route': trace.route,
+            'path': trace.path,
+            'status': response.status_code,
+            'ms': round(total * 1000, 1),
+            'services': {service: {'count': count, 'ms': round(seconds * 1000, 1)}
+                         for service, (count, seconds) in trace.totals.items()},
+            'calls': trace.calls,
+        }, default=str))
+        return response
+
+    @app.teardown_request
+    def _clear_trace(exc):
+        token = request.environ.pop('request_trace.token', None)
+        if token is not None:
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                _current_trace.set(None)  # Set in a different context (e.g. copied for streaming)
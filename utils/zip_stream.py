@@ -0,0 +1,101 @@
+"""
+Streaming ZIP Writer
+
+Builds a ZIP archive on the fly and yields it in chunks, so a download can be
+sent to the client while its entries are still being produced - nothing is
+written to disk and memory use stays at about one chunk.
+
+Entries are STORED (not compressed) by default: PDFs and photos are already
+compressed, and deflating them again costs CPU for almost no size reduction.
+Because the output is not seekable, zipfile writes each entry's CRC and sizes
+in a data descriptor after its data; all common unzip tools (Windows Explorer,
+macOS Archive Utility, 7-Zip, unzip) read these archives.
+"""
+
+import os
+import time
+import zipfile
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, Union[str, Path]]], compress_type: int = zipfile.ZIP_STORED,
+               chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of files, one chunk at a time.
+
+    Entries are read lazily, so a generator that builds each file just before
+    yielding it gets the archive streamed to the client as each file completes.
+
+    Args:
+        entries: (name in archive, path on disk) pairs
+        compress_type: zipfile compression method (ZIP_STORED by default)
+        chunk_size: Bytes read from each file per chunk
+
+    Yields:
+        Chunks of the ZIP archive
+    """
+    buffer = _StreamBuffer()
+    count = 0
+    total = 0
+    with zipfile.ZipFile(buffer, 'w', compression=compress_type, allowZip64=True) as zf:
+        for arcname, path in entries:
+            path = Path(path)
+            try:
+                src = open(path, 'rb')
+            except OSError as e:
+                logger.error(f"Failed to add {arcname} to ZIP: {e}")
+                continue
+            with src:
+                stat = os.fstat(src.fileno())
+                zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+                zinfo.compress_type = compress_type
+                zinfo.external_attr = 0o644 << 16
+                # The size lets zipfile decide up front whether the entry needs ZIP64 headers
+                zinfo.file_size = stat.st_size
+                with zf.open(zinfo, 'w') as dest:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            total += len(data)
+                            yield data
+            count += 1
+            # Data descriptor (CRC and sizes) for the entry just finished
+            data = buffer.drain()
+            total += len(data)
+            yield data
+
+    # Central directory
+    data = buffer.drain()
+    total += len(data)
+    logger.info(f"Streamed ZIP with {count} file(s), {total:,} bytes")
+    yield data